@@ -1,4 +1,5 @@
 from .network.server import Server
 from .network.client import connect
 from .network.aioclient import connect as aioconnect
-from .network.client import CyberDict, CyberList
\ No newline at end of file
+from .network.client import CyberDict, CyberList, CyberQueue, \
+    CyberSortedSet
\ No newline at end of file
@@ -0,0 +1,149 @@
+'''
+    Aggregations of the values of the tables computed on the server.
+'''
+
+
+from .indexes import MISSING, family_of, parse_field, get_field
+
+
+# The types of the values which are summed.
+NUMBERS = (int, float)
+
+
+class Accumulator:
+    '''
+        The count, sum, minimum and maximum of values. The int and float
+        values are summed, bool is not. The minimum and the maximum are
+        taken among the values ordered by the sorted indexes, the numbers
+        first, then str, bytes, dates, naive datetimes and the datetimes
+        with a time zone.
+    '''
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.numbers = 0
+        # The (family, value) pairs of the minimum and the maximum.
+        self.low = None
+        self.high = None
+
+    def update(self, values: list):
+        '''
+            Add a chunk of values, the chunk is reduced by the builtins
+            rather than one value at a time.
+        '''
+        self.count += len(values)
+        numbers = [value for value in values if type(value) in NUMBERS]
+        if numbers:
+            total = sum(numbers)
+            self.total += total
+            self.numbers += len(numbers)
+            # The sum is NaN if there is a NaN, it is left out of min and
+            # max.
+            ordered = numbers if total == total else \
+                [value for value in numbers if value == value]
+            if ordered:
+                self._bound((0, min(ordered)), (0, max(ordered)))
+
+        if len(numbers) < len(values):
+            ordered = []
+            for value in values:
+                if type(value) in NUMBERS:
+                    continue
+                family = family_of(value)
+                if family is None:
+                    continue
+                # NaN is left out, a signaling NaN Decimal raises on
+                # comparison.
+                try:
+                    if value != value:
+                        continue
+                except ArithmeticError:
+                    continue
+                ordered.append((family, value))
+            if ordered:
+                self._bound(min(ordered), max(ordered))
+
+    def _bound(self, low: tuple, high: tuple):
+        if self.low is None or low < self.low:
+            self.low = low
+        if self.high is None or high > self.high:
+            self.high = high
+
+    def result(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'mean': self.total / self.numbers if self.numbers else None,
+            'min': None if self.low is None else self.low[1],
+            'max': None if self.high is None else self.high[1]
+        }
+
+
+class Aggregation:
+    '''
+        Aggregate a field path of the values, None aggregates the values
+        themselves. The values without the field are not counted. With
+        group_by, the values are aggregated by the value of the group_by
+        field path, the values without it are in the None group and the
+        values with an unhashable group are skipped.
+
+        match is a predicate compiled by query.compile_where, only the
+        values matching it are aggregated.
+    '''
+
+    def __init__(self, field: str = None, group_by: str = None, match=None):
+        self._path = None if field is None else parse_field(field)
+        self._group_path = None if group_by is None else parse_field(group_by)
+        self._match = match
+        self._total = Accumulator()
+        self._groups = {}
+
+    def update(self, values: list):
+        if self._match is not None:
+            values = [value for value in values if self._match(value)]
+
+        if self._group_path is None:
+            self._total.update(self._fields(values))
+            return
+
+        buckets = {}
+        for value in values:
+            group = get_field(value, self._group_path)
+            if group is MISSING:
+                group = None
+            try:
+                bucket = buckets.get(group)
+            except TypeError:
+                continue
+            if bucket is None:
+                bucket = buckets[group] = []
+            bucket.append(value)
+        for group, bucket in buckets.items():
+            accumulator = self._groups.get(group)
+            if accumulator is None:
+                accumulator = self._groups[group] = Accumulator()
+            accumulator.update(self._fields(bucket))
+
+    def result(self) -> dict:
+        '''
+            Return Type: dict, the count, sum, mean, min and max, or those
+            of each group with group_by.
+        '''
+        if self._group_path is None:
+            return self._total.result()
+        return {
+            group: accumulator.result()
+            for group, accumulator in self._groups.items()
+        }
+
+    def _fields(self, values: list) -> list:
+        if self._path is None:
+            return values
+        path = self._path
+        if len(path) == 1:
+            name, = path
+            return [value[name] for value in values
+                    if type(value) == dict and name in value]
+        fields = (get_field(value, path) for value in values)
+        return [field for field in fields if field is not MISSING]
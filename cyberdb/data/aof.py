@@ -0,0 +1,347 @@
+'''
+    Append-only file of the mutations of the CyberDB database.
+'''
+
+
+import os
+import pickle
+import asyncio
+
+from .snapshot import copy_tables
+from .expiry import Expires
+from .indexes import Indexes
+from .sorting import SortOrders
+from ..network import HEADER
+from ..extensions import CyberDBError
+
+
+# fsync policies, the same as Redis appendfsync.
+FSYNC_POLICIES = ('always', 'everysec', 'no')
+
+
+def encode_record(seq: int, kind: str, payload) -> bytes:
+    '''
+        Encode a record as a length-prefixed pickled tuple.
+    '''
+    data = pickle.dumps((seq, kind, payload), protocol=pickle.HIGHEST_PROTOCOL)
+    return HEADER.pack(len(data)) + data
+
+
+def replay(file_name: str, after: int = 0):
+    '''
+        Read the records of an append-only file and of its interrupted 
+        rewrite that are newer than the sequence number after.
+
+        Return Type: Generator of (seq, kind, payload).
+    '''
+    for name in (file_name, file_name + '.next'):
+        for offset, seq, kind, payload in read_records(name):
+            if seq > after or kind == 'base' and seq == after:
+                after = max(after, seq)
+                yield seq, kind, payload
+
+
+def write_all(fd: int, data: bytes):
+    '''
+        Write all of data to the file descriptor.
+    '''
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+def read_records(file_name: str):
+    '''
+        Read the records of an append-only file.
+
+        Return Type: Generator of (offset, seq, kind, payload), offset is 
+        the end of the record in the file. A truncated record at the end 
+        of the file, left by a crash during a write, ends the iteration.
+    '''
+    if not os.path.exists(file_name):
+        return
+    with open(file_name, 'rb') as f:
+        offset = 0
+        while True:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            length, = HEADER.unpack(header)
+            data = f.read(length)
+            if len(data) < length:
+                return
+            try:
+                seq, kind, payload = pickle.loads(data)
+            except Exception:
+                return
+            offset += HEADER.size + length
+            yield offset, seq, kind, payload
+
+
+class AppendOnlyFile:
+    '''
+        Log every mutation of the database so that it can be replayed after 
+        a crash.
+
+        Records are appended to an in-memory buffer on the event loop and 
+        written by a single flush task in a worker thread, all records 
+        buffered while a write is in progress are written together (group 
+        commit). Each record has a sequence number, so a snapshot that 
+        stores the sequence number of its last mutation can be combined 
+        with the log without applying a mutation twice.
+
+        fsync policies:
+
+            always -- the response of a mutation is sent after the record 
+            is flushed to the disk.
+
+            everysec -- records are written as soon as possible and flushed 
+            to the disk once per second.
+
+            no -- records are written as soon as possible, the operating 
+            system decides when to flush them.
+
+        The log is compacted by a rewrite: a copy of the database is stored 
+        as a base record at the start of a new file, followed by the new 
+        mutations. A rewrite starts automatically when the file grows 
+        beyond rewrite_size bytes and has doubled since the last rewrite.
+    '''
+
+    def __init__(self, file_name: str, fsync: str = 'everysec',
+                 rewrite_size: int = 64 * 1024 * 1024):
+        if fsync not in FSYNC_POLICIES:
+            raise CyberDBError(
+                "fsync must be one of 'always', 'everysec' or 'no'.")
+
+        self.file_name = file_name
+        self.fsync = fsync
+        self.rewrite_size = rewrite_size
+        # Sequence number of the last record.
+        self.seq = 0
+        self._fd = None
+        self._size = 0
+        self._base_size = 0
+        self._buffer = []
+        # Futures of the mutations waiting for the flush to the disk.
+        self._waiters = []
+        self._flushing = False
+        self._rewriting = False
+        # Records appended during a rewrite, they are also written to the 
+        # new file after the base.
+        self._rewrite_buffer = None
+        self._syncer = None
+        self._dirty = False
+        self._lock = None
+        self._db = None
+        self._expires = None
+        self._indexes = None
+        self._sort_orders = None
+
+    def scan(self) -> int:
+        '''
+            Read the sequence number of the last record and cut a truncated 
+            record at the end of the file.
+
+            Return Type: int, the sequence number of the last record.
+        '''
+        for file_name in (self.file_name, self.file_name + '.next'):
+            valid = 0
+            for offset, seq, kind, payload in read_records(file_name):
+                valid = offset
+                self.seq = max(self.seq, seq)
+            if os.path.exists(file_name) and os.path.getsize(file_name) > valid:
+                os.truncate(file_name, valid)
+        return self.seq
+
+    def open(self, db: dict, expires: Expires, indexes: Indexes = None,
+             sort_orders: SortOrders = None):
+        '''
+            Open the log for appending, this is run on the event loop of the 
+            server before accepting connections. If a rewrite was 
+            interrupted, it is finished first, and a base record is written 
+            if the database is not empty and the log is.
+
+            db -- the database stored by rewrites.
+
+            expires -- the deadlines of the keys stored by rewrites.
+
+            indexes -- the indexed field paths stored by rewrites.
+
+            sort_orders -- the orders of the sorted lists stored by 
+            rewrites.
+        '''
+        self._db = db
+        self._expires = expires
+        self._indexes = Indexes() if indexes is None else indexes
+        self._sort_orders = SortOrders() if sort_orders is None else sort_orders
+        self._lock = asyncio.Lock()
+        self.scan()
+        # The old file stays complete until a rewrite replaces it, the new 
+        # file of an interrupted rewrite is discarded.
+        next_name = self.file_name + '.next'
+        if os.path.exists(next_name):
+            os.remove(next_name)
+
+        self._fd = os.open(self.file_name,
+                           os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._size = self._base_size = os.path.getsize(self.file_name)
+        if self._size == 0 and db:
+            self._write(encode_record(
+                self.seq, 'base',
+                (db, expires.deadlines, self._indexes.definitions,
+                 self._sort_orders.definitions)), True)
+
+        if self.fsync == 'everysec':
+            self._syncer = asyncio.ensure_future(self._sync_every_second())
+
+    def append(self, client_obj: dict):
+        '''
+            Append the request of a mutation that succeeded.
+        '''
+        self.seq += 1
+        data = encode_record(self.seq, 'op', client_obj)
+        self._buffer.append(data)
+        if self._rewrite_buffer is not None:
+            self._rewrite_buffer.append(data)
+        self._schedule()
+
+    async def wait(self):
+        '''
+            Wait until the appended records are durable according to the 
+            fsync policy.
+        '''
+        if self.fsync != 'always' or not self._buffer and not self._flushing:
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._schedule()
+        await waiter
+
+    def _schedule(self):
+        if not self._flushing:
+            self._flushing = True
+            asyncio.ensure_future(self._flush())
+
+    async def _flush(self):
+        '''
+            Write the buffer in a worker thread until it is empty.
+        '''
+        loop = asyncio.get_running_loop()
+        try:
+            while self._buffer or self._waiters:
+                async with self._lock:
+                    data = b''.join(self._buffer)
+                    self._buffer = []
+                    waiters = self._waiters
+                    self._waiters = []
+                    try:
+                        await loop.run_in_executor(
+                            None, self._write, data, self.fsync == 'always')
+                    except Exception as e:
+                        for waiter in waiters:
+                            if not waiter.done():
+                                waiter.set_exception(e)
+                        raise
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_result(None)
+        finally:
+            self._flushing = False
+
+        if self._needs_rewrite():
+            asyncio.ensure_future(self.rewrite())
+
+    def _write(self, data: bytes, fsync: bool):
+        '''
+            Write data to the file, this is run in a worker thread.
+        '''
+        write_all(self._fd, data)
+        self._size += len(data)
+        if fsync:
+            os.fsync(self._fd)
+        else:
+            self._dirty = True
+
+    async def _sync_every_second(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(1)
+            if self._dirty:
+                async with self._lock:
+                    self._dirty = False
+                    await loop.run_in_executor(None, os.fsync, self._fd)
+
+    def _needs_rewrite(self) -> bool:
+        return not self._rewriting and self._size > self.rewrite_size and \
+            self._size > 2 * self._base_size
+
+    async def rewrite(self):
+        '''
+            Compact the log. The tables are copied on the event loop so that 
+            the base record is a point-in-time image, the base is serialized 
+            and written to a new file in a worker thread while new records 
+            are still written to the old file, then the records appended 
+            during the rewrite are added to the new file and it replaces the 
+            old file.
+        '''
+        if self._rewriting:
+            return
+        self._rewriting = True
+        loop = asyncio.get_running_loop()
+        next_name = self.file_name + '.next'
+        try:
+            seq = self.seq
+            base = (copy_tables(self._db), self._expires.copy(),
+                    self._indexes.copy(), self._sort_orders.copy())
+            self._rewrite_buffer = []
+
+            fd, base_size = await loop.run_in_executor(
+                None, self._write_base, next_name, seq, base)
+
+            async with self._lock:
+                # Complete the old file, then move to the new one.
+                old = b''.join(self._buffer)
+                self._buffer = []
+                new = b''.join(self._rewrite_buffer)
+                self._rewrite_buffer = None
+                await loop.run_in_executor(
+                    None, self._swap, fd, old, new, next_name)
+                self._base_size = base_size
+        finally:
+            self._rewrite_buffer = None
+            self._rewriting = False
+
+    def _write_base(self, next_name: str, seq: int, base: tuple):
+        '''
+            Write the base record to the new file, this is run in a worker 
+            thread.
+
+            Return Type: tuple, the file descriptor and the size of the base.
+        '''
+        base = encode_record(seq, 'base', base)
+        fd = os.open(next_name, os.O_WRONLY | os.O_APPEND | os.O_CREAT |
+                     os.O_TRUNC, 0o644)
+        try:
+            write_all(fd, base)
+            os.fsync(fd)
+        except BaseException:
+            os.close(fd)
+            raise
+        return fd, len(base)
+
+    def _swap(self, fd: int, old: bytes, new: bytes, next_name: str):
+        '''
+            Flush the old file, append the records of the rewrite to the new 
+            file and replace the old file, this is run in a worker thread.
+        '''
+        self._write(old, True)
+        write_all(fd, new)
+        os.fsync(fd)
+
+        old_fd = self._fd
+        self._fd = fd
+        self._size = os.fstat(fd).st_size
+        self._dirty = False
+        os.replace(next_name, self.file_name)
+        os.close(old_fd)
@@ -0,0 +1,110 @@
+'''
+    Server-side cursors for incremental iteration over tables.
+'''
+
+
+import re
+import fnmatch
+import itertools
+
+
+# How far back a resumed iteration looks for the last examined key.
+LOOKBACK = 1024
+
+
+def consume(iterator, n: int):
+    '''
+        Advance the iterator n steps at C speed.
+    '''
+    next(itertools.islice(iterator, n, n), None)
+
+
+class Cursor:
+    '''
+        Iterate over a dictionary in pages, keeping the position between 
+        requests so that each page costs O(count).
+
+        If the dictionary changes size between pages, iteration resumes 
+        after the last examined key in insertion order. As with Redis 
+        SCAN, entries added or removed during the scan may or may not be 
+        returned and some entries may be returned twice. Entries present 
+        for the whole scan are returned unless more than LOOKBACK entries 
+        before the position are deleted between two pages.
+    '''
+
+    def __init__(self, table: dict, match: str = None):
+        '''
+            table -- the dictionary to iterate over.
+
+            match -- glob-style pattern, only str keys matching it are 
+            returned.
+        '''
+        self._table = table
+        self._match = None
+        if match is not None:
+            self._match = re.compile(fnmatch.translate(match)).match
+        self._position = 0
+        self._last_key = None
+        self._iterator = iter(table.items())
+
+    def _resume(self):
+        '''
+            Create a new iterator positioned after the last examined key.
+        '''
+        start = max(0, self._position - LOOKBACK)
+        self._iterator = iter(self._table.items())
+        consume(self._iterator, start)
+        # Entries before the position may have been deleted, look for the 
+        # last examined key in the window before the position.
+        for offset, (key, value) in enumerate(
+                itertools.islice(self._iterator, self._position - start)):
+            if key is self._last_key or key == self._last_key:
+                self._position = start + offset + 1
+                return
+
+        # The last key was deleted, resume earlier and accept duplicates.
+        self._iterator = iter(self._table.items())
+        consume(self._iterator, start)
+        self._position = start
+
+    def fetch(self, count: int, mode: str = 'keys'):
+        '''
+            Examine at most count entries and return the matching ones.
+
+            count -- the maximum number of entries examined in this page.
+
+            mode -- 'keys', 'values' or 'items'.
+
+            Return Type: Tuple[List, bool], the page and whether the 
+            iteration is finished.
+        '''
+        if mode not in ('keys', 'values', 'items'):
+            raise ValueError("mode must be 'keys', 'values' or 'items'.")
+
+        match = self._match
+        page = []
+        examined = 0
+        while examined < count:
+            try:
+                key, value = next(self._iterator)
+            except StopIteration:
+                return page, True
+            except RuntimeError:
+                # The dictionary changed size during the iteration.
+                self._resume()
+                continue
+
+            self._position += 1
+            self._last_key = key
+            examined += 1
+            if match and not (type(key) == str and match(key)):
+                continue
+
+            if mode == 'keys':
+                page.append(key)
+            elif mode == 'values':
+                page.append(value)
+            else:
+                page.append((key, value))
+
+        return page, False
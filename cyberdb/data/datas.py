@@ -4,11 +4,18 @@
 
 
 import pickle
+import marshal
+import asyncio
 
 from obj_encrypt import Secret
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 from ..extensions.signature import Signature
-from ..extensions import CyberDBError
+from ..extensions import auth, CyberDBError
 
 
 def generate_client_obj():
@@ -25,6 +32,124 @@ def generate_server_obj():
     }
 
 
+class PickleCodec:
+    '''
+        Encode objects with the highest pickle protocol.
+    '''
+
+    name = 'pickle'
+
+    def dumps(self, obj) -> bytes:
+        return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, data: bytes):
+        return pickle.loads(data)
+
+
+class MarshalCodec:
+    '''
+        Encode plain types (None, bool, int, float, str, bytes, tuple, list, 
+        dict, set) with marshal, and other objects with pickle. The first 
+        byte tells which one was used.
+    '''
+
+    name = 'marshal'
+
+    def dumps(self, obj) -> bytes:
+        try:
+            return b'm' + marshal.dumps(obj)
+        except ValueError:
+            return b'p' + pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, data: bytes):
+        if data[:1] == b'm':
+            return marshal.loads(data[1:])
+        return pickle.loads(data[1:])
+
+
+class MsgpackCodec:
+    '''
+        Encode plain types with msgpack, and other objects with pickle. 
+        Tuples are kept apart from lists, and the objects msgpack does not 
+        support are stored as pickle in an extension type.
+    '''
+
+    name = 'msgpack'
+
+    # Extension types
+    PICKLE = 0
+    TUPLE = 1
+
+    def dumps(self, obj) -> bytes:
+        try:
+            return b'k' + msgpack.packb(obj, use_bin_type=True, 
+                                        strict_types=True, default=self._default)
+        except (OverflowError, ValueError, TypeError):
+            return b'p' + pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, data: bytes):
+        if data[:1] == b'k':
+            return msgpack.unpackb(data[1:], raw=False, 
+                                   strict_map_key=False, ext_hook=self._ext_hook)
+        return pickle.loads(data[1:])
+
+    def _default(self, obj):
+        if type(obj) == tuple:
+            return msgpack.ExtType(self.TUPLE, msgpack.packb(
+                list(obj), use_bin_type=True, strict_types=True, 
+                default=self._default))
+        return msgpack.ExtType(
+            self.PICKLE, pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _ext_hook(self, code: int, data: bytes):
+        if code == self.TUPLE:
+            return tuple(msgpack.unpackb(data, raw=False, strict_map_key=False, 
+                                         ext_hook=self._ext_hook))
+        return pickle.loads(data)
+
+
+class HandshakeCodec:
+    '''
+        Encode the handshake with marshal only. It is decoded before the 
+        other end is authenticated, so it never falls back to pickle.
+    '''
+
+    name = 'handshake'
+
+    def dumps(self, obj) -> bytes:
+        return marshal.dumps(obj)
+
+    def loads(self, data: bytes):
+        return marshal.loads(data)
+
+
+# The codec of the handshake, it cannot be selected by a connection.
+HANDSHAKE = HandshakeCodec()
+
+
+# The codecs a connection can select at the handshake.
+CODECS = {
+    codec.name: codec for codec in (PickleCodec(), MarshalCodec(), MsgpackCodec())
+}
+
+
+def get_codec(name: str):
+    '''
+        Get the codec by its name.
+    '''
+    if name not in CODECS:
+        raise CyberDBError('The codec must be one of {}.'.format(
+            ', '.join(CODECS)))
+    if name == 'msgpack' and msgpack is None:
+        raise CyberDBError('The msgpack codec requires the msgpack package.')
+    return CODECS[name]
+
+
+# Encrypted frames of at least OFFLOAD_SIZE bytes are encrypted and 
+# decrypted off the event loop.
+OFFLOAD_SIZE = 256 * 1024
+
+
 errors_code = {
     2: 'Incorrect password or data tampering.'
 }
@@ -33,67 +158,111 @@ errors_code = {
 class DataParsing:
     '''
         Convert TCP data and encrypted objects to each other.
+
+        The DataParsing of a client or server holds the password and the 
+        settings, each connection gets its own DataParsing at the handshake 
+        with the codec it selected and, with encryption, its session.
     '''
 
-    def __init__(self, secret: Secret, encrypt: bool=False):
+    def __init__(self, secret: Secret, encrypt: bool=False,
+                 codec: str='pickle', session: auth.Session=None):
         self._secret = secret
         self._encrypt = encrypt
+        self.codec = get_codec(codec)
+        self.session = session
+
+    def with_codec(self, codec: str, session: auth.Session=None):
+        '''
+            Return Type: DataParsing, the same parsing with another codec 
+            and session.
+        '''
+        return DataParsing(self._secret, encrypt=self._encrypt, codec=codec,
+                           session=session)
+
+    def for_handshake(self):
+        '''
+            Return Type: DataParsing, the parsing of the handshake frames, 
+            which are encoded with marshal and not encrypted.
+        '''
+        dp = DataParsing(self._secret, encrypt=self._encrypt)
+        dp.codec = HANDSHAKE
+        return dp
 
     def data_to_obj(self, data):
         '''
             Restore TCP encrypted data as an object.
         '''
-        # Determine whether to decrypt and verify the signature.
-        if self._encrypt:
-
+        # Decrypt and verify the frame.
+        if self.session:
             try:
-                data = self._secret.decrypt(data)
-            except (UnicodeDecodeError, KeyError):
-                return {
-                    'code': 2,
-                    'errors-code': errors_code[2]
-                }
-                
-            obj = pickle.loads(data['content'])
-            return {
-                'code': 1,
-                'content': obj
-            }
-            
-        else:
-            
-            try:
-                obj = pickle.loads(data)
-                return {
-                    'code': 1,
-                    'content': obj
-                }
-            except Exception as e:
+                data = self.session.open(data)
+            except ValueError:
                 return {
                     'code': 2,
                     'errors-code': errors_code[2]
                 }
 
+        return self._loads(data)
+
     def obj_to_data(self, obj):
         '''
             Convert object to TCP transmission data.
         '''
-        data = {
-            'content': None
-        }
-        
-        # Determine whether to encrypt and sign.
-        if self._encrypt:
+        data = self._dumps(obj)
+        if self.session:
+            data = self.session.seal(data)
+        return data
+
+    async def adata_to_obj(self, data):
+        '''
+            data_to_obj on the event loop, large frames are decrypted in a 
+            worker thread.
+        '''
+        if self.session and len(data) >= OFFLOAD_SIZE:
+            nonce = self.session.receive_nonce()
             try:
-                data['content'] = pickle.dumps(obj)
-            except pickle.PickleError as e:
-                raise CyberDBError('CyberDB does not support this data type.')
+                data = await asyncio.get_running_loop().run_in_executor(
+                    None, self.session.open, data, nonce)
+            except ValueError:
+                return {
+                    'code': 2,
+                    'errors-code': errors_code[2]
+                }
+            return self._loads(data)
 
-            data = self._secret.encrypt(data)
-            
-        else:
-            data = pickle.dumps(obj)
+        return self.data_to_obj(data)
 
+    async def aobj_to_data(self, obj):
+        '''
+            obj_to_data on the event loop, large frames are encrypted in a 
+            worker thread.
+        '''
+        data = self._dumps(obj)
+        if self.session:
+            # The nonce is taken in the order of the frames.
+            nonce = self.session.send_nonce()
+            if len(data) >= OFFLOAD_SIZE:
+                data = await asyncio.get_running_loop().run_in_executor(
+                    None, self.session.seal, data, nonce)
+            else:
+                data = self.session.seal(data, nonce)
         return data
 
+    def _loads(self, data) -> dict:
+        try:
+            obj = self.codec.loads(data)
+        except Exception:
+            return {
+                'code': 2,
+                'errors-code': errors_code[2]
+            }
+        return {
+            'code': 1,
+            'content': obj
+        }
 
+    def _dumps(self, obj) -> bytes:
+        try:
+            return self.codec.dumps(obj)
+        except pickle.PickleError:
+            raise CyberDBError('CyberDB does not support this data type.')
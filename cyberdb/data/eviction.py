@@ -0,0 +1,323 @@
+'''
+    Memory limit of the database and eviction of the keys of CyberDict
+    tables.
+'''
+
+
+import os
+import sys
+import time
+import random
+import itertools
+from collections import OrderedDict, deque
+
+from .sortedset import SortedSet
+
+
+# The eviction policies of the tables.
+POLICIES = ('noeviction', 'lru', 'lfu', 'ttl')
+# The number of keys compared to choose the key to evict.
+EVICTION_SAMPLES = 5
+# The number of elements sampled at each end of a container, and the
+# depth of the containers followed, to estimate the size of an object.
+SIZE_SAMPLES = 8
+SIZE_DEPTH = 3
+# The size estimated for a table is reused until the table grows or
+# shrinks by an eighth, or SIZE_REFRESH seconds have passed.
+SIZE_REFRESH = 1
+# The counters of the lfu policy are logarithmic like in Redis, a new key
+# starts at LFU_INIT and the counter decreases by one every LFU_DECAY
+# seconds the key is not accessed.
+LFU_INIT = 5
+LFU_LOG_FACTOR = 10
+LFU_DECAY = 60
+
+
+def sizeof(obj, depth: int = SIZE_DEPTH) -> int:
+    '''
+        Estimate the deep size of an object in bytes. The elements of a
+        large container are sampled at both ends, their average size is
+        used for the others.
+
+        Return Type: int
+    '''
+    size = sys.getsizeof(obj)
+    if isinstance(obj, SortedSet):
+        # The members and scores are in the dictionary of the set.
+        return size + sizeof(obj._scores, depth)
+    if depth <= 0 or not isinstance(
+            obj, (dict, list, tuple, set, frozenset, deque)) or not obj:
+        return size
+
+    length = len(obj)
+    if isinstance(obj, dict):
+        if length > 2 * SIZE_SAMPLES:
+            keys = itertools.chain(itertools.islice(obj, SIZE_SAMPLES),
+                                   itertools.islice(reversed(obj), SIZE_SAMPLES))
+        else:
+            keys = obj
+        sample = [sizeof(key, depth - 1) + sizeof(obj[key], depth - 1)
+                  for key in keys]
+    else:
+        if length > 2 * SIZE_SAMPLES:
+            if isinstance(obj, (set, frozenset)):
+                elements = itertools.islice(obj, 2 * SIZE_SAMPLES)
+            else:
+                elements = itertools.chain(
+                    itertools.islice(obj, SIZE_SAMPLES),
+                    itertools.islice(reversed(obj), SIZE_SAMPLES))
+        else:
+            elements = obj
+        sample = [sizeof(element, depth - 1) for element in elements]
+
+    return size + sum(sample) * length // len(sample)
+
+
+def rss() -> int:
+    '''
+        Return Type: int, the resident set size of the process in bytes, 
+        None if the operating system does not report it.
+    '''
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class LRU(OrderedDict):
+    '''
+        The access clock of each key of a table, the key with the smallest
+        clock of a sample is evicted.
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self._clock = itertools.count(1)
+
+    def touch(self, key):
+        self[key] = next(self._clock)
+        self.move_to_end(key)
+
+    def initial(self) -> int:
+        # The keys which were never accessed are evicted first.
+        return 0
+
+    def score(self, value: int) -> int:
+        return value
+
+
+class LFU(OrderedDict):
+    '''
+        The access counter of each key of a table, the key with the
+        smallest counter of a sample is evicted. Each value holds the
+        counter in its low 8 bits and the time of the last access, in
+        LFU_DECAY periods, in the others.
+    '''
+
+    def touch(self, key):
+        value = self.get(key)
+        counter = LFU_INIT if value is None else self.score(value)
+        if counter < 255:
+            base = max(counter - LFU_INIT, 0)
+            if random.random() * (base * LFU_LOG_FACTOR + 1) < 1:
+                counter += 1
+        self[key] = int(time.monotonic() // LFU_DECAY) << 8 | counter
+        self.move_to_end(key)
+
+    def initial(self) -> int:
+        return int(time.monotonic() // LFU_DECAY) << 8 | LFU_INIT
+
+    def score(self, value: int) -> int:
+        elapsed = int(time.monotonic() // LFU_DECAY) - (value >> 8)
+        return max((value & 255) - elapsed, 0)
+
+
+METADATA = {
+    'lru': LRU,
+    'lfu': LFU
+}
+
+
+class Eviction:
+    '''
+        Keep the estimated memory of the tables under maxmemory.
+
+        The size of each table is estimated from a sample of its entries,
+        so the requests do not pay for the accounting. When a request may
+        use more memory and the estimate is over maxmemory, keys are
+        evicted from the largest table whose policy allows it:
+
+            lru -- the least recently accessed key of a sample.
+
+            lfu -- the least frequently accessed key of a sample.
+
+            ttl -- the key with the nearest deadline, keys without a time
+            to live are kept.
+
+            noeviction -- nothing is evicted, the request is rejected if
+            no other table can free memory.
+
+        The access metadata of the lru and lfu tables is kept in the order
+        of the last access, the sample is taken from the least recently
+        accessed keys at the front.
+    '''
+
+    def __init__(self, maxmemory: int = None, policy: str = 'noeviction'):
+        self.maxmemory = maxmemory
+        # The default policy and the policies set for each table.
+        self.policy = policy
+        self.policies = {}
+        self._metadata = {}
+        self._sizes = {}
+
+    def policy_of(self, table_name: str) -> str:
+        return self.policies.get(table_name, self.policy)
+
+    def touch(self, table_name: str, key):
+        '''
+            Record an access to the key.
+        '''
+        metadata = self._metadata.get(table_name)
+        if metadata is not None:
+            metadata.touch(key)
+
+    def table_size(self, table_name: str, table) -> int:
+        '''
+            Return Type: int, the estimated size of the table in bytes.
+        '''
+        length = len(table)
+        now = time.monotonic()
+        cached = self._sizes.get(table_name)
+        if cached is None or abs(length - cached[0]) > cached[0] >> 3 or \
+                now - cached[2] > SIZE_REFRESH:
+            item_size = (sizeof(table) - sys.getsizeof(table)) / length \
+                if length else 0
+            cached = self._sizes[table_name] = (length, item_size, now)
+        return sys.getsizeof(table) + int(cached[1] * length)
+
+    def used(self, db: dict) -> int:
+        '''
+            Return Type: int, the estimated size of the loaded tables in
+            bytes.
+        '''
+        return sum(
+            self.table_size(table_name, table)
+            for table_name, table in db.items()
+            if type(table) in (dict, list, deque, SortedSet)
+        )
+
+    def free(self, db: dict, expires, aof=None, invalidate=None) -> bool:
+        '''
+            Evict keys until the estimated size of the tables is under
+            maxmemory. The evictions are logged to the append-only file
+            as deletions, and invalidate(table_name, keys) is called for
+            the near caches of the clients and the indexes.
+
+            Return Type: bool, False if the memory is full and no key can
+            be evicted.
+        '''
+        if self.maxmemory is None:
+            return True
+        while self.used(db) > self.maxmemory:
+            if not self._evict(db, expires, aof, invalidate):
+                return False
+        return True
+
+    def compact(self, db: dict):
+        '''
+            Keep the access metadata in line with the tables: add the keys
+            which were never accessed, drop the keys which were deleted and
+            the tables which are gone or changed policy.
+        '''
+        if self.maxmemory is None:
+            return
+        for table_name in list(self._metadata):
+            table = db.get(table_name)
+            if type(table) != dict or not isinstance(
+                    self._metadata[table_name],
+                    METADATA.get(self.policy_of(table_name), ())):
+                del self._metadata[table_name]
+        for table_name in list(self._sizes):
+            if table_name not in db:
+                del self._sizes[table_name]
+
+        for table_name, table in db.items():
+            if type(table) == dict and \
+                    self.policy_of(table_name) in METADATA:
+                self._sync(table_name, table)
+
+    def _sync(self, table_name: str, table: dict) -> OrderedDict:
+        metadata = self._metadata.get(table_name)
+        if metadata is None:
+            metadata = self._metadata[table_name] = \
+                METADATA[self.policy_of(table_name)]()
+        if len(metadata) > 2 * len(table) + 64:
+            for key in [key for key in metadata if key not in table]:
+                del metadata[key]
+        if len(metadata) < len(table):
+            # The keys which were never accessed go to the front.
+            initial = metadata.initial()
+            missing = [key for key in table if key not in metadata]
+            for key in reversed(missing):
+                metadata[key] = initial
+                metadata.move_to_end(key, last=False)
+        return metadata
+
+    def _evict(self, db: dict, expires, aof, invalidate) -> bool:
+        tables = sorted(
+            (
+                (self.table_size(table_name, table), table_name)
+                for table_name, table in db.items()
+                if type(table) == dict and table and
+                self.policy_of(table_name) != 'noeviction'
+            ),
+            reverse=True
+        )
+        for size, table_name in tables:
+            table = db[table_name]
+            if self.policy_of(table_name) == 'ttl':
+                found, key = expires.nearest(table_name)
+            else:
+                found, key = self._sample(table_name, table)
+            if found:
+                table.pop(key, None)
+                expires.persist(table_name, key)
+                if invalidate:
+                    invalidate(table_name, (key,))
+                if aof:
+                    aof.append({
+                        'route': '/cyberdict/delitem',
+                        'table_name': table_name,
+                        'key': key
+                    })
+                return True
+        return False
+
+    def _sample(self, table_name: str, table: dict) -> tuple:
+        '''
+            Return Type: tuple, whether a key was found and the key with
+            the smallest score of a sample.
+        '''
+        metadata = self._metadata.get(table_name)
+        if metadata is None or not metadata:
+            metadata = self._sync(table_name, table)
+
+        sample = []
+        for _ in range(len(metadata)):
+            if len(sample) == EVICTION_SAMPLES:
+                break
+            key, value = metadata.popitem(last=False)
+            # The deleted keys are dropped on the way.
+            if key in table:
+                sample.append((key, value))
+        if not sample:
+            return False, None
+
+        victim = min(sample, key=lambda item: metadata.score(item[1]))
+        # The other keys of the sample go back to the front in order.
+        for key, value in reversed(sample):
+            if key is not victim[0]:
+                metadata[key] = value
+                metadata.move_to_end(key, last=False)
+        return True, victim[0]
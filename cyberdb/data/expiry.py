@@ -0,0 +1,163 @@
+'''
+    Expiry of the keys of CyberDict tables.
+'''
+
+
+import time
+import heapq
+import itertools
+
+from .snapshot import ColdTable
+
+
+# The server removes the expired keys every SWEEP_INTERVAL seconds, at 
+# most SWEEP_BATCH keys at a time.
+SWEEP_INTERVAL = 0.1
+SWEEP_BATCH = 1000
+
+
+class Expires:
+    '''
+        The deadlines of the keys with a time to live.
+
+        deadlines maps each table name to a dictionary of the deadlines of
+        its keys, as Unix timestamps. It is stored with the database, so
+        the deadlines survive snapshots and the append-only file.
+
+        Each table also has a heap of its deadlines, so the expired keys
+        are found without scanning the table. The heap is not updated when
+        a deadline is changed or removed, its outdated entries are skipped
+        when they are popped.
+
+        on_delete(table_name, key) is called for each expired key removed
+        from its table.
+    '''
+
+    def __init__(self, deadlines: dict = None, on_delete=None):
+        self.deadlines = {} if deadlines is None else deadlines
+        self.on_delete = on_delete
+        self._heaps = {}
+        # Break the ties of the heaps, the keys may not be comparable.
+        self._counter = itertools.count()
+        for table_name, table in self.deadlines.items():
+            self._rebuild(table_name)
+
+    def set(self, table_name: str, key, deadline: float):
+        table = self.deadlines.setdefault(table_name, {})
+        table[key] = deadline
+        heap = self._heaps.setdefault(table_name, [])
+        heapq.heappush(heap, (deadline, next(self._counter), key))
+        # Drop the outdated entries when they are the majority.
+        if len(heap) > 2 * len(table) + 64:
+            self._rebuild(table_name)
+
+    def get(self, table_name: str, key) -> float:
+        '''
+            Return Type: float, the deadline of the key, None if it has no
+            time to live.
+        '''
+        table = self.deadlines.get(table_name)
+        if table:
+            return table.get(key)
+        return None
+
+    def persist(self, table_name: str, key):
+        '''
+            Remove the time to live of the key.
+        '''
+        table = self.deadlines.get(table_name)
+        if table:
+            table.pop(key, None)
+
+    def persist_many(self, table_name: str, keys):
+        '''
+            Remove the time to live of the keys.
+        '''
+        table = self.deadlines.get(table_name)
+        if table:
+            for key in keys:
+                table.pop(key, None)
+
+    def drop(self, table_name: str):
+        '''
+            Remove the deadlines of a table which was deleted or cleared.
+        '''
+        self.deadlines.pop(table_name, None)
+        self._heaps.pop(table_name, None)
+
+    def check(self, db: dict, table_name: str, key) -> bool:
+        '''
+            Remove the key from the table if it has expired.
+
+            Return Type: bool, whether the key has expired.
+        '''
+        table = self.deadlines.get(table_name)
+        if not table:
+            return False
+        deadline = table.get(key)
+        if deadline is None or deadline > time.time():
+            return False
+        del table[key]
+        db[table_name].pop(key, None)
+        if self.on_delete:
+            self.on_delete(table_name, key)
+        return True
+
+    def collect(self, db: dict, table_name: str, limit: int = None) -> int:
+        '''
+            Remove the expired keys of the table, at most limit keys.
+
+            Return Type: int, the number of entries popped from the heap.
+        '''
+        table = self.deadlines.get(table_name)
+        heap = self._heaps.get(table_name)
+        if not heap or isinstance(db.get(table_name), ColdTable):
+            return 0
+
+        now = time.time()
+        popped = 0
+        while heap and heap[0][0] <= now:
+            if limit is not None and popped >= limit:
+                break
+            deadline, _, key = heapq.heappop(heap)
+            popped += 1
+            if table.get(key) == deadline:
+                del table[key]
+                db[table_name].pop(key, None)
+                if self.on_delete:
+                    self.on_delete(table_name, key)
+
+        if not table:
+            self.drop(table_name)
+        return popped
+
+    def nearest(self, table_name: str) -> tuple:
+        '''
+            Return Type: tuple, whether a key of the table has a time to
+            live and the key with the nearest deadline.
+        '''
+        table = self.deadlines.get(table_name)
+        heap = self._heaps.get(table_name)
+        while table and heap:
+            deadline, _, key = heap[0]
+            if table.get(key) == deadline:
+                return True, key
+            heapq.heappop(heap)
+        return False, None
+
+    def copy(self) -> dict:
+        '''
+            Return Type: dict, a copy of the deadlines.
+        '''
+        return {
+            table_name: dict(table)
+            for table_name, table in self.deadlines.items()
+        }
+
+    def _rebuild(self, table_name: str):
+        heap = [
+            (deadline, next(self._counter), key)
+            for key, deadline in self.deadlines[table_name].items()
+        ]
+        heapq.heapify(heap)
+        self._heaps[table_name] = heap
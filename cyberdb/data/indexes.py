@@ -0,0 +1,467 @@
+'''
+    Secondary indexes on the fields of the records of CyberDict tables.
+'''
+
+
+import sys
+import numbers
+import decimal
+import datetime
+import fractions
+
+from .sortedset import SortedList
+from .eviction import sizeof
+from ..extensions import CyberDBError, TypeCyberDBError
+
+
+# The kinds of indexes.
+KINDS = ('hash', 'sorted')
+# The types of the values ordered by a sorted index, and their
+# subclasses. Values of the same family are compared with each other, the
+# families are ordered by number. The other real numbers are in the family
+# of the numbers.
+FAMILIES = {
+    bool: 0,
+    int: 0,
+    float: 0,
+    decimal.Decimal: 0,
+    fractions.Fraction: 0,
+    str: 1,
+    bytes: 2,
+    datetime.date: 3,
+    datetime.datetime: 4
+}
+# The family of the datetimes with a time zone, they cannot be compared
+# with the naive datetimes.
+AWARE = 5
+# The types of the values which never compare with the ordered values.
+INCOMPARABLE = (type(None), list, tuple, dict, set, frozenset, complex)
+# A record without the field.
+MISSING = object()
+
+
+def parse_field(field: str) -> tuple:
+    '''
+        Split a field path such as 'address.city' into the keys of the
+        nested dictionaries.
+
+        Return Type: tuple
+    '''
+    if type(field) != str or not field:
+        raise TypeCyberDBError('The field path must be a non-empty str.')
+    return tuple(field.split('.'))
+
+
+def family_of(value) -> int:
+    '''
+        Return Type: int, the family of the value in the order of the
+        sorted indexes, None if the value is not ordered.
+    '''
+    family = FAMILIES.get(type(value))
+    if family is None:
+        for cls in type(value).__mro__:
+            family = FAMILIES.get(cls)
+            if family is not None:
+                break
+        else:
+            if isinstance(value, numbers.Real):
+                family = 0
+    if family == 4 and value.utcoffset() is not None:
+        return AWARE
+    return family
+
+
+def get_field(record, path: tuple):
+    '''
+        Return Type: any, the value of the field path in the record,
+        MISSING if the record has no such field.
+    '''
+    for name in path:
+        if type(record) != dict:
+            return MISSING
+        record = record.get(name, MISSING)
+        if record is MISSING:
+            return MISSING
+    return record
+
+
+class HashIndex:
+    '''
+        The keys of the records by the value of their field, for the
+        equality lookups. The records without the field, or with an
+        unhashable value, are not indexed.
+    '''
+
+    kind = 'hash'
+
+    def __init__(self, field: str):
+        self.field = field
+        self._path = parse_field(field)
+        # The keys of the records of each value.
+        self._keys = {}
+        # The value of each indexed key, to find it when the record is
+        # replaced or deleted.
+        self._values = {}
+
+    def __len__(self):
+        return len(self._values)
+
+    def add(self, key, record):
+        value = get_field(record, self._path)
+        if value is MISSING:
+            return
+        # NaN and the unhashable values are not indexed, a signaling NaN
+        # Decimal raises on comparison.
+        try:
+            if value != value:
+                return
+            keys = self._keys.get(value)
+        except (TypeError, ArithmeticError):
+            self._skipped(key, value)
+            return
+        if keys is None:
+            keys = self._keys[value] = set()
+            self._new_value(value)
+        keys.add(key)
+        self._values[key] = value
+
+    def discard(self, key):
+        value = self._values.pop(key, MISSING)
+        if value is MISSING:
+            return
+        keys = self._keys[value]
+        keys.discard(key)
+        if not keys:
+            del self._keys[value]
+            self._old_value(value)
+
+    def set(self, key, record):
+        self.discard(key)
+        self.add(key, record)
+
+    def clear(self):
+        self._keys.clear()
+        self._values.clear()
+
+    def equal(self, value):
+        '''
+            Iterate over the keys of the records whose field equals value.
+        '''
+        try:
+            return iter(self._keys.get(value, ()))
+        except TypeError:
+            return iter(())
+
+    def size(self) -> int:
+        '''
+            Return Type: int, the estimated size of the index in bytes.
+        '''
+        return sizeof(self._keys) + sizeof(self._values)
+
+    def _skipped(self, key, value):
+        pass
+
+    def _new_value(self, value):
+        pass
+
+    def _old_value(self, value):
+        pass
+
+
+class SortedIndex(HashIndex):
+    '''
+        A hash index which also keeps the distinct values in order, for
+        the range lookups. Numbers, str, bytes, dates and datetimes are
+        ordered, each type with its own kind, the other values are only
+        found by equality. The datetimes with a time zone are ordered
+        apart from the naive ones. A value which still cannot be compared
+        with the ordered values is only found by equality too, so that
+        indexing never fails a write.
+
+        The records whose value may match a range but is not ordered are
+        tracked, a query does not use the ranges of the index while there
+        are such records, see complete.
+    '''
+
+    kind = 'sorted'
+
+    def __init__(self, field: str):
+        super().__init__(field)
+        # The (family, value) pairs of the distinct ordered values.
+        self._order = SortedList()
+        # The distinct values which may match a range but could not be
+        # ordered.
+        self._unordered = set()
+        # The keys of the records whose value may match a range but was
+        # not indexed, such as an unhashable value.
+        self._unindexed = set()
+
+    def discard(self, key):
+        self._unindexed.discard(key)
+        super().discard(key)
+
+    def clear(self):
+        super().clear()
+        self._order = SortedList()
+        self._unordered = set()
+        self._unindexed = set()
+
+    def complete(self) -> bool:
+        '''
+            Return Type: bool, whether range finds every record whose value
+            is in the range, as a scan of the table comparing the values
+            with the bounds does.
+        '''
+        return not self._unordered and not self._unindexed
+
+    def range(self, min_value=None, max_value=None, reverse: bool = False):
+        '''
+            Iterate over the keys of the records whose field is between
+            min_value and max_value included, in the order of the values.
+            None is unbounded, the bounds must be of the same family.
+        '''
+        families = {family_of(bound) for bound in (min_value, max_value)
+                    if bound is not None}
+        if None in families or len(families) > 1:
+            raise TypeCyberDBError(
+                'The bounds must be numbers, str, bytes, dates or datetimes of the same kind.')
+        if families:
+            family, = families
+            start = self._order.bisect_left(
+                (family,) if min_value is None else (family, min_value))
+            stop = self._order.bisect_left((family + 1,)) \
+                if max_value is None else \
+                self._order.bisect_right((family, max_value))
+        else:
+            start, stop = 0, len(self._order)
+
+        for family, value in self._order.islice(start, stop, reverse):
+            yield from self._keys[value]
+
+    def size(self) -> int:
+        return super().size() + sys.getsizeof(self._order) + \
+            len(self._order) * sys.getsizeof((0, 0))
+
+    def _skipped(self, key, value):
+        # The values of the ordered families are only skipped when they
+        # are NaN, which never matches a range.
+        if family_of(value) is None and type(value) not in INCOMPARABLE:
+            self._unindexed.add(key)
+
+    def _new_value(self, value):
+        family = family_of(value)
+        if family is None:
+            if type(value) not in INCOMPARABLE:
+                self._unordered.add(value)
+            return
+        # The order is unchanged when the comparison fails.
+        try:
+            self._order.add((family, value))
+        except (TypeError, ArithmeticError):
+            self._unordered.add(value)
+
+    def _old_value(self, value):
+        if value in self._unordered:
+            self._unordered.discard(value)
+            return
+        family = family_of(value)
+        if family is None:
+            return
+        try:
+            self._order.remove((family, value))
+        except (TypeError, ArithmeticError, ValueError):
+            self._reorder()
+
+    def _reorder(self):
+        '''
+            Order the distinct values again, when values which cannot be
+            compared with each other were both ordered and the order
+            cannot be searched.
+        '''
+        self._order = SortedList()
+        self._unordered = set()
+        for value in self._keys:
+            self._new_value(value)
+
+
+INDEXES = {
+    'hash': HashIndex,
+    'sorted': SortedIndex
+}
+
+
+class Indexes:
+    '''
+        The secondary indexes of the CyberDict tables. An index maps the
+        value of a field path of the records, such as 'status' or
+        'address.city', to the keys of the records, so a lookup does not
+        scan the table. A hash index finds the records equal to a value,
+        a sorted index also finds the records in a range of values.
+
+        definitions maps each table name to the kind of index of each field
+        path. It is stored with the database like the deadlines, so the
+        indexes survive snapshots and the append-only file. The indexes
+        themselves are built from the table when they are first used and
+        then maintained by each write of the table.
+    '''
+
+    def __init__(self, definitions: dict = None):
+        self.definitions = {} if definitions is None else definitions
+        # The table the indexes of each table name were built from, and
+        # its indexes by field path.
+        self._built = {}
+
+    def create(self, db: dict, table_name: str, field: str,
+               kind: str = 'hash') -> bool:
+        '''
+            Index the field path of a table, an index of another kind on
+            the field is replaced.
+
+            Return Type: bool, False if the index already exists.
+        '''
+        if kind not in KINDS:
+            raise CyberDBError(
+                'The kind of index must be one of {}.'.format(', '.join(KINDS)))
+        parse_field(field)
+        table = db[table_name]
+        if type(table) != dict:
+            raise TypeCyberDBError('Only CyberDict tables can be indexed.')
+
+        fields = self.definitions.setdefault(table_name, {})
+        if fields.get(field) == kind:
+            return False
+        fields[field] = kind
+        built = self._built.get(table_name)
+        if built is not None and built[0] is table:
+            built[1][field] = self._build(table, field, kind)
+        else:
+            self.get(db, table_name, field)
+        return True
+
+    def remove(self, table_name: str, field: str) -> bool:
+        '''
+            Return Type: bool, whether the index existed.
+        '''
+        fields = self.definitions.get(table_name)
+        if not fields or field not in fields:
+            return False
+        del fields[field]
+        if not fields:
+            del self.definitions[table_name]
+        built = self._built.get(table_name)
+        if built is not None:
+            built[1].pop(field, None)
+        return True
+
+    def fields(self, table_name: str) -> dict:
+        '''
+            Return Type: dict, the kind of index of each indexed field path
+            of the table.
+        '''
+        return dict(self.definitions.get(table_name, {}))
+
+    def find(self, db: dict, table_name: str, field: str) -> HashIndex:
+        '''
+            Return Type: HashIndex, the index of the field path, None if 
+            the field is not indexed.
+        '''
+        if field not in self.definitions.get(table_name, ()):
+            return None
+        return self.get(db, table_name, field)
+
+    def get(self, db: dict, table_name: str, field: str) -> HashIndex:
+        '''
+            Return Type: HashIndex, the index of the field path, it is
+            built if the table has not been indexed yet.
+        '''
+        table = db[table_name]
+        kind = self.definitions.get(table_name, {}).get(field)
+        if kind is None:
+            raise CyberDBError('There is no index on the field {}.'.format(field))
+        built = self._built.get(table_name)
+        if built is None or built[0] is not table:
+            built = self._built[table_name] = (table, {
+                field: self._build(table, field, kind)
+                for field, kind in self.definitions[table_name].items()
+            })
+        return built[1][field]
+
+    def set(self, table_name: str, key, record):
+        '''
+            Index the record written to the key.
+        '''
+        built = self._built.get(table_name)
+        if built is not None:
+            for index in built[1].values():
+                index.set(key, record)
+
+    def set_many(self, table_name: str, mapping: dict):
+        built = self._built.get(table_name)
+        if built is not None:
+            for index in built[1].values():
+                for key, record in mapping.items():
+                    index.set(key, record)
+
+    def discard(self, table_name: str, key):
+        '''
+            Remove the key which was deleted from the indexes.
+        '''
+        built = self._built.get(table_name)
+        if built is not None:
+            for index in built[1].values():
+                index.discard(key)
+
+    def discard_many(self, table_name: str, keys):
+        built = self._built.get(table_name)
+        if built is not None:
+            for index in built[1].values():
+                for key in keys:
+                    index.discard(key)
+
+    def clear(self, table_name: str):
+        '''
+            Empty the indexes of a table which was cleared.
+        '''
+        built = self._built.get(table_name)
+        if built is not None:
+            for index in built[1].values():
+                index.clear()
+
+    def drop(self, table_name: str):
+        '''
+            Remove the indexes of a table which was deleted.
+        '''
+        self.definitions.pop(table_name, None)
+        self._built.pop(table_name, None)
+
+    def stats(self, table_name: str) -> dict:
+        '''
+            Return Type: dict, the kind, the number of indexed records and
+            the estimated size in bytes of each index of the table. The
+            indexes which are not built yet have no entries and size.
+        '''
+        built = self._built.get(table_name, (None, {}))[1]
+        stats = {}
+        for field, kind in self.definitions.get(table_name, {}).items():
+            index = built.get(field)
+            stats[field] = {
+                'kind': kind,
+                'entries': None if index is None else len(index),
+                'size': None if index is None else index.size()
+            }
+        return stats
+
+    def copy(self) -> dict:
+        '''
+            Return Type: dict, a copy of the definitions.
+        '''
+        return {
+            table_name: dict(fields)
+            for table_name, fields in self.definitions.items()
+        }
+
+    def _build(self, table: dict, field: str, kind: str) -> HashIndex:
+        index = INDEXES[kind](field)
+        for key, record in table.items():
+            index.add(key, record)
+        return index
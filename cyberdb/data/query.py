@@ -0,0 +1,281 @@
+'''
+    Declarative predicates of the server-side queries. A predicate is a
+    dictionary of plain values, it is compiled to functions on the server
+    and no code sent by the client is run.
+'''
+
+
+import re
+import operator
+import itertools
+
+from .indexes import MISSING, parse_field, get_field, family_of
+from ..extensions import CyberDBError
+
+
+# The comparison operators and whether a record without the field matches.
+COMPARISONS = {
+    '$eq': (operator.eq, False),
+    '$ne': (operator.ne, True),
+    '$lt': (operator.lt, False),
+    '$lte': (operator.le, False),
+    '$gt': (operator.gt, False),
+    '$gte': (operator.ge, False)
+}
+# The logical operators, they combine predicates.
+LOGICAL = ('$and', '$or', '$not')
+
+
+def compile_where(where):
+    '''
+        Compile a predicate such as
+
+            {'status': 'active', 'age': {'$gte': 18}}
+
+        into a function of a value returning whether it matches. Each key
+        is a field path of the records with its condition, a condition is
+        a value to be equal to, or a dictionary of operators:
+
+            $eq, $ne, $lt, $lte, $gt, $gte -- compare the field with the
+            argument, values which cannot be compared do not match.
+
+            $in, $nin -- whether the field is in the list of the argument.
+
+            $contains -- whether the field, such as a list of tags,
+            contains the argument.
+
+            $prefix -- whether the str or bytes field starts with the
+            argument.
+
+            $regex -- whether the regular expression of the argument
+            matches a part of the str field.
+
+            $exists -- whether the record has the field.
+
+        $and and $or take a list of predicates, $not a predicate. The
+        operators at the top level of the predicate apply to the value
+        itself, such as {'$gt': 3} for the elements of a CyberList. None
+        matches every value.
+    '''
+    if where is None:
+        return lambda value: True
+    if type(where) != dict:
+        raise CyberDBError('The predicate must be a dict.')
+
+    tests = []
+    operators = {}
+    for name, condition in where.items():
+        if name in LOGICAL:
+            tests.append(_logical(name, condition))
+        elif type(name) == str and name.startswith('$'):
+            operators[name] = condition
+        else:
+            tests.append(_field(parse_field(name), condition))
+    if operators:
+        tests.append(_operators(operators))
+    return _all(tests)
+
+
+def compile_fields(fields):
+    '''
+        Compile a projection, the list of the field paths returned for
+        each record, None returns the whole records.
+
+        Return Type: function of a record returning its projection.
+    '''
+    if fields is None:
+        return lambda record: record
+    if type(fields) not in (list, tuple):
+        raise CyberDBError('The fields must be a list of field paths.')
+    paths = [(field, parse_field(field)) for field in fields]
+
+    def project(record):
+        r = {}
+        for field, path in paths:
+            value = get_field(record, path)
+            if value is not MISSING:
+                r[field] = value
+        return r
+
+    return project
+
+
+def plan(where, find_index) -> list:
+    '''
+        Choose the candidates of a predicate from the indexes, the
+        predicate is still evaluated on each candidate. An equality is
+        preferred to a $in, and a $in to a range of a sorted index.
+
+        find_index(field) returns the index of a field path, or None.
+
+        Return Type: list, the keys of the candidates, None if no index
+        applies and the table is scanned.
+    '''
+    if type(where) != dict:
+        return None
+
+    best = None
+    for name, condition in where.items():
+        if type(name) != str or name.startswith('$'):
+            continue
+        index = find_index(name)
+        if index is None:
+            continue
+        condition = condition if _is_operators(condition) \
+            else {'$eq': condition}
+
+        if '$eq' in condition and _indexable(condition['$eq']):
+            return list(index.equal(condition['$eq']))
+        if '$in' in condition and type(condition['$in']) in (list, tuple) \
+                and all(_indexable(value) for value in condition['$in']):
+            keys = dict.fromkeys(itertools.chain.from_iterable(
+                index.equal(value) for value in condition['$in']))
+            candidate = (1, list(keys))
+        elif index.kind == 'sorted':
+            low = condition.get('$gte', condition.get('$gt'))
+            high = condition.get('$lte', condition.get('$lt'))
+            families = {family_of(bound) for bound in (low, high)
+                        if bound is not None}
+            if not families or None in families or len(families) > 1 or \
+                    not index.complete():
+                continue
+            # The table is scanned if the bounds cannot be compared with
+            # the ordered values.
+            try:
+                candidate = (2, list(index.range(low, high)))
+            except (TypeError, ArithmeticError):
+                continue
+        else:
+            continue
+        if best is None or candidate[0] < best[0]:
+            best = candidate
+
+    return None if best is None else best[1]
+
+
+def _is_operators(condition) -> bool:
+    return type(condition) == dict and bool(condition) and all(
+        type(name) == str and name.startswith('$') for name in condition)
+
+
+def _indexable(value) -> bool:
+    '''
+        Return Type: bool, whether an index can find the value.
+    '''
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return value == value
+
+
+def _all(tests):
+    if len(tests) == 1:
+        return tests[0]
+
+    def test(value):
+        for t in tests:
+            if not t(value):
+                return False
+        return True
+
+    return test
+
+
+def _logical(name: str, condition):
+    if name == '$not':
+        inner = compile_where(condition)
+        return lambda value: not inner(value)
+
+    if type(condition) not in (list, tuple) or not condition:
+        raise CyberDBError('{} takes a list of predicates.'.format(name))
+    tests = [compile_where(where) for where in condition]
+    if name == '$and':
+        return _all(tests)
+    return lambda value: any(t(value) for t in tests)
+
+
+def _field(path: tuple, condition):
+    test = _operators(condition if _is_operators(condition)
+                      else {'$eq': condition})
+
+    def field_test(record):
+        return test(get_field(record, path))
+
+    return field_test
+
+
+def _operators(condition: dict):
+    return _all([_operator(name, argument)
+                 for name, argument in condition.items()])
+
+
+def _operator(name: str, argument):
+    '''
+        Return Type: function of the value of a field, MISSING if the
+        record has no such field, returning whether it matches.
+    '''
+    if name in COMPARISONS:
+        compare, missing = COMPARISONS[name]
+
+        def test(value):
+            if value is MISSING:
+                return missing
+            try:
+                return bool(compare(value, argument))
+            except TypeError:
+                return False
+
+        return test
+
+    if name in ('$in', '$nin'):
+        if type(argument) not in (list, tuple, set, frozenset):
+            raise CyberDBError('{} takes a list.'.format(name))
+        try:
+            members = frozenset(argument)
+        except TypeError:
+            members = list(argument)
+        inside = name == '$in'
+
+        def test(value):
+            if value is MISSING:
+                return not inside
+            try:
+                found = value in members
+            except TypeError:
+                found = any(value == member for member in argument)
+            return found == inside
+
+        return test
+
+    if name == '$contains':
+        def test(value):
+            try:
+                return value is not MISSING and argument in value
+            except TypeError:
+                return False
+
+        return test
+
+    if name == '$prefix':
+        if type(argument) not in (str, bytes):
+            raise CyberDBError('$prefix takes a str or bytes.')
+        kind = type(argument)
+        return lambda value: type(value) == kind and value.startswith(argument)
+
+    if name == '$regex':
+        if type(argument) != str:
+            raise CyberDBError('$regex takes a str.')
+        try:
+            search = re.compile(argument).search
+        except re.error as e:
+            raise CyberDBError('Invalid regular expression: {}.'.format(e))
+        return lambda value: type(value) == str and search(value) is not None
+
+    if name == '$exists':
+        exists = bool(argument)
+        return lambda value: (value is not MISSING) == exists
+
+    if name in LOGICAL:
+        raise CyberDBError('{} is only allowed in a predicate.'.format(name))
+    raise CyberDBError('Unknown operator {}.'.format(name))
@@ -0,0 +1,320 @@
+'''
+    Point-in-time images of the CyberDB database.
+
+    A snapshot file starts with MAGIC, followed by the chunks of every 
+    table and by the index of the chunks. It ends with a footer giving the 
+    position of the index. Each chunk holds up to chunk_items entries of a 
+    table, it is pickled, optionally compressed and checked by a CRC-32, 
+    so the tables can be loaded independently and in parallel.
+'''
+
+
+import os
+import copy
+import zlib
+import pickle
+import struct
+import asyncio
+import itertools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from ..extensions import CorruptedFileCyberDBError
+
+
+MAGIC = b'CYBERDB\x02'
+# The offset and length of the index, and MAGIC again.
+FOOTER = struct.Struct('!QQ8s')
+# The compressions of the chunks.
+COMPRESSIONS = (None, 'zlib')
+# The number of entries of a chunk.
+CHUNK_ITEMS = 10000
+# Smaller snapshots are loaded without worker processes, starting them 
+# would take longer than the load.
+PARALLEL_SIZE = 16 * 1024 * 1024
+
+
+def copy_tables(db: dict) -> dict:
+    '''
+        Copy every table of the database. The routes only replace the 
+        entries of a table and never modify the stored values in place, 
+        so a shallow copy of each table is a point-in-time image.
+    '''
+    return {
+        table_name: copy.copy(table) for table_name, table in db.items()
+    }
+
+
+def table_type(table) -> type:
+    '''
+        The type of a table, dict, list, deque or SortedSet, which may not 
+        be loaded yet.
+    '''
+    if isinstance(table, ColdTable):
+        return table.type
+    return type(table)
+
+
+def dump(data: dict, file_name: str, compress: str = None,
+         chunk_items: int = CHUNK_ITEMS):
+    '''
+        Write the server data to file_name in the chunked format and flush 
+        it to the disk.
+    '''
+    tables = {}
+    with open(file_name, 'wb') as f:
+        f.write(MAGIC)
+        offset = len(MAGIC)
+        for table_name, table in data['db'].items():
+            if isinstance(table, ColdTable):
+                table = table.load()
+            if type(table) == dict:
+                entries = iter(table.items())
+            else:
+                entries = iter(table)
+
+            chunks = []
+            while True:
+                part = list(itertools.islice(entries, chunk_items))
+                if not part:
+                    break
+                chunk = pickle.dumps(part, protocol=pickle.HIGHEST_PROTOCOL)
+                if compress == 'zlib':
+                    chunk = zlib.compress(chunk, 1)
+                f.write(chunk)
+                chunks.append((offset, len(chunk), zlib.crc32(chunk)))
+                offset += len(chunk)
+
+            tables[table_name] = {
+                'type': type(table),
+                'chunks': chunks
+            }
+            if type(table) == deque:
+                tables[table_name]['maxlen'] = table.maxlen
+
+        index = pickle.dumps({
+            'data': {
+                key: value for key, value in data.items() if key != 'db'
+            },
+            'compress': compress,
+            'tables': tables
+        }, protocol=pickle.HIGHEST_PROTOCOL)
+        f.write(index)
+        f.write(FOOTER.pack(offset, len(index), MAGIC))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def is_chunked(file_name: str) -> bool:
+    '''
+        Whether file_name is in the chunked format, the files of the 
+        earlier versions are a single pickle.
+    '''
+    with open(file_name, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def read_chunk(fd: int, chunk: tuple, compress: str) -> bytes:
+    '''
+        Read a chunk, check it and decompress it.
+
+        Return Type: bytes, the pickled entries.
+    '''
+    offset, length, crc = chunk
+    data = os.pread(fd, length, offset)
+    if len(data) != length or zlib.crc32(data) != crc:
+        raise CorruptedFileCyberDBError(
+            'The chunk at offset {} of the snapshot is corrupted.'.format(offset))
+    if compress == 'zlib':
+        data = zlib.decompress(data)
+    return data
+
+
+def _read_chunk_file(file_name: str, chunk: tuple, compress: str) -> bytes:
+    # This is run in a worker process.
+    fd = os.open(file_name, os.O_RDONLY)
+    try:
+        return read_chunk(fd, chunk, compress)
+    finally:
+        os.close(fd)
+
+
+def build_table(table_type: type, parts, maxlen: int = None) -> dict or list:
+    '''
+        Build a table from its unpickled chunks, maxlen is the maximum 
+        length of a deque.
+    '''
+    table = deque(maxlen=maxlen) if table_type == deque else table_type()
+    if table_type == dict:
+        for part in parts:
+            table.update(part)
+    else:
+        table.extend(itertools.chain.from_iterable(parts))
+    return table
+
+
+class Snapshot:
+    '''
+        A snapshot file in the chunked format. The file stays open until 
+        close, so it is still readable if a new snapshot replaces it.
+    '''
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self._fd = os.open(file_name, os.O_RDONLY)
+        try:
+            size = os.fstat(self._fd).st_size
+            footer = os.pread(self._fd, FOOTER.size, size - FOOTER.size)
+            if len(footer) != FOOTER.size:
+                raise CorruptedFileCyberDBError(
+                    'The snapshot {} is truncated.'.format(file_name))
+            offset, length, magic = FOOTER.unpack(footer)
+            if magic != MAGIC:
+                raise CorruptedFileCyberDBError(
+                    'The snapshot {} is truncated.'.format(file_name))
+            index = pickle.loads(os.pread(self._fd, length, offset))
+        except Exception:
+            os.close(self._fd)
+            raise
+
+        # The server data except the tables.
+        self.data = index['data']
+        self.compress = index['compress']
+        self.tables = index['tables']
+
+    def load_table(self, table_name: str) -> dict or list:
+        '''
+            Load one table in the current thread.
+        '''
+        table = self.tables[table_name]
+        parts = (
+            pickle.loads(read_chunk(self._fd, chunk, self.compress))
+            for chunk in table['chunks']
+        )
+        return build_table(table['type'], parts, table.get('maxlen'))
+
+    def load(self, workers: int = None) -> dict:
+        '''
+            Load every table. The chunks are read, checked and decompressed 
+            by worker processes, and unpickled in the current process.
+
+            Parameters:
+
+                workers -- the number of worker processes, the default is the 
+                number of CPUs. With 1 worker or a small snapshot, everything 
+                is done in the current process.
+
+            Return Type: dict, the tables.
+        '''
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        chunks = [
+            chunk for table in self.tables.values() for chunk in table['chunks']
+        ]
+        size = sum(chunk[1] for chunk in chunks)
+        if workers > 1 and len(chunks) > 1 and size >= PARALLEL_SIZE:
+            with ProcessPoolExecutor(min(workers, len(chunks))) as pool:
+                data = list(pool.map(
+                    _read_chunk_file, itertools.repeat(self.file_name),
+                    chunks, itertools.repeat(self.compress)))
+        else:
+            data = [
+                read_chunk(self._fd, chunk, self.compress) for chunk in chunks
+            ]
+
+        db = {}
+        position = 0
+        for table_name, table in self.tables.items():
+            count = len(table['chunks'])
+            parts = (
+                pickle.loads(data[i]) 
+                for i in range(position, position + count)
+            )
+            db[table_name] = build_table(table['type'], parts,
+                                         table.get('maxlen'))
+            # Release the chunks as soon as they are unpickled.
+            data[position:position + count] = [None] * count
+            position += count
+        return db
+
+    def cold_tables(self) -> dict:
+        '''
+            Return Type: dict, a ColdTable for every table.
+        '''
+        return {
+            table_name: ColdTable(self, table_name) 
+            for table_name in self.tables
+        }
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __del__(self):
+        self.close()
+
+
+class ColdTable:
+    '''
+        The place of a table of a snapshot which is not loaded yet. It is 
+        loaded when it is first accessed, and it is copied and pickled as 
+        the table it stands for.
+    '''
+
+    def __init__(self, snapshot: Snapshot, table_name: str):
+        self.snapshot = snapshot
+        self.table_name = table_name
+        self.type = snapshot.tables[table_name]['type']
+        self._future = None
+
+    def load(self) -> dict or list:
+        return self.snapshot.load_table(self.table_name)
+
+    async def aload(self) -> dict or list:
+        '''
+            Load the table in a worker thread, concurrent calls share the 
+            same load.
+        '''
+        if self._future is None:
+            self._future = asyncio.get_running_loop().run_in_executor(
+                None, self.load)
+        return await self._future
+
+    def __copy__(self):
+        return self
+
+    def __reduce_ex__(self, protocol):
+        return self.load().__reduce_ex__(protocol)
+
+
+def fork_dump(data, file_name: str, compress: str = None) -> int:
+    '''
+        Serialize data to file_name in a child process, like Redis BGSAVE. 
+        The child shares the memory of the parent copy-on-write, so it 
+        sees the data as it was when this function was called.
+
+        Return Type: int, the pid of the child process.
+    '''
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            dump(data, file_name, compress)
+        except BaseException:
+            code = 1
+        # Leave without running the cleanup of the parent process.
+        os._exit(code)
+
+    return pid
+
+
+def wait_child(pid: int) -> int:
+    '''
+        Wait for a child process.
+
+        Return Type: int, its exit code.
+    '''
+    pid, status = os.waitpid(pid, 0)
+    return os.waitstatus_to_exitcode(status)
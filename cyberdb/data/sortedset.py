@@ -0,0 +1,412 @@
+'''
+    The sorted set of the CyberSortedSet tables.
+'''
+
+
+import sys
+import math
+import itertools
+from bisect import bisect_left, bisect_right, insort
+
+
+# The length of the buckets of a SortedList, a bucket is split when it
+# grows to twice LOAD.
+LOAD = 1000
+
+
+class SortedList:
+    '''
+        A sorted list of comparable values, like the SortedList of the
+        sortedcontainers package. The values are kept in buckets of up to
+        2 * LOAD values, with the largest value of each bucket in maxes,
+        so a value is found by two binary searches. The lengths of the
+        buckets are summed by a Fenwick tree, so the position of a value
+        and the value at a position are also found in O(log n). Adding or
+        removing a value moves at most 2 * LOAD pointers in its bucket.
+    '''
+
+    def __init__(self, values=()):
+        values = sorted(values)
+        self._lists = [values[i:i + LOAD] for i in range(0, len(values), LOAD)]
+        self._maxes = [bucket[-1] for bucket in self._lists]
+        self._len = len(values)
+        self._build()
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self._lists)
+
+    def __reversed__(self):
+        return itertools.chain.from_iterable(
+            reversed(values) for values in reversed(self._lists))
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + sys.getsizeof(self._lists) + \
+            sys.getsizeof(self._maxes) + sys.getsizeof(self._tree) + \
+            sum(sys.getsizeof(values) for values in self._lists)
+
+    def add(self, value):
+        lists, maxes = self._lists, self._maxes
+        if not maxes:
+            lists.append([value])
+            maxes.append(value)
+            self._len = 1
+            self._build()
+            return
+
+        pos = bisect_right(maxes, value)
+        if pos == len(maxes):
+            pos -= 1
+            lists[pos].append(value)
+            maxes[pos] = value
+        else:
+            insort(lists[pos], value)
+        self._len += 1
+
+        if len(lists[pos]) > 2 * LOAD:
+            values = lists[pos]
+            lists[pos:pos + 1] = [values[:LOAD], values[LOAD:]]
+            maxes[pos:pos + 1] = [values[LOAD - 1], values[-1]]
+            self._build()
+        else:
+            self._update(pos, 1)
+
+    def remove(self, value):
+        '''
+            Remove a value, ValueError is raised if it is not in the list.
+        '''
+        lists, maxes = self._lists, self._maxes
+        pos = bisect_left(maxes, value)
+        if pos == len(maxes):
+            raise ValueError('{!r} is not in the list.'.format(value))
+        values = lists[pos]
+        index = bisect_left(values, value)
+        if values[index] != value:
+            raise ValueError('{!r} is not in the list.'.format(value))
+
+        del values[index]
+        self._len -= 1
+        if values:
+            maxes[pos] = values[-1]
+            self._update(pos, -1)
+        else:
+            del lists[pos]
+            del maxes[pos]
+            self._build()
+
+    def bisect_left(self, value) -> int:
+        '''
+            Return Type: int, the position where value would be inserted
+            before the equal values.
+        '''
+        pos = bisect_left(self._maxes, value)
+        if pos == len(self._maxes):
+            return self._len
+        return self._prefix(pos) + bisect_left(self._lists[pos], value)
+
+    def bisect_right(self, value) -> int:
+        '''
+            Return Type: int, the position where value would be inserted
+            after the equal values.
+        '''
+        pos = bisect_right(self._maxes, value)
+        if pos == len(self._maxes):
+            return self._len
+        return self._prefix(pos) + bisect_right(self._lists[pos], value)
+
+    def islice(self, start: int, stop: int, reverse: bool = False):
+        '''
+            Iterate over the values at the positions start to stop, stop
+            excluded, in reverse order if reverse is True.
+        '''
+        start, stop = max(start, 0), min(stop, self._len)
+        if start >= stop:
+            return iter(())
+        if reverse:
+            pos, index = self._locate(stop - 1)
+            first = itertools.islice(reversed(self._lists[pos]),
+                                     len(self._lists[pos]) - 1 - index, None)
+            rest = (reversed(values) for values in reversed(self._lists[:pos]))
+        else:
+            pos, index = self._locate(start)
+            first = itertools.islice(self._lists[pos], index, None)
+            rest = self._lists[pos + 1:]
+        return itertools.islice(
+            itertools.chain(first, itertools.chain.from_iterable(rest)),
+            stop - start)
+
+    def _locate(self, index: int) -> tuple:
+        '''
+            Return Type: tuple, the bucket of the value at the position
+            index and its position in the bucket.
+        '''
+        # Descend the Fenwick tree to the last bucket ending before index.
+        tree = self._tree
+        pos = 0
+        step = 1 << (len(tree).bit_length() - 1) if tree else 0
+        while step:
+            if pos + step <= len(tree) and tree[pos + step - 1] <= index:
+                pos += step
+                index -= tree[pos - 1]
+            step >>= 1
+        return pos, index
+
+    def _prefix(self, pos: int) -> int:
+        '''
+            Return Type: int, the number of values in the buckets before
+            pos.
+        '''
+        tree = self._tree
+        total = 0
+        while pos > 0:
+            total += tree[pos - 1]
+            pos &= pos - 1
+        return total
+
+    def _update(self, pos: int, delta: int):
+        tree = self._tree
+        pos += 1
+        while pos <= len(tree):
+            tree[pos - 1] += delta
+            pos += pos & -pos
+
+    def _build(self):
+        tree = [len(values) for values in self._lists]
+        for pos in range(1, len(tree) + 1):
+            parent = pos + (pos & -pos)
+            if parent <= len(tree):
+                tree[parent - 1] += tree[pos - 1]
+        self._tree = tree
+
+
+class SortedSet:
+    '''
+        Unique members ordered by their scores, like the sorted sets of
+        Redis. The scores are ints or floats, the members with the same
+        score are ordered by member, so they must be comparable, such as
+        str. A dictionary gives the score of each member, and a
+        SortedList of (score, member) pairs gives the order, so adding
+        and removing members, their rank and the start of a range are
+        O(log n).
+
+        Iterating over a SortedSet yields the (member, score) pairs in
+        order, and extend adds such pairs, like a list of pairs for the
+        snapshots.
+    '''
+
+    def __init__(self, mapping=None):
+        self._scores = {}
+        if isinstance(mapping, dict):
+            mapping = mapping.items()
+        self._load(mapping or ())
+
+    def __len__(self):
+        return len(self._scores)
+
+    def __contains__(self, member):
+        return member in self._scores
+
+    def __iter__(self):
+        return ((member, score) for score, member in self._order)
+
+    def __repr__(self):
+        return 'SortedSet({!r})'.format(dict(self))
+
+    def __copy__(self):
+        table = SortedSet()
+        table._scores = dict(self._scores)
+        order = table._order
+        order._lists = [list(values) for values in self._order._lists]
+        order._maxes = list(self._order._maxes)
+        order._len = self._order._len
+        order._tree = list(self._order._tree)
+        return table
+
+    def __reduce__(self):
+        return (SortedSet, (self._scores,))
+
+    def __sizeof__(self):
+        # The size of the order, the members and scores are counted with
+        # the dictionary.
+        return object.__sizeof__(self) + sys.getsizeof(self._order) + \
+            len(self._order) * sys.getsizeof((0, 0))
+
+    def add(self, member, score) -> bool:
+        '''
+            Add the member or change its score.
+
+            Return Type: bool, whether the member is new.
+        '''
+        check_score(score)
+        old = self._scores.get(member)
+        if old == score:
+            return False
+        # The new pair is added first, if the member cannot be compared
+        # with the members of the same score the set is unchanged.
+        self._order.add((score, member))
+        if old is not None:
+            self._order.remove((old, member))
+        self._scores[member] = score
+        return old is None
+
+    def update(self, mapping: dict) -> int:
+        '''
+            Add the members of the mapping or change their scores, all of
+            them or none: if a member cannot be ordered, the members added
+            before it are undone.
+
+            Return Type: int, the number of new members.
+        '''
+        for score in mapping.values():
+            check_score(score)
+        # The members applied and their old scores.
+        applied = []
+        try:
+            for member, score in mapping.items():
+                applied.append((member, self._scores.get(member)))
+                self.add(member, score)
+        except TypeError:
+            # The last member failed and was left unchanged.
+            applied.pop()
+            for member, old in reversed(applied):
+                if old is None:
+                    self.remove(member)
+                else:
+                    self.add(member, old)
+            raise
+        return sum(old is None for member, old in applied)
+
+    def extend(self, pairs):
+        '''
+            Add the (member, score) pairs, an empty set is sorted at once.
+        '''
+        if self._scores:
+            self.update(dict(pairs))
+        else:
+            self._load(pairs)
+
+    def remove(self, member) -> bool:
+        '''
+            Return Type: bool, whether the member was in the set.
+        '''
+        score = self._scores.pop(member, None)
+        if score is None:
+            return False
+        self._order.remove((score, member))
+        return True
+
+    def score(self, member):
+        '''
+            Return Type: int or float, None if the member is not in the set.
+        '''
+        return self._scores.get(member)
+
+    def rank(self, member, reverse: bool = False) -> int:
+        '''
+            Return Type: int, the position of the member from the lowest
+            score, or from the highest if reverse is True. None if the
+            member is not in the set.
+        '''
+        score = self._scores.get(member)
+        if score is None:
+            return None
+        rank = self._order.bisect_left((score, member))
+        return len(self._order) - 1 - rank if reverse else rank
+
+    def range(self, start: int = 0, stop: int = None,
+              reverse: bool = False):
+        '''
+            Iterate over the (member, score) pairs from the rank start to
+            stop excluded, negative ranks count from the end like the
+            indexes of a list.
+        '''
+        start, stop, _ = slice(start, stop).indices(len(self._order))
+        if reverse:
+            # The ranks count from the highest score.
+            start, stop = len(self._order) - stop, len(self._order) - start
+        return ((member, score) for score, member in
+                self._order.islice(start, stop, reverse))
+
+    def range_by_score(self, min_score=None, max_score=None,
+                       reverse: bool = False, offset: int = 0,
+                       count: int = None):
+        '''
+            Iterate over the (member, score) pairs with a score between
+            min_score and max_score included, None is unbounded. The pairs
+            are skipped up to offset and at most count are returned, from
+            the highest score if reverse is True.
+        '''
+        start, stop = self._bounds(min_score, max_score)
+        if reverse:
+            stop -= offset
+        else:
+            start += offset
+        if count is not None:
+            if reverse:
+                start = max(start, stop - count)
+            else:
+                stop = min(stop, start + count)
+        return ((member, score) for score, member in
+                self._order.islice(start, stop, reverse))
+
+    def count(self, min_score=None, max_score=None) -> int:
+        '''
+            Return Type: int, the number of members with a score between
+            min_score and max_score included.
+        '''
+        start, stop = self._bounds(min_score, max_score)
+        return max(stop - start, 0)
+
+    def clear(self):
+        self._scores.clear()
+        self._order = SortedList()
+
+    def _load(self, pairs):
+        scores = dict(self._scores)
+        for member, score in pairs:
+            check_score(score)
+            scores[member] = score
+        self._order = SortedList(
+            (score, member) for member, score in scores.items())
+        self._scores = scores
+
+    def _bounds(self, min_score, max_score) -> tuple:
+        '''
+            Return Type: tuple, the positions of the first pair with a
+            score of at least min_score and after the last with at most
+            max_score.
+        '''
+        # Every member sorts after (score,) and before (score, INF).
+        start = 0 if min_score is None else \
+            self._order.bisect_left((min_score,))
+        stop = len(self._order) if max_score is None else \
+            self._order.bisect_right((max_score, INF))
+        return start, stop
+
+
+class Infinity:
+    '''
+        Greater than any member, the bound of the pairs of a score.
+    '''
+
+    def __lt__(self, other):
+        return False
+
+    def __gt__(self, other):
+        return True
+
+    def __eq__(self, other):
+        return other is self
+
+    def __hash__(self):
+        return 0
+
+
+INF = Infinity()
+
+
+def check_score(score):
+    if type(score) not in (int, float) or math.isnan(score):
+        raise TypeError('The score must be an int or a float, and not NaN.')
@@ -0,0 +1,220 @@
+'''
+    The key functions of the CyberList sorts, and the orders the lists are
+    kept sorted in.
+'''
+
+
+import functools
+
+from .indexes import parse_field
+from ..extensions import CyberDBError, TypeCyberDBError
+
+
+# The number of key functions compiled from field paths which are cached.
+FIELD_KEYS = 256
+
+
+@functools.lru_cache(maxsize=FIELD_KEYS)
+def field_key(field: str):
+    '''
+        Compile a field path such as 'address.city' into a key function.
+        Each name of the path is the key of a dictionary, or the attribute
+        of another object.
+
+        Return Type: function of an element returning the value of its
+        field.
+    '''
+    path = parse_field(field)
+
+    def key(value):
+        for name in path:
+            try:
+                value = value[name] if type(value) == dict else \
+                    getattr(value, name)
+            except (KeyError, AttributeError):
+                raise CyberDBError(
+                    'An element has no field {}.'.format(field)) from None
+        return value
+
+    return key
+
+
+def position(length: int, index) -> int:
+    '''
+        Return Type: int, the first position of a list of the length which
+        is written by the index or slice, like the positions of insert.
+    '''
+    if type(index) == slice:
+        positions = range(*index.indices(length))
+        if not positions:
+            return length
+        return positions[-1] if positions.step < 0 else positions[0]
+    if index < 0:
+        index += length
+    return min(max(index, 0), length)
+
+
+def merge(values: list, start: int, key=None, reverse: bool = False):
+    '''
+        Sort a list whose elements up to start are already sorted. The
+        other elements are sorted and their positions in the sorted part
+        are found by binary search, so the key is only called for the new
+        elements and the probes. When the new elements are too many, the
+        whole list is sorted.
+
+        The result is the same as values.sort(key=key, reverse=reverse),
+        the list is changed in place.
+    '''
+    count = len(values) - start
+    if count <= 0:
+        return
+    if start <= 0 or count * start.bit_length() > start:
+        values.sort(key=key, reverse=reverse)
+        return
+
+    tail = values[start:]
+    tail.sort(key=key, reverse=reverse)
+    merged = []
+    lo = prev = 0
+    for value in tail:
+        k = value if key is None else key(value)
+        hi = start
+        # The position after the equal elements, as the sort is stable.
+        while lo < hi:
+            mid = (lo + hi) // 2
+            m = values[mid] if key is None else key(values[mid])
+            if (m < k) if reverse else (k < m):
+                hi = mid
+            else:
+                lo = mid + 1
+        merged += values[prev:lo]
+        merged.append(value)
+        prev = lo
+    merged += values[prev:start]
+    values[:] = merged
+
+
+class SortKeys:
+    '''
+        The key functions registered on the server by name. A sort takes
+        the name of a registered key, or a field path, so no code of the
+        client is run on the server.
+    '''
+
+    def __init__(self):
+        self._functions = {}
+
+    def register(self, name: str, func):
+        if type(name) != str or not name:
+            raise TypeCyberDBError('The name of the key must be a non-empty str.')
+        if not callable(func):
+            raise TypeCyberDBError('The key must be callable.')
+        self._functions[name] = func
+
+    def get(self, key: str = None, field: str = None):
+        '''
+            Return Type: function, the registered key of the name key, or
+            the key compiled from the field path, None sorts the elements
+            themselves.
+        '''
+        if key is not None and field is not None:
+            raise CyberDBError('A sort takes a key or a field, not both.')
+        if field is not None:
+            return field_key(field)
+        if key is None:
+            return None
+        if type(key) != str:
+            raise TypeCyberDBError(
+                'The key must be the name of a key registered with '
+                'Server.register_sort_key.')
+        func = self._functions.get(key)
+        if func is None:
+            raise CyberDBError(
+                'The key {} is not registered on the server.'.format(key))
+        return func
+
+
+class SortOrders:
+    '''
+        The orders the CyberList tables are kept sorted in. An order is
+        the (key, field, reverse) of the sort, the key is the name of a
+        registered key.
+
+        definitions maps each table name to its order. It is stored with
+        the database like the deadlines, so the orders survive snapshots
+        and the append-only file. For each table, the number of its
+        leading elements which are sorted is tracked: appending keeps it,
+        the other writes lower it to the first position they change. A
+        sort in the order of the table then only sorts the elements after
+        them, see merge.
+    '''
+
+    def __init__(self, definitions: dict = None):
+        self.definitions = {} if definitions is None else definitions
+        # The table the sorted elements of each table name were counted
+        # in, and the number of its leading elements in order.
+        self._sorted = {}
+
+    def sort(self, table: list, table_name: str, order: tuple, key,
+             maintain: bool = None):
+        '''
+            Sort the table in the order. maintain True keeps the table
+            sorted in the order, False stops it, None leaves it unchanged.
+        '''
+        if maintain:
+            self.definitions[table_name] = order
+        elif maintain is not None:
+            self.remove(table_name)
+
+        reverse = order[2]
+        state = self._sorted.pop(table_name, None)
+        if self.definitions.get(table_name) != order:
+            table.sort(key=key, reverse=reverse)
+            return
+
+        start = 0
+        if state is not None and state[0] is table:
+            start = state[1]
+        # A key which fails leaves the table partly sorted, it is counted
+        # again by the next sort.
+        merge(table, start, key, reverse)
+        self._sorted[table_name] = (table, len(table))
+
+    def remove(self, table_name: str) -> bool:
+        '''
+            Return Type: bool, whether the table was kept sorted.
+        '''
+        self._sorted.pop(table_name, None)
+        return self.definitions.pop(table_name, None) is not None
+
+    def get(self, table_name: str) -> tuple:
+        '''
+            Return Type: tuple, the (key, field, reverse) order of the
+            table, None if it is not kept sorted.
+        '''
+        return self.definitions.get(table_name)
+
+    def changed(self, table_name: str, position: int):
+        '''
+            The elements from position were replaced, inserted or
+            reordered.
+        '''
+        state = self._sorted.get(table_name)
+        if state is not None and position < state[1]:
+            self._sorted[table_name] = (state[0], position)
+
+    def removed(self, table_name: str, position: int = None):
+        '''
+            One element was removed at position, None if the position is
+            unknown. The sorted elements stay in order.
+        '''
+        state = self._sorted.get(table_name)
+        if state is not None and state[1] and \
+                (position is None or position < state[1]):
+            self._sorted[table_name] = (state[0], state[1] - 1)
+
+    def copy(self) -> dict:
+        '''
+            Return Type: dict, a copy of the definitions.
+        '''
+        return dict(self.definitions)
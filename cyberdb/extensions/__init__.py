@@ -48,3 +48,9 @@ class WrongTableNameCyberDBError(CyberDBError):
 
 class WrongInputCyberDBError(CyberDBError):
     pass
+
+class CorruptedFileCyberDBError(CyberDBError):
+    pass
+
+class OutOfMemoryCyberDBError(CyberDBError):
+    pass
@@ -0,0 +1,124 @@
+'''
+    Challenge-response authentication of the connections.
+
+    When a connection opens, the server sends a random challenge. The 
+    client answers with its own random nonce and a proof, the HMAC-SHA256 
+    of both nonces keyed by the password. The server checks it and answers 
+    with its own proof, so the client also knows the server has the 
+    password. The password itself is never sent.
+
+    With encryption, both ends derive a session key from the password and 
+    the two nonces, and every following frame is encrypted and 
+    authenticated with AES-256-GCM under that key.
+'''
+
+
+import os
+import hmac
+import struct
+import hashlib
+
+from Crypto.Cipher import AES
+
+try:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    from cryptography.exceptions import InvalidTag
+except ImportError:
+    AESGCM = None
+
+
+# The length of the nonces in bytes.
+NONCE_SIZE = 16
+# The GCM nonce of a frame is the direction followed by the number of the 
+# frame, so a frame cannot be replayed, reordered or reflected.
+CLIENT = b'\x00\x00\x00\x01'
+SERVER = b'\x00\x00\x00\x02'
+COUNTER = struct.Struct('!Q')
+TAG_SIZE = 16
+
+
+def new_nonce() -> bytes:
+    return os.urandom(NONCE_SIZE)
+
+
+def sign(password: str, role: bytes, *nonces: bytes) -> bytes:
+    '''
+        The proof of role (b'client' or b'server') over the nonces.
+    '''
+    return hmac.new(password.encode(), role + b''.join(nonces),
+                    hashlib.sha256).digest()
+
+
+def verify(proof, expected: bytes) -> bool:
+    return type(proof) == bytes and hmac.compare_digest(proof, expected)
+
+
+def derive_key(password: str, challenge: bytes, nonce: bytes) -> bytes:
+    '''
+        The session key of a connection.
+    '''
+    return sign(password, b'session', challenge, nonce)
+
+
+class Session:
+    '''
+        Encrypt and authenticate the frames of a connection with 
+        AES-256-GCM. The cryptography package, a dependency of CyberDB, is 
+        used. pycryptodome is only used if cryptography cannot be imported, 
+        it is much slower for small frames.
+    '''
+
+    def __init__(self, key: bytes, client: bool):
+        self._key = key
+        self._aead = AESGCM(key) if AESGCM else None
+        if client:
+            self._send_prefix, self._receive_prefix = CLIENT, SERVER
+        else:
+            self._send_prefix, self._receive_prefix = SERVER, CLIENT
+        self._sent = 0
+        self._received = 0
+
+    def send_nonce(self) -> bytes:
+        '''
+            The nonce of the next frame sent, frames must be sealed in the 
+            order of their nonces.
+        '''
+        self._sent += 1
+        return self._send_prefix + COUNTER.pack(self._sent)
+
+    def receive_nonce(self) -> bytes:
+        '''
+            The nonce of the next frame received.
+        '''
+        self._received += 1
+        return self._receive_prefix + COUNTER.pack(self._received)
+
+    def seal(self, data: bytes, nonce: bytes = None) -> bytes:
+        '''
+            Encrypt data, the tag is appended to the ciphertext.
+        '''
+        if nonce is None:
+            nonce = self.send_nonce()
+        if self._aead:
+            return self._aead.encrypt(nonce, data, None)
+        cipher = AES.new(self._key, AES.MODE_GCM, nonce=nonce)
+        ciphertext, tag = cipher.encrypt_and_digest(data)
+        return ciphertext + tag
+
+    def open(self, data: bytes, nonce: bytes = None) -> bytes:
+        '''
+            Decrypt data, raising ValueError if it was not sealed by the 
+            other end with the same key.
+        '''
+        if nonce is None:
+            nonce = self.receive_nonce()
+        if len(data) < TAG_SIZE:
+            raise ValueError('The frame is too short.')
+        if self._aead:
+            try:
+                return self._aead.decrypt(nonce, data, None)
+            except InvalidTag:
+                raise ValueError('The frame failed the authentication.')
+        cipher = AES.new(self._key, AES.MODE_GCM, nonce=nonce)
+        view = memoryview(data)
+        return cipher.decrypt_and_verify(view[:-TAG_SIZE], view[-TAG_SIZE:])
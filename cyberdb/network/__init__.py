@@ -1,13 +1,41 @@
-import math
 import socket
+import struct
 import asyncio
+import weakref
 
 from ..data import datas
 from ..extensions import CyberDBError, DisconCyberDBError, \
     WrongPasswordCyberDBError
 
 
-SLICE_SIZE = 4096
+# Every message is sent as one frame: a fixed-size binary header holding
+# the payload length, followed by the payload itself. The receiver reads
+# exactly that many bytes, so a request costs a single round trip.
+HEADER = struct.Struct('!Q')
+
+
+# The DataParsing of each client connection, set up by its handshake with 
+# the codec and session of the connection. Streams over the connection use 
+# it in place of the DataParsing of the client.
+connections = weakref.WeakKeyDictionary()
+# The sockets closed because the connection was lost, unlike the sockets 
+# closed after an error response of the server.
+disconnected = weakref.WeakSet()
+
+
+def set_nodelay(s: socket.socket):
+    '''
+        Disable Nagle's algorithm, small frames are sent immediately.
+    '''
+    if s is not None and s.family in (socket.AF_INET, socket.AF_INET6):
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+def pack_frame(data: bytes) -> bytes:
+    '''
+        Prefix the payload with its length header.
+    '''
+    return HEADER.pack(len(data)) + data
 
 
 class AioStream:
@@ -23,33 +51,20 @@ class AioStream:
     ):
         self._reader = reader
         self._writer = writer
-        self._dp = dp
+        self._dp = connections.get(writer, dp) if writer is not None else dp
 
     async def read(self) -> dict:
         reader, writer = self._reader, self._writer
 
-        # Gets the number of times TCP loops to receive data.
-        number_of_times = await reader.read(SLICE_SIZE)
-
-        # The client actively disconnects.
-        if number_of_times == b'':
+        try:
+            header = await reader.readexactly(HEADER.size)
+            length, = HEADER.unpack(header)
+            data = await reader.readexactly(length)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # The other end actively disconnects.
             raise DisconCyberDBError('The TCP connection was disconnected by the other end.')
 
-        r = self._dp.data_to_obj(number_of_times)
-        if r['code'] != 1:
-            writer.close()
-            raise WrongPasswordCyberDBError(r['errors-code'])
-        number_of_times = r['content']
-
-        # Informs the client that it is ready to receive data.
-        ready = self._dp.obj_to_data('ready')
-        writer.write(ready)
-        await writer.drain()
-
-        buffer = [await reader.read(SLICE_SIZE) for i in range(number_of_times)]
-        data = b''.join(buffer) # Splice into complete data.
-
-        r = self._dp.data_to_obj(data)
+        r = await self._dp.adata_to_obj(data)
         if r['code'] != 1:
             writer.close()
             raise WrongPasswordCyberDBError(r['errors-code'])
@@ -57,31 +72,35 @@ class AioStream:
         return r['content']
 
     async def write(self, obj: dict):
-        reader, writer = self._reader, self._writer
+        writer = self._writer
 
-        data = self._dp.obj_to_data(obj)
+        data = await self._dp.aobj_to_data(obj)
 
-        # The number of times the other end TCP loops to 
-        # receive data.
-        number_of_times = self._dp.obj_to_data(
-            math.ceil(len(data) / SLICE_SIZE)
-        )
-        writer.write(number_of_times)
-        await writer.drain()
-
-        # Get the client's readiness status.
-        ready = await reader.read(SLICE_SIZE)
-        r = self._dp.data_to_obj(ready)
-        if r['code'] != 1:
-            writer.close()
-            raise WrongPasswordCyberDBError(r['errors-code'])
-        ready = r['content']
-
-        if ready != 'ready':
-            raise RuntimeError('error')
+        try:
+            writer.write(pack_frame(data))
+            await writer.drain()
+        except ConnectionError:
+            raise DisconCyberDBError('The TCP connection was disconnected by the other end.')
 
-        writer.write(data)
-        await writer.drain()
+    def push(self, obj: dict) -> int:
+        '''
+            Write obj without waiting for the other end to read it, the
+            server pushes messages this way while it serves another
+            connection. The frame is encrypted at once, in the order of
+            the frames of the connection.
+
+            Return Type: int, the number of bytes waiting to be sent.
+        '''
+        return self.push_data(self._dp.obj_to_data(obj))
+
+    def push_data(self, data: bytes) -> int:
+        '''
+            push with the payload already encoded by the DataParsing of
+            the connection.
+        '''
+        writer = self._writer
+        writer.write(pack_frame(data))
+        return writer.transport.get_write_buffer_size()
 
     def get_addr(self):
         return self._writer.get_extra_info('peername')
@@ -94,28 +113,35 @@ class Stream:
 
     def __init__(self, s: socket.socket, dp: datas.DataParsing):
         self._s = s
-        self._dp = dp
-        
-    def read(self) -> dict:
-        # Gets the number of times TCP loops to receive data.
-        number_of_times = self._s.recv(SLICE_SIZE)
-
-        # The client actively disconnects.
-        if number_of_times == b'':
-            raise DisconCyberDBError('The TCP connection was disconnected by the other end. It is also possible that the password entered by the client is incorrect.')
-
-        r = self._dp.data_to_obj(number_of_times)
-        if r['code'] != 1:
-            self._s.close()
-            raise WrongPasswordCyberDBError(r['errors-code'])
-        number_of_times = r['content']
+        self._dp = connections.get(s, dp) if s is not None else dp
+
+    def _recv_exactly(self, n: int) -> bytes:
+        '''
+            Receive exactly n bytes, recv may return fewer bytes than requested.
+        '''
+        buffer = bytearray(n)
+        view = memoryview(buffer)
+        received = 0
+        while received < n:
+            try:
+                size = self._s.recv_into(view[received:], n - received)
+            except AttributeError:
+                raise DisconCyberDBError('There is no connection to the CyberDB server.')
+            except OSError:
+                size = 0
+            # The other end actively disconnects.
+            if size == 0:
+                # The socket is closed so that the connection pool discards 
+                # it instead of handing it out again.
+                disconnected.add(self._s)
+                self._s.close()
+                raise DisconCyberDBError('The TCP connection was disconnected by the other end. It is also possible that the password entered by the client is incorrect.')
+            received += size
+        return bytes(buffer)
 
-        # Informs the client that it is ready to receive data.
-        ready = self._dp.obj_to_data('ready')
-        self._s.sendall(ready)
-
-        buffer = [self._s.recv(SLICE_SIZE) for i in range(number_of_times)]
-        data = b''.join(buffer) # Splice into complete data.
+    def read(self) -> dict:
+        length, = HEADER.unpack(self._recv_exactly(HEADER.size))
+        data = self._recv_exactly(length)
 
         r = self._dp.data_to_obj(data)
         if r['code'] != 1:
@@ -125,36 +151,13 @@ class Stream:
         return r['content']
     
     def write(self, obj: dict):
-        obj['password'] = self._dp._secret.key
-        
         data = self._dp.obj_to_data(obj)
-        
-        # The number of times the other end TCP loops to 
-        # receive data.
-        number_of_times = self._dp.obj_to_data(
-            math.ceil(len(data) / SLICE_SIZE)
-        )
+
         try:
-            self._s.sendall(number_of_times)
-        except BrokenPipeError:
+            self._s.sendall(pack_frame(data))
+        except OSError:
+            disconnected.add(self._s)
+            self._s.close()
             raise DisconCyberDBError('The TCP connection has been lost, please run proxy.connect() to regain the connection.')
         except AttributeError:
             raise DisconCyberDBError('There is no connection to the CyberDB server.')
-        
-        # Get the client's readiness status.
-        ready = self._s.recv(SLICE_SIZE)
-        try:
-            r = self._dp.data_to_obj(ready)
-        except EOFError as e:
-            raise DisconCyberDBError('The TCP connection has been lost, please run proxy.connect() to regain the connection.')
-        
-        if r['code'] != 1:
-            self._s.close()
-            raise WrongPasswordCyberDBError(r['errors-code'])
-        ready = r['content']
-
-        if ready != 'ready':
-            raise RuntimeError('error')
-        
-        self._s.sendall(data)
-    
\ No newline at end of file
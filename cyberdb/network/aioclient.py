@@ -1,14 +1,21 @@
+import time
 import asyncio
+from collections import deque
+from typing import List, Tuple, Dict
 
 from obj_encrypt import Secret
 
-from . import AioStream
+from . import AioStream, connections, set_nodelay
+from .cache import NearCache, MISSING, RETRY
 from ..data import datas
-from ..extensions import MyThread, CyberDBError
-from ..extensions.signature import Signature
+from ..extensions import auth, CyberDBError, DisconCyberDBError, \
+    WrongInputCyberDBError, WrongPasswordCyberDBError, \
+    WrongTableNameCyberDBError
 
 
-result = None # Check whether the connection is successful
+# The number of messages a Subscriber holds before it stops reading its 
+# connection, the server then buffers them up to its own limit.
+MAX_MESSAGES = 1000
 
 
 class Connection:
@@ -23,134 +30,1391 @@ class Connection:
     ):
         self.reader = reader
         self.writer = writer
+        # Requests queued by an open Pipeline, None when not pipelining.
+        self.pipeline = None
+        # Placeholders of requests sent ahead by prefetching iterators,
+        # their responses are read in order before the connection is
+        # used again.
+        self.pending = []
+
+    async def settle(self, dp: datas.DataParsing):
+        '''
+            Read the responses of the requests sent ahead into their
+            placeholders.
+        '''
+        while self.pending:
+            placeholder = self.pending.pop(0)
+            placeholder['server_obj'] = await AioStream(
+                self.reader, self.writer, dp).read()
 
 
 class ConPool:
     '''
         Maintain connection pool.
+
+        The pool is bounded by max_con. When all connections are in use, 
+        coroutines wait in a first in, first out queue and returned 
+        connections are handed to the first waiter. min_con connections 
+        are opened when the pool is first used, connections idle for more 
+        than time_out seconds are closed by a reaper task, and closed or 
+        broken connections are discarded instead of being returned to 
+        the pool.
     '''
-    
-    def __init__(self, host: str, port: str, dp: datas.DataParsing):
+
+    def __init__(self, host: str, port: str, dp: datas.DataParsing,
+                 time_out: int = None, min_con: int = 0,
+                 max_con: int = None, wait_timeout: float = None,
+                 check_idle: int = 60, cache: NearCache = None):
         self._host = host
         self._port = port
         self._dp = dp
-        self._connections = []
+        self._time_out = time_out
+        self._min_con = min_con
+        self._max_con = max_con
+        self._wait_timeout = wait_timeout
+        self._check_idle = check_idle
+        # Idle connections as (reader, writer, timestamp of return).
+        self._connections = deque()
+        # Futures of the coroutines waiting for a connection.
+        self._waiters = deque()
+        # The number of open connections, idle, in use or being opened.
+        self._size = 0
+        self._started = False
+        self._reaper = None
+        # The near cache of the client, its invalidation task is started 
+        # with the pool.
+        self._cache = cache
+        self._invalidator = None
+        self.stats = {
+            'hits': 0,
+            'creations': 0,
+            'waits': 0,
+            'checks': 0,
+            'discards': 0
+        }
+
+    async def start(self):
+        '''
+            Open min_con connections and start the reaper task and the 
+            invalidation task of the near cache, this is run on the first 
+            use of the pool.
+        '''
+        if self._started:
+            return
+        self._started = True
+
+        number = self._min_con - self._size
+        if self._max_con is not None:
+            number = min(number, self._max_con - self._size)
+        if number > 0:
+            self._size += number
+            connections = await asyncio.gather(
+                *(self._create() for i in range(number)))
+            for reader, writer in connections:
+                self.put(reader, writer)
+
+        if self._time_out:
+            self._reaper = asyncio.ensure_future(self._reap())
+        if self._cache is not None:
+            self._invalidator = asyncio.ensure_future(receive_invalidations(
+                self._host, self._port, self._dp, self._cache))
 
     async def get(self):
         '''
-            Get the connection from the connection pool.
+            Get the connection from the connection pool. If max_con 
+            connections are in use, wait until one is returned, raising 
+            CyberDBError after wait_timeout seconds.
         '''
-        if self._connections:
-            # If the connection is full, the loop waits until a connection 
-            # is free.
-            while self._connections:
-                reader, writer = self._connections.pop(0)
-                if await self.exam(reader, writer):
-                    return reader, writer
+        if not self._started:
+            await self.start()
+
+        while True:
+            if self._connections and not self._waiters:
+                reader, writer, timestamp = self._connections.pop()
+                self.stats['hits'] += 1
+            elif not self._waiters and (self._max_con is None or
+                                        self._size < self._max_con):
+                self._size += 1
+                return await self._create()
+            else:
+                connection = await self._wait()
+                # A slot was freed, open a new connection in it.
+                if connection is None:
+                    return await self._create()
+                reader, writer, timestamp = connection
+
+            if self._broken(reader, writer):
+                self.discard(writer)
+                continue
+
+            idle = time.monotonic() - timestamp
+            if self._time_out and idle > self._time_out:
+                self.discard(writer)
+                continue
 
-        reader, writer = await asyncio.open_connection(
-        self._host, self._port)
+            # Check connections that have been idle for a long time, in 
+            # case the server was restarted.
+            if self._check_idle is not None and idle > self._check_idle:
+                self.stats['checks'] += 1
+                if not await self.exam(reader, writer):
+                    continue
+
+            return reader, writer
+
+    async def _wait(self):
+        '''
+            Wait in the queue for a returned connection or a freed slot.
+        '''
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.stats['waits'] += 1
+        try:
+            return await asyncio.wait_for(waiter, self._wait_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            # Give back what was handed to this waiter.
+            if waiter.done() and not waiter.cancelled():
+                self._release(waiter.result())
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+            if isinstance(e, asyncio.TimeoutError):
+                raise CyberDBError(
+                    'Timed out waiting for a connection from the pool.')
+            raise
+
+    async def _create(self):
+        '''
+            Open a new connection in a reserved slot.
+        '''
+        try:
+            reader, writer = await asyncio.open_connection(
+                self._host, self._port)
+        except BaseException:
+            self._release(None)
+            raise
+
+        try:
+            set_nodelay(writer.get_extra_info('socket'))
+            await handshake(reader, writer, self._dp)
+        except BaseException:
+            writer.close()
+            self._release(None)
+            raise
+
+        self.stats['creations'] += 1
         return reader, writer
 
+    def _broken(self, reader: asyncio.streams.StreamReader,
+        writer: asyncio.streams.StreamWriter) -> bool:
+        '''
+            Whether the connection was closed by either end.
+        '''
+        return writer.is_closing() or reader.at_eof()
+
+    def _release(self, connection):
+        '''
+            Hand a connection, or a freed slot if connection is None, to the 
+            first waiter, otherwise keep the connection in the pool.
+        '''
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(connection)
+                return
+
+        if connection is None:
+            self._size -= 1
+        else:
+            self._connections.append(connection)
+
+    def discard(self, writer: asyncio.streams.StreamWriter):
+        '''
+            Close a connection and free its slot.
+        '''
+        writer.close()
+        self.stats['discards'] += 1
+        self._release(None)
+
     def put(self, reader: asyncio.streams.StreamReader, 
         writer: asyncio.streams.StreamWriter):
         '''
             Return the connection to the connection pool.
         '''
-        self._connections.append((reader, writer))
+        if self._broken(reader, writer):
+            self.discard(writer)
+            return
+
+        self._release((reader, writer, time.monotonic()))
+
+    async def _reap(self):
+        '''
+            Periodically close connections idle for more than time_out 
+            seconds, keeping min_con connections open.
+        '''
+        while True:
+            await asyncio.sleep(max(self._time_out / 2, 1))
+            now = time.monotonic()
+            # The oldest idle connections are on the left.
+            while self._connections and self._size > self._min_con:
+                reader, writer, timestamp = self._connections[0]
+                if now - timestamp <= self._time_out:
+                    break
+                self._connections.popleft()
+                self.discard(writer)
 
     async def exam(self, reader: asyncio.streams.StreamReader, 
         writer: asyncio.streams.StreamWriter):
         '''
-            Check if the connection is valid.
+            Check if the connection is valid, a broken connection is 
+            discarded.
         '''
-        # try:
-        stream = AioStream(reader, writer, self._dp)
-        client_obj = {
-            'route': '/connect'
+        r = await confirm_the_connection(reader, writer, self._dp)
+        if r['code'] == 1:
+            return True
+
+        self.discard(writer)
+        return False
+
+    def get_stats(self) -> dict:
+        '''
+            Counters of the pool and the current number of connections.
+        '''
+        stats = dict(self.stats)
+        stats['size'] = self._size
+        stats['idle'] = len(self._connections)
+        stats['waiters'] = len(self._waiters)
+        return stats
+
+
+def network(func):
+    '''
+        Network operations before and after encapsulating CyberDB data
+        structure methods.
+    '''
+
+    async def wrapper(self, *args, **kw):
+        client_obj = func(self, *args, **kw)
+
+        # If a pipeline is open, the request is queued and sent when the
+        # pipeline is executed.
+        if self._con.pipeline is not None:
+            self._con.pipeline.append(client_obj)
+            return None
+
+        await self._con.settle(self._dp)
+        stream = AioStream(self._con.reader, self._con.writer, self._dp)
+        await stream.write(client_obj)
+
+        server_obj = await stream.read()
+        if server_obj['code'] == 0:
+            self._con.writer.close()
+            raise server_obj['Exception']
+
+        return server_obj.get('content')
+
+    return wrapper
+
+
+class CyberDict:
+    '''
+        The asyncio version of cyberdb.CyberDict. All methods that perform
+        remote operations are coroutines. Python does not allow awaiting
+        in the magic methods used by repr(), str(), len(), item assignment
+        and deletion, so they are provided as the torepr, tostr, length,
+        setitem and delitem coroutines. await table[key] gets a value, and
+        async for iterates over the keys page by page.
+
+        When the client has a near cache, getitem and get are served from 
+        the cache when the key was read before and has not changed.
+    '''
+
+    def __init__(
+        self,
+        table_name: str,
+        dp: datas.DataParsing,
+        con: Connection,
+        cache: NearCache = None
+    ):
+        self._table_name = table_name
+        self._dp = dp
+        self._con = con
+        self._route = '/cyberdict'
+        self._cache = cache
+
+    def __aiter__(self):
+        return self.scan_iter(mode='keys')
+
+    @network
+    def torepr(self) -> str:
+        return {
+            'route': self._route + '/repr',
+            'table_name': self._table_name
+        }
+
+    @network
+    def tostr(self) -> str:
+        return {
+            'route': self._route + '/str',
+            'table_name': self._table_name
+        }
+
+    @network
+    def length(self) -> int:
+        return {
+            'route': self._route + '/len',
+            'table_name': self._table_name
+        }
+
+    async def getitem(self, key):
+        if self._cache is None or self._con.pipeline is not None:
+            return await self._getitem(key)
+
+        found, value = self._cache.get(self._table_name, key)
+        if found:
+            if value is MISSING:
+                raise KeyError(key)
+            return value
+        return await self._cached_read({
+            'route': self._route + '/getitem',
+            'table_name': self._table_name,
+            'key': key
+        })
+
+    __getitem__ = getitem
+
+    @network
+    def _getitem(self, key):
+        return {
+            'route': self._route + '/getitem',
+            'table_name': self._table_name,
+            'key': key
+        }
+
+    async def _cached_read(self, client_obj: dict):
+        '''
+            Read a key and cache its value if the server tracks it.
+        '''
+        key = client_obj['key']
+        token = self._cache.begin(self._table_name, key)
+        if token is not None:
+            client_obj['track'] = self._cache.client_id
+
+        try:
+            await self._con.settle(self._dp)
+            stream = AioStream(self._con.reader, self._con.writer, self._dp)
+            await stream.write(client_obj)
+            server_obj = await stream.read()
+        except BaseException:
+            if token is not None:
+                self._cache.cancel(self._table_name, key, token)
+            raise
+
+        if server_obj['code'] == 0:
+            if token is not None:
+                self._cache.cancel(self._table_name, key, token)
+            self._con.writer.close()
+            raise server_obj['Exception']
+
+        if token is not None:
+            if server_obj.get('tracked'):
+                value = server_obj['content'] \
+                    if server_obj.get('exists', True) else MISSING
+                self._cache.finish(self._table_name, key, token, value)
+            else:
+                self._cache.cancel(self._table_name, key, token)
+        return server_obj['content']
+
+    def _forget(self, keys=None):
+        '''
+            Drop the keys written by this client from the near cache at 
+            once, None drops the table. The server pushes their 
+            invalidation too.
+        '''
+        if self._cache is not None:
+            self._cache.invalidate(self._table_name, keys)
+
+    @network
+    def setitem(self, key, value) -> None:
+        self._forget((key,))
+        return {
+            'route': self._route + '/setitem',
+            'table_name': self._table_name,
+            'key': key,
+            'value': value
+        }
+
+    @network
+    def delitem(self, key) -> None:
+        self._forget((key,))
+        return {
+            'route': self._route + '/delitem',
+            'table_name': self._table_name,
+            'key': key
+        }
+
+    @network
+    def set(self, key, value, ttl: float = None) -> None:
+        '''
+            Set the value of a key, which is deleted after ttl seconds if 
+            ttl is not None.
+        '''
+        self._forget((key,))
+        return {
+            'route': self._route + '/setitem',
+            'table_name': self._table_name,
+            'key': key,
+            'value': value,
+            'ttl': ttl
+        }
+
+    @network
+    def expire(self, key, ttl: float) -> bool:
+        '''
+            Set the time to live of an existing key in seconds, None removes 
+            it. Return whether the key exists.
+        '''
+        self._forget((key,))
+        return {
+            'route': self._route + '/expire',
+            'table_name': self._table_name,
+            'key': key,
+            'ttl': ttl
+        }
+
+    @network
+    def ttl(self, key) -> float:
+        '''
+            Get the seconds a key has to live, None if it has no time to 
+            live.
+        '''
+        return {
+            'route': self._route + '/ttl',
+            'table_name': self._table_name,
+            'key': key
+        }
+
+    @network
+    def mget(self, keys: List, default=None) -> List:
+        '''
+            Get the values of multiple keys in one round trip, keys that do
+            not exist get default.
+        '''
+        return {
+            'route': self._route + '/mget',
+            'table_name': self._table_name,
+            'keys': list(keys),
+            'default': default
+        }
+
+    @network
+    def mset(self, mapping: Dict) -> None:
+        '''
+            Set multiple key-value pairs in one round trip.
+        '''
+        mapping = dict(mapping)
+        self._forget(mapping)
+        return {
+            'route': self._route + '/mset',
+            'table_name': self._table_name,
+            'mapping': mapping
+        }
+
+    @network
+    def mdelete(self, keys: List) -> List[bool]:
+        '''
+            Delete multiple keys in one round trip, True for each deleted
+            key and False for each key that did not exist.
+        '''
+        keys = list(keys)
+        self._forget(keys)
+        return {
+            'route': self._route + '/mdelete',
+            'table_name': self._table_name,
+            'keys': keys
+        }
+
+    @network
+    def todict(self) -> Dict:
+        return {
+            'route': self._route + '/todict',
+            'table_name': self._table_name
+        }
+
+    async def get(self, key, default=None) -> any:
+        if self._cache is None or self._con.pipeline is not None:
+            return await self._get(key, default)
+
+        found, value = self._cache.get(self._table_name, key)
+        if found:
+            return default if value is MISSING else value
+        return await self._cached_read({
+            'route': self._route + '/get',
+            'table_name': self._table_name,
+            'key': key,
+            'default': default
+        })
+
+    @network
+    def _get(self, key, default=None) -> any:
+        return {
+            'route': self._route + '/get',
+            'table_name': self._table_name,
+            'key': key,
+            'default': default
+        }
+
+    @network
+    def setdefault(self, key, default=None) -> None:
+        self._forget((key,))
+        return {
+            'route': self._route + '/setdefault',
+            'table_name': self._table_name,
+            'key': key,
+            'default': default
+        }
+
+    @network
+    def update(self, dict2) -> None:
+        self._forget(dict2)
+        return {
+            'route': self._route + '/update',
+            'table_name': self._table_name,
+            'dict2': dict2,
+        }
+
+    @network
+    def keys(self) -> List:
+        return {
+            'route': self._route + '/keys',
+            'table_name': self._table_name
+        }
+
+    @network
+    def values(self) -> List:
+        return {
+            'route': self._route + '/values',
+            'table_name': self._table_name
+        }
+
+    @network
+    def items(self) -> List[Tuple]:
+        return {
+            'route': self._route + '/items',
+            'table_name': self._table_name
+        }
+
+    @network
+    def scan(self, cursor: int = 0, count: int = 1000, match: str = None,
+             mode: str = 'keys') -> Tuple[int, List]:
+        '''
+            Incrementally iterate over CyberDict on the server, the
+            parameters are the same as cyberdb.CyberDict.scan.
+        '''
+        return {
+            'route': self._route + '/scan',
+            'table_name': self._table_name,
+            'cursor': cursor,
+            'count': count,
+            'match': match,
+            'mode': mode
+        }
+
+    async def scan_iter(self, match: str = None, count: int = 1000,
+                        mode: str = 'keys'):
+        '''
+            Asynchronous generator over CyberDict using CyberDict.scan, the
+            client only holds one page at a time.
+        '''
+        cursor = 0
+        while True:
+            cursor, page = await self.scan(cursor=cursor, count=count,
+                                           match=match, mode=mode)
+            for entry in page:
+                yield entry
+            if cursor == 0:
+                break
+
+    @network
+    def pop(self, key, default=None) -> any:
+        self._forget((key,))
+        return {
+            'route': self._route + '/pop',
+            'table_name': self._table_name,
+            'key': key,
+            'default': default
+        }
+
+    @network
+    def popitem(self) -> Tuple[any, any]:
+        self._forget()
+        return {
+            'route': self._route + '/popitem',
+            'table_name': self._table_name
+        }
+
+    @network
+    def clear(self) -> None:
+        self._forget()
+        return {
+            'route': self._route + '/clear',
+            'table_name': self._table_name
+        }
+
+    @network
+    def create_index(self, field: str, kind: str = 'hash') -> bool:
+        '''
+            Index a field path of the records, see 
+            cyberdb.CyberDict.create_index.
+        '''
+        return {
+            'route': self._route + '/create_index',
+            'table_name': self._table_name,
+            'field': field,
+            'kind': kind
+        }
+
+    @network
+    def drop_index(self, field: str) -> bool:
+        return {
+            'route': self._route + '/drop_index',
+            'table_name': self._table_name,
+            'field': field
+        }
+
+    @network
+    def get_indexes(self) -> Dict:
+        return {
+            'route': self._route + '/indexes',
+            'table_name': self._table_name
+        }
+
+    @network
+    def lookup(self, field: str, value, limit: int = None) -> Dict:
+        '''
+            Find the records whose field equals value, see 
+            cyberdb.CyberDict.lookup.
+        '''
+        return {
+            'route': self._route + '/lookup',
+            'table_name': self._table_name,
+            'field': field,
+            'value': value,
+            'limit': limit
+        }
+
+    @network
+    def lookup_range(self, field: str, min_value=None, max_value=None,
+                     reverse: bool = False, limit: int = None) -> Dict:
+        '''
+            Find the records whose field is in a range, see 
+            cyberdb.CyberDict.lookup_range.
+        '''
+        return {
+            'route': self._route + '/lookup_range',
+            'table_name': self._table_name,
+            'field': field,
+            'min_value': min_value,
+            'max_value': max_value,
+            'reverse': reverse,
+            'limit': limit
+        }
+
+    @network
+    def query(self, where: Dict = None, fields: List = None,
+              limit: int = None) -> Dict:
+        '''
+            Find the records matching a predicate, see 
+            cyberdb.CyberDict.query.
+        '''
+        return {
+            'route': self._route + '/query',
+            'table_name': self._table_name,
+            'where': where,
+            'fields': fields,
+            'limit': limit
+        }
+
+    @network
+    def aggregate(self, field: str = None, where: Dict = None,
+                  group_by: str = None) -> Dict:
+        '''
+            Compute the count, sum, mean, min and max of the values, see 
+            cyberdb.CyberDict.aggregate.
+        '''
+        return {
+            'route': self._route + '/aggregate',
+            'table_name': self._table_name,
+            'field': field,
+            'where': where,
+            'group_by': group_by
+        }
+
+
+class CyberList:
+    '''
+        The asyncio version of cyberdb.CyberList. All methods that perform
+        remote operations are coroutines, the magic methods that cannot be
+        awaited are provided as the torepr, tostr, length, setitem and
+        delitem coroutines. async for iterates over the list page by page with the
+        next page prefetched.
+    '''
+
+    page_size = 1000
+
+    def __init__(
+        self,
+        table_name: str,
+        dp: datas.DataParsing,
+        con: Connection
+    ):
+        self._table_name = table_name
+        self._dp = dp
+        self._con = con
+        self._route = '/cyberlist'
+
+    def __aiter__(self):
+        return self.generate()
+
+    @network
+    def torepr(self) -> str:
+        return {
+            'route': self._route + '/repr',
+            'table_name': self._table_name
+        }
+
+    @network
+    def tostr(self) -> str:
+        return {
+            'route': self._route + '/str',
+            'table_name': self._table_name
+        }
+
+    @network
+    def length(self) -> int:
+        return {
+            'route': self._route + '/len',
+            'table_name': self._table_name
+        }
+
+    @network
+    def getitem(self, index):
+        return {
+            'route': self._route + '/getitem',
+            'table_name': self._table_name,
+            'index': index
+        }
+
+    __getitem__ = getitem
+
+    @network
+    def setitem(self, index, value) -> None:
+        return {
+            'route': self._route + '/setitem',
+            'table_name': self._table_name,
+            'index': index,
+            'value': value
+        }
+
+    @network
+    def delitem(self, index) -> None:
+        return {
+            'route': self._route + '/delitem',
+            'table_name': self._table_name,
+            'index': index
+        }
+
+    @network
+    def tolist(self) -> List:
+        return {
+            'route': self._route + '/tolist',
+            'table_name': self._table_name
+        }
+
+    @network
+    def append(self, value) -> None:
+        return {
+            'route': self._route + '/append',
+            'table_name': self._table_name,
+            'value': value
+        }
+
+    async def extend(self, obj) -> None:
+        if type(obj) == CyberList:
+            obj = await obj.tolist()
+
+        return await self._extend(obj)
+
+    @network
+    def _extend(self, obj) -> None:
+        return {
+            'route': self._route + '/extend',
+            'table_name': self._table_name,
+            'obj': obj
+        }
+
+    @network
+    def insert(self, index, value) -> None:
+        return {
+            'route': self._route + '/insert',
+            'table_name': self._table_name,
+            'index': index,
+            'value': value
+        }
+
+    @network
+    def pop(self, index: int = -1) -> any:
+        return {
+            'route': self._route + '/pop',
+            'table_name': self._table_name,
+            'index': index
+        }
+
+    @network
+    def remove(self, value) -> None:
+        return {
+            'route': self._route + '/remove',
+            'table_name': self._table_name,
+            'value': value
+        }
+
+    @network
+    def count(self, value) -> int:
+        return {
+            'route': self._route + '/count',
+            'table_name': self._table_name,
+            'value': value
+        }
+
+    @network
+    def index(self, value) -> int:
+        return {
+            'route': self._route + '/index',
+            'table_name': self._table_name,
+            'value': value
+        }
+
+    @network
+    def reverse(self) -> None:
+        return {
+            'route': self._route + '/reverse',
+            'table_name': self._table_name
+        }
+
+    @network
+    def sort(self, key: str = None, reverse: bool = False,
+             field: str = None, maintain: bool = None) -> None:
+        '''
+            Sort CyberList on the server, see cyberdb.CyberList.sort.
+        '''
+        if callable(key):
+            raise WrongInputCyberDBError(
+                'The key must be the name of a key function registered '
+                'with Server.register_sort_key.')
+
+        return {
+            'route': self._route + '/sort',
+            'table_name': self._table_name,
+            'key': key,
+            'reverse': reverse,
+            'field': field,
+            'maintain': maintain
+        }
+
+    @network
+    def get_sort_order(self) -> Dict:
+        '''
+            Return Type: Dict, see cyberdb.CyberList.get_sort_order.
+        '''
+        return {
+            'route': self._route + '/sort_order',
+            'table_name': self._table_name
+        }
+
+    @network
+    def clear(self) -> None:
+        return {
+            'route': self._route + '/clear',
+            'table_name': self._table_name,
+        }
+
+    @network
+    def query(self, where: Dict = None, fields: List = None,
+              limit: int = None) -> List:
+        '''
+            Find the elements matching a predicate, see 
+            cyberdb.CyberList.query.
+        '''
+        return {
+            'route': self._route + '/query',
+            'table_name': self._table_name,
+            'where': where,
+            'fields': fields,
+            'limit': limit
+        }
+
+    @network
+    def aggregate(self, field: str = None, where: Dict = None,
+                  group_by: str = None) -> Dict:
+        '''
+            Compute the count, sum, mean, min and max of the elements, see 
+            cyberdb.CyberList.aggregate.
+        '''
+        return {
+            'route': self._route + '/aggregate',
+            'table_name': self._table_name,
+            'field': field,
+            'where': where,
+            'group_by': group_by
+        }
+
+    async def _request_page(self, start: int, page_size: int) -> dict:
+        '''
+            Send the request of a page without waiting for the response,
+            and return the placeholder that will receive it.
+        '''
+        stream = AioStream(self._con.reader, self._con.writer, self._dp)
+        await stream.write({
+            'route': self._route + '/getitem',
+            'table_name': self._table_name,
+            'index': slice(start, start + page_size)
+        })
+        placeholder = {
+            'server_obj': None
+        }
+        self._con.pending.append(placeholder)
+        return placeholder
+
+    async def _receive_page(self, placeholder: dict) -> List:
+        '''
+            Wait for the response of a page.
+        '''
+        await self._con.settle(self._dp)
+        server_obj = placeholder['server_obj']
+        if server_obj['code'] == 0:
+            self._con.writer.close()
+            raise server_obj['Exception']
+        return server_obj['content']
+
+    async def generate(self, page_size: int = None):
+        '''
+            Asynchronous generator over CyberList page by page, with the
+            same semantics as cyberdb.CyberList.generate.
+        '''
+        page_size = page_size or self.page_size
+        start = 0
+        placeholder = await self._request_page(start, page_size)
+        while placeholder is not None:
+            page = await self._receive_page(placeholder)
+            start += len(page)
+
+            # Prefetch the next page if this page is full.
+            placeholder = None
+            if len(page) == page_size:
+                placeholder = await self._request_page(start, page_size)
+
+            for value in page:
+                yield value
+
+
+class CyberQueue:
+    '''
+        The asyncio version of cyberdb.CyberQueue. All methods that 
+        perform remote operations are coroutines, the magic methods that 
+        cannot be awaited are provided as the torepr, tostr and length 
+        coroutines. A blocking pop only suspends the coroutine, the 
+        connection of the Proxy is in use until it returns.
+    '''
+
+    def __init__(
+        self,
+        table_name: str,
+        dp: datas.DataParsing,
+        con: Connection
+    ):
+        self._table_name = table_name
+        self._dp = dp
+        self._con = con
+        self._route = '/cyberqueue'
+
+    @network
+    def torepr(self) -> str:
+        return {
+            'route': self._route + '/repr',
+            'table_name': self._table_name
+        }
+
+    @network
+    def tostr(self) -> str:
+        return {
+            'route': self._route + '/str',
+            'table_name': self._table_name
+        }
+
+    @network
+    def length(self) -> int:
+        return {
+            'route': self._route + '/len',
+            'table_name': self._table_name
+        }
+
+    @network
+    def tolist(self) -> List:
+        return {
+            'route': self._route + '/tolist',
+            'table_name': self._table_name
+        }
+
+    @network
+    def append(self, value) -> None:
+        return {
+            'route': self._route + '/append',
+            'table_name': self._table_name,
+            'value': value,
+            'left': False
+        }
+
+    @network
+    def appendleft(self, value) -> None:
+        return {
+            'route': self._route + '/append',
+            'table_name': self._table_name,
+            'value': value,
+            'left': True
+        }
+
+    @network
+    def extend(self, obj) -> None:
+        return {
+            'route': self._route + '/extend',
+            'table_name': self._table_name,
+            'obj': list(obj),
+            'left': False
+        }
+
+    @network
+    def extendleft(self, obj) -> None:
+        return {
+            'route': self._route + '/extend',
+            'table_name': self._table_name,
+            'obj': list(obj),
+            'left': True
+        }
+
+    @network
+    def pop(self) -> any:
+        return {
+            'route': self._route + '/pop',
+            'table_name': self._table_name,
+            'left': False
+        }
+
+    @network
+    def popleft(self) -> any:
+        return {
+            'route': self._route + '/pop',
+            'table_name': self._table_name,
+            'left': True
+        }
+
+    @network
+    def bpop(self, timeout: float = None, default=None) -> any:
+        '''
+            Pop a value from the right end, waiting for one to be pushed, 
+            see cyberdb.CyberQueue.bpop.
+        '''
+        return {
+            'route': self._route + '/bpop',
+            'table_name': self._table_name,
+            'left': False,
+            'timeout': timeout,
+            'default': default
+        }
+
+    @network
+    def bpopleft(self, timeout: float = None, default=None) -> any:
+        '''
+            Pop a value from the left end, waiting for one to be pushed, 
+            see cyberdb.CyberQueue.bpop.
+        '''
+        return {
+            'route': self._route + '/bpop',
+            'table_name': self._table_name,
+            'left': True,
+            'timeout': timeout,
+            'default': default
+        }
+
+    @network
+    def clear(self) -> None:
+        return {
+            'route': self._route + '/clear',
+            'table_name': self._table_name
         }
-        await stream.write(client_obj)
 
-        server_obj = await stream.read()
-        return True
-        # except:
-        #     return False
 
+class CyberSortedSet:
+    '''
+        The asyncio version of cyberdb.CyberSortedSet. All methods that 
+        perform remote operations are coroutines, the magic methods that 
+        cannot be awaited are provided as the torepr, tostr and length 
+        coroutines. async for iterates over the (member, score) pairs 
+        page by page.
+    '''
 
-class CyberDict:
+    page_size = 1000
 
     def __init__(
-        self, 
-        table_name: str, 
+        self,
+        table_name: str,
         dp: datas.DataParsing,
         con: Connection
     ):
         self._table_name = table_name
         self._dp = dp
         self._con = con
-        self._route = '/cyberdict'
-        
-    async def __getitem__(self, key):
-        stream = AioStream(self._con.reader, self._con.writer, self._dp)
+        self._route = '/cybersortedset'
 
-        client_obj = {
-            'route': self._route + '/getitem',
+    async def __aiter__(self):
+        start = 0
+        while True:
+            page = await self.range(start, start + self.page_size,
+                                    withscores=True)
+            for pair in page:
+                yield pair
+            if len(page) < self.page_size:
+                return
+            start += self.page_size
+
+    @network
+    def torepr(self) -> str:
+        return {
+            'route': self._route + '/repr',
+            'table_name': self._table_name
+        }
+
+    @network
+    def tostr(self) -> str:
+        return {
+            'route': self._route + '/str',
+            'table_name': self._table_name
+        }
+
+    @network
+    def length(self) -> int:
+        return {
+            'route': self._route + '/len',
+            'table_name': self._table_name
+        }
+
+    @network
+    def add(self, mapping: Dict) -> int:
+        return {
+            'route': self._route + '/add',
             'table_name': self._table_name,
-            'key': key
+            'mapping': mapping
+        }
+
+    @network
+    def incr(self, member, amount=1):
+        return {
+            'route': self._route + '/incr',
+            'table_name': self._table_name,
+            'member': member,
+            'amount': amount
+        }
+
+    @network
+    def remove(self, *members) -> int:
+        return {
+            'route': self._route + '/remove',
+            'table_name': self._table_name,
+            'members': members
+        }
+
+    @network
+    def score(self, member):
+        return {
+            'route': self._route + '/score',
+            'table_name': self._table_name,
+            'member': member
+        }
+
+    @network
+    def rank(self, member, reverse: bool = False) -> int:
+        return {
+            'route': self._route + '/rank',
+            'table_name': self._table_name,
+            'member': member,
+            'reverse': reverse
+        }
+
+    @network
+    def range(self, start: int = 0, stop: int = None, reverse: bool = False,
+              withscores: bool = False) -> List:
+        return {
+            'route': self._route + '/range',
+            'table_name': self._table_name,
+            'start': start,
+            'stop': stop,
+            'reverse': reverse,
+            'withscores': withscores
+        }
+
+    @network
+    def range_by_score(self, min_score=None, max_score=None,
+                       reverse: bool = False, offset: int = 0,
+                       count: int = None, withscores: bool = False) -> List:
+        return {
+            'route': self._route + '/range_by_score',
+            'table_name': self._table_name,
+            'min_score': min_score,
+            'max_score': max_score,
+            'reverse': reverse,
+            'offset': offset,
+            'count': count,
+            'withscores': withscores
+        }
+
+    @network
+    def count(self, min_score=None, max_score=None) -> int:
+        return {
+            'route': self._route + '/count',
+            'table_name': self._table_name,
+            'min_score': min_score,
+            'max_score': max_score
+        }
+
+    @network
+    def todict(self) -> Dict:
+        return {
+            'route': self._route + '/todict',
+            'table_name': self._table_name
+        }
+
+    @network
+    def clear(self) -> None:
+        return {
+            'route': self._route + '/clear',
+            'table_name': self._table_name
+        }
+
+
+class Pipeline:
+    '''
+        The asyncio version of the Pipeline generated by Proxy.pipeline.
+        While the pipeline is open, awaiting an operation of a CyberDict
+        or CyberList sub-object queues it and returns None immediately.
+        Used as an async context manager, the pipeline is executed on
+        exit, and the results are saved in Pipeline.results, then the
+        first exception of the operations is raised.
+    '''
+
+    def __init__(self, con: Connection, dp: datas.DataParsing):
+        self._con = con
+        self._dp = dp
+        self._con.pipeline = []
+        self.results = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.results = await self.execute(raise_on_error=False)
+            for r in self.results:
+                if isinstance(r, Exception):
+                    raise r
+        else:
+            self.reset()
+
+    def __len__(self):
+        if self._con.pipeline is None:
+            return 0
+        return len(self._con.pipeline)
+
+    async def execute(self, raise_on_error: bool = True) -> List:
+        '''
+            Send the queued operations to the server and close the
+            pipeline, the parameters are the same as
+            cyberdb.Pipeline.execute.
+        '''
+        if self._con.pipeline is None:
+            raise CyberDBError('The pipeline has already been executed.')
+        requests = self._con.pipeline
+        self._con.pipeline = None
+        if not requests:
+            return []
+
+        await self._con.settle(self._dp)
+        stream = AioStream(self._con.reader, self._con.writer, self._dp)
+        client_obj = {
+            'route': '/batch',
+            'requests': requests
         }
-        
         await stream.write(client_obj)
 
         server_obj = await stream.read()
-        if server_obj['code'] == 0:
-            self._con.writer.close()
-            raise server_obj['Exception']
 
-        return server_obj['content']
+        results = []
+        for r in server_obj['content']:
+            if r['code'] == 0:
+                results.append(r['Exception'])
+            else:
+                results.append(r.get('content'))
 
+        if raise_on_error:
+            for r in results:
+                if isinstance(r, Exception):
+                    raise r
 
-class CyberList:
+        return results
 
-    def __init__(
-        self, 
-        table_name: str, 
-        dp: datas.DataParsing,
-        con: Connection
-    ):
-        self._table_name = table_name
-        self._dp = dp
-        self._con = con
-        self._route = '/cyberlist'
+    def reset(self):
+        '''
+            Discard the queued operations and close the pipeline.
+        '''
+        self._con.pipeline = None
 
 
 class Proxy:
     '''
         Database instance per session
 
-        This object is not thread safe, please regenerate in each thread or 
+        This object is not thread safe, please regenerate in each thread or
         coroutine.
     '''
 
-    def __init__(self, con_pool: ConPool, dp: datas.DataParsing):
+    def __init__(self, con_pool: ConPool, dp: datas.DataParsing,
+                 cache: NearCache = None):
         self._con_pool = con_pool
         self._dp = dp
-        # The connection used by the proxy, the first is the reader and the 
+        # The connection used by the proxy, the first is the reader and the
         # second is the writer.
         self._con = Connection()
+        self._cache = cache
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
 
     async def connect(self):
         '''
             Get the latest connection from the connection pool.
 
-            This method does not necessarily create a new connection, if the 
-            connection of the connection pool is available, it will be 
+            This method does not necessarily create a new connection, if the
+            connection of the connection pool is available, it will be
             obtained directly.
         '''
-        # If the proxy already has a connection, the connection will be 
+        # If the proxy already has a connection, the connection will be
         # returned to the connection pool first.
         if self._con.reader != None and self._con.writer != None:
+            await self._con.settle(self._dp)
             self._con_pool.put(self._con.reader, self._con.writer)
-            
+
         reader, writer = await self._con_pool.get()
         self._con.reader = reader
         self._con.writer = writer
@@ -159,116 +1423,587 @@ class Proxy:
         '''
             Return the connection to the connection pool.
         '''
-        if self._con.reader == None or self._con == None:
+        if self._con.reader == None or self._con.writer == None:
             raise CyberDBError('The connection could not be closed, the proxy has not acquired a connection.')
 
+        await self._con.settle(self._dp)
         self._con_pool.put(self._con.reader, self._con.writer)
         self._con.reader = None
         self._con.writer = None
 
-    async def create_cyberdict(self, table_name: str, content: dict={}):
-        if type(table_name) != type(''):
-            raise CyberDBError('Please use str for the table name.')
-        if type(content) != type(dict()):
-            raise CyberDBError('The input database table type is not a Python dictionary.')
+    def pipeline(self) -> Pipeline:
+        '''
+            Open a pipeline on the connection of the Proxy, see
+            cyberdb.Proxy.pipeline.
+        '''
+        if self._con.pipeline is not None:
+            raise CyberDBError('A pipeline is already open on this proxy.')
 
+        return Pipeline(self._con, self._dp)
+
+    async def _request(self, client_obj: dict) -> dict:
+        '''
+            Send a request of the Proxy and return the server object.
+        '''
+        await self._con.settle(self._dp)
         stream = AioStream(self._con.reader, self._con.writer, self._dp)
-        client_obj = {
+        await stream.write(client_obj)
+        return await stream.read()
+
+    async def create_cyberdict(self, table_name: str, content: dict={}):
+        '''
+            Create a CyberDict table, see cyberdb.Proxy.create_cyberdict.
+        '''
+        if type(table_name) != str:
+            raise WrongInputCyberDBError('Please use str for the table name.')
+        if type(content) != dict:
+            raise WrongInputCyberDBError(
+                'The input database table type is not a Python dictionary.')
+
+        server_obj = await self._request({
             'route': '/create_cyberdict',
             'table_name': table_name,
             'content': content
-        }
-        await stream.write(client_obj)
-
-        server_obj = await stream.read()
+        })
 
         if server_obj['code'] == 0:
-            raise CyberDBError('Duplicate table names already exist!')
-
-        return server_obj
+            if 'Exception' in server_obj:
+                raise server_obj['Exception']
+            raise WrongTableNameCyberDBError(
+                'Duplicate table names already exist!')
 
     async def get_cyberdict(self, table_name: str) -> CyberDict:
         '''
-            Get the network object of the table from the database.
+            Get the CyberDict table, see cyberdb.Proxy.get_cyberdict.
         '''
-        if type(table_name) != type(''):
-            raise CyberDBError('Please use str for the table name.')
-        
-        stream = AioStream(self._con.reader, self._con.writer, self._dp)
+        if type(table_name) != str:
+            raise WrongInputCyberDBError('Please use str for the table name.')
 
-        client_obj = {
+        server_obj = await self._request({
             'route': '/exam_cyberdict',
             'table_name': table_name
-        }
-        await stream.write(client_obj)
+        })
+        if server_obj['code'] == 0:
+            raise WrongTableNameCyberDBError(
+                '{} table does not exist.'.format(table_name))
+
+        return CyberDict(table_name, self._dp, self._con, self._cache)
+
+    async def create_cyberlist(self, table_name: str, content: list=[]):
+        '''
+            Create the CyberList table, see cyberdb.Proxy.create_cyberlist.
+        '''
+        if type(table_name) != str:
+            raise WrongInputCyberDBError('Please use str for the table name.')
+        if type(content) != list:
+            raise WrongInputCyberDBError(
+                'The input database table type is not a Python list.')
+
+        server_obj = await self._request({
+            'route': '/create_cyberlist',
+            'table_name': table_name,
+            'content': content
+        })
 
-        server_obj = await stream.read()
         if server_obj['code'] == 0:
-            raise CyberDBError('{} table does not exist.'.format(table_name))
-        else:
-            table = CyberDict(table_name, self._dp, self._con)
-            return table
+            if 'Exception' in server_obj:
+                raise server_obj['Exception']
+            raise WrongTableNameCyberDBError(
+                'Duplicate table names already exist!')
+
+    async def get_cyberlist(self, table_name: str) -> CyberList:
+        '''
+            Get the CyberList table, see cyberdb.Proxy.get_cyberlist.
+        '''
+        if type(table_name) != str:
+            raise WrongInputCyberDBError('Please use str for the table name.')
+
+        server_obj = await self._request({
+            'route': '/exam_cyberlist',
+            'table_name': table_name
+        })
+        if server_obj['code'] == 0:
+            raise WrongTableNameCyberDBError(
+                '{} table does not exist.'.format(table_name))
+
+        return CyberList(table_name, self._dp, self._con)
+
+    async def create_cyberqueue(self, table_name: str, content: list=[],
+                                maxlen: int=None):
+        '''
+            Create the CyberQueue table, see 
+            cyberdb.Proxy.create_cyberqueue.
+        '''
+        if type(table_name) != str:
+            raise WrongInputCyberDBError('Please use str for the table name.')
+        if type(content) != list:
+            raise WrongInputCyberDBError(
+                'The input database table type is not a Python list.')
+        if maxlen is not None and (type(maxlen) != int or maxlen < 0):
+            raise WrongInputCyberDBError(
+                'maxlen must be None or a non-negative integer.')
+
+        server_obj = await self._request({
+            'route': '/create_cyberqueue',
+            'table_name': table_name,
+            'content': content,
+            'maxlen': maxlen
+        })
+
+        if server_obj['code'] == 0:
+            if 'Exception' in server_obj:
+                raise server_obj['Exception']
+            raise WrongTableNameCyberDBError(
+                'Duplicate table names already exist!')
+
+    async def get_cyberqueue(self, table_name: str) -> CyberQueue:
+        '''
+            Get the CyberQueue table, see cyberdb.Proxy.get_cyberqueue.
+        '''
+        if type(table_name) != str:
+            raise WrongInputCyberDBError('Please use str for the table name.')
+
+        server_obj = await self._request({
+            'route': '/exam_cyberqueue',
+            'table_name': table_name
+        })
+        if server_obj['code'] == 0:
+            raise WrongTableNameCyberDBError(
+                '{} table does not exist.'.format(table_name))
+
+        return CyberQueue(table_name, self._dp, self._con)
+
+    async def create_cybersortedset(self, table_name: str, content: dict={}):
+        '''
+            Create the CyberSortedSet table, see 
+            cyberdb.Proxy.create_cybersortedset.
+        '''
+        if type(table_name) != str:
+            raise WrongInputCyberDBError('Please use str for the table name.')
+        if type(content) != dict:
+            raise WrongInputCyberDBError(
+                'The input database table type is not a Python dictionary.')
+
+        server_obj = await self._request({
+            'route': '/create_cybersortedset',
+            'table_name': table_name,
+            'content': content
+        })
+
+        if server_obj['code'] == 0:
+            if 'Exception' in server_obj:
+                raise server_obj['Exception']
+            raise WrongTableNameCyberDBError(
+                'Duplicate table names already exist!')
+
+    async def get_cybersortedset(self, table_name: str) -> CyberSortedSet:
+        '''
+            Get the CyberSortedSet table, see 
+            cyberdb.Proxy.get_cybersortedset.
+        '''
+        if type(table_name) != str:
+            raise WrongInputCyberDBError('Please use str for the table name.')
+
+        server_obj = await self._request({
+            'route': '/exam_cybersortedset',
+            'table_name': table_name
+        })
+        if server_obj['code'] == 0:
+            raise WrongTableNameCyberDBError(
+                '{} table does not exist.'.format(table_name))
+
+        return CyberSortedSet(table_name, self._dp, self._con)
+
+    async def print_tables(self):
+        '''
+            Print all tables in the CyberDB database.
+        '''
+        server_obj = await self._request({
+            'route': '/print_tables'
+        })
+        for line in server_obj['content']:
+            print('table name: {}  type name: {}'.format(line[0], line[1]))
+
+    async def info(self) -> dict:
+        '''
+            Report the memory used by the tables and the state of the 
+            server, see cyberdb.Proxy.info.
+        '''
+        server_obj = await self._request({
+            'route': '/info'
+        })
+        return server_obj['content']
+
+    async def publish(self, channel: str, message) -> int:
+        '''
+            Publish a message to a channel, see cyberdb.Proxy.publish.
+        '''
+        server_obj = await self._request({
+            'route': '/publish',
+            'channel': channel,
+            'message': message
+        })
+        if server_obj['code'] == 0:
+            self._con.writer.close()
+            raise server_obj['Exception']
+        return server_obj['content']
+
+    async def delete_table(self, table_name: str):
+        '''
+            Drop the table_name table in the CyberDB database.
+        '''
+        if type(table_name) != str:
+            raise WrongInputCyberDBError('Please use str for the table name.')
+
+        server_obj = await self._request({
+            'route': '/exam_cyberlist',
+            'table_name': table_name
+        })
+        if server_obj['code'] == 0:
+            raise WrongTableNameCyberDBError(
+                '{} table does not exist.'.format(table_name))
+
+        if self._cache is not None:
+            self._cache.invalidate(table_name)
+        await self._request({
+            'route': '/delete_table',
+            'table_name': table_name
+        })
 
 
 class Client:
     '''
-        This object blocks execution and is recommended to be used as a 
-        global variable instead of running in an async function.
+        The Client object returned by cyberdb.aioconnect is used to
+        generate the Proxy object. Creating it does not perform any I/O,
+        so it can be created as a global variable or inside a running
+        event loop.
     '''
-    
-    def __init__(self, con_pool: ConPool, dp: datas.DataParsing):
+
+    def __init__(self, con_pool: ConPool, dp: datas.DataParsing,
+                 cache: NearCache = None):
         self._con_pool = con_pool
         self._dp = dp
+        self._cache = cache
 
     def get_proxy(self) -> Proxy:
         '''
             Get proxy data.
         '''
-        proxy = Proxy(self._con_pool, self._dp)
+        proxy = Proxy(self._con_pool, self._dp, self._cache)
         return proxy
 
-    def check_connection_pool(self):
-        pass
+    async def check_connection_pool(self):
+        '''
+            Check whether the server can be connected with the address,
+            port and password of the client. The connection is returned to
+            the connection pool.
+        '''
+        reader, writer = await self._con_pool.get()
+        r = await confirm_the_connection(reader, writer, self._dp)
+        if r['code'] == 0:
+            self._con_pool.discard(writer)
+            raise r['Exception']
+
+        self._con_pool.put(reader, writer)
+
+    def get_pool_stats(self) -> dict:
+        '''
+            Get the statistics of the connection pool, see 
+            cyberdb.Client.get_pool_stats. waiters is the number of 
+            coroutines waiting for a connection.
+        '''
+        return self._con_pool.get_stats()
+
+    def get_cache_stats(self) -> dict:
+        '''
+            Get the statistics of the near cache, see 
+            cyberdb.Client.get_cache_stats.
+        '''
+        if self._cache is None:
+            return None
+        return self._cache.get_stats()
+
+    def get_subscriber(self) -> 'Subscriber':
+        '''
+            Generate a Subscriber object, see 
+            cyberdb.Client.get_subscriber.
+        '''
+        return Subscriber(self._con_pool._host, self._con_pool._port,
+                          self._dp)
 
 
 def connect(host: str='127.0.0.1', port: int=9980, password: 
-    str=None) -> Client:
+    str=None, encrypt: bool = False, time_out: int = None,
+    min_con: int = 0, max_con: int = None, wait_timeout: float = None,
+    check_idle: int = 60, codec: str = 'pickle',
+    cache_size: int = 0) -> Client:
     '''
-        Connect to the CyberDB server via TCP, this method will run 
-        synchronously.
+        Create an asyncio client of the CyberDB server, the parameters are
+        the same as cyberdb.connect. Connections idle for more than 
+        time_out seconds are closed by a reaper task of the pool.
+
+        No connection is made here, so this function does not block the
+        event loop. min_con connections are opened on the first use of 
+        the pool, await Client.check_connection_pool to open them and test 
+        the connection in advance. The invalidation connection of the near 
+        cache is also opened on the first use of the pool.
     '''
     if not password:
-        raise RuntimeError('The password cannot be empty.')
+        raise WrongPasswordCyberDBError('The password cannot be empty.')
+    if time_out and type(time_out) != int:
+        raise CyberDBError('time_out must be an integer.')
+    if max_con is not None and max_con < max(min_con, 1):
+        raise CyberDBError('max_con must be at least 1 and min_con.')
 
     # Responsible for encrypting and decrypting objects.
     secret = Secret(key=password)
-    # for digital signature
-    signature = Signature(salt=password.encode())
-    dp = datas.DataParsing(secret, signature)
-    con_pool = ConPool(host, port, dp)
-
-    # Synchronously test whether the connection is successful.
-    t = MyThread(target=asyncio.run, 
-        args=(confirm_the_connection(con_pool, dp), ) )
-    t.daemon = True
-    t.start()
-    t.join()
-    result = t.get_result()
-    if result['code'] == 0:
-        raise result['Exception']
-
-    client = Client(con_pool, dp)
+    dp = datas.DataParsing(secret, encrypt=encrypt, codec=codec)
+    cache = NearCache(cache_size) if cache_size else None
+    con_pool = ConPool(host, port, dp, time_out=time_out, min_con=min_con,
+                       max_con=max_con, wait_timeout=wait_timeout,
+                       check_idle=check_idle, cache=cache)
+
+    client = Client(con_pool, dp, cache)
     return client
 
 
-async def confirm_the_connection(con_pool: ConPool, dp: datas.DataParsing) -> \
-    dict:
+async def receive_invalidations(host: str, port: int, dp: datas.DataParsing,
+    cache: NearCache):
+    '''
+        Receive the invalidations pushed by the server to the near cache 
+        on a dedicated connection. The cache is flushed when the 
+        connection is lost, and it is opened again after RETRY seconds.
+    '''
+    while True:
+        writer = None
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            set_nodelay(writer.get_extra_info('socket'))
+            await handshake(reader, writer, dp)
+            stream = AioStream(reader, writer, dp)
+            await stream.write({
+                'route': '/tracking'
+            })
+            while True:
+                server_obj = await stream.read()
+                if 'invalidate' in server_obj:
+                    cache.invalidate(server_obj['invalidate'],
+                                     server_obj['keys'])
+                elif server_obj['code'] == 1:
+                    cache.connect(server_obj['content'])
+                else:
+                    raise server_obj['Exception']
+        except Exception:
+            pass
+        finally:
+            cache.disconnect()
+            if writer is not None:
+                writer.close()
+        await asyncio.sleep(RETRY)
+
+
+class Subscriber:
+    '''
+        Receive the messages published to channels, see 
+        cyberdb.Subscriber. A task reads the connection into a queue of 
+        at most MAX_MESSAGES messages, it stops reading while the queue 
+        is full. Use it as an async context manager or await close, 
+        and iterate over the messages with async for.
+    '''
+
+    def __init__(self, host: str, port: int, dp: datas.DataParsing):
+        self._host = host
+        self._port = port
+        self._dp = dp
+        self._writer = None
+        self._receiver = None
+        self._messages = asyncio.Queue(MAX_MESSAGES)
+        # Futures of the requests waiting for their responses, in order.
+        self._responses = deque()
+        # The exception which ended the connection.
+        self._error = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def __aiter__(self):
+        return self.listen()
+
+    async def subscribe(self, *channels) -> int:
+        '''
+            Subscribe to the channels.
+        '''
+        return await self._request('/subscribe', list(channels))
+
+    async def psubscribe(self, *patterns) -> int:
+        '''
+            Subscribe to the channels matching the glob-style patterns.
+        '''
+        return await self._request('/psubscribe', list(patterns))
+
+    async def unsubscribe(self, *channels) -> int:
+        '''
+            Unsubscribe from the channels, from all channels if none is 
+            given.
+        '''
+        return await self._request('/unsubscribe', list(channels) or None)
+
+    async def punsubscribe(self, *patterns) -> int:
+        '''
+            Unsubscribe from the patterns, from all patterns if none is 
+            given.
+        '''
+        return await self._request('/punsubscribe', list(patterns) or None)
+
+    async def get_message(self, timeout: float = None) -> dict:
+        '''
+            Wait for the next message, see cyberdb.Subscriber.get_message.
+        '''
+        if self._messages.empty():
+            if self._error is not None:
+                raise self._error
+            if self._writer is None:
+                raise DisconCyberDBError('The subscriber has no connection.')
+        try:
+            message = await asyncio.wait_for(self._messages.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        # The connection ended.
+        if isinstance(message, Exception):
+            raise message
+        return message
+
+    async def listen(self):
+        '''
+            Iterate over the messages as they arrive.
+        '''
+        while True:
+            yield await self.get_message()
+
+    async def close(self):
+        '''
+            Close the connection, the subscriptions end with it.
+        '''
+        if self._receiver is not None:
+            self._receiver.cancel()
+            self._receiver = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._fail(DisconCyberDBError('The subscriber was closed.'))
+        self._messages = asyncio.Queue(MAX_MESSAGES)
+        self._error = None
+
+    async def _request(self, route: str, channels: list) -> int:
+        if self._error is not None:
+            raise self._error
+        if self._writer is None:
+            reader, writer = await asyncio.open_connection(
+                self._host, self._port)
+            try:
+                set_nodelay(writer.get_extra_info('socket'))
+                await handshake(reader, writer, self._dp)
+            except BaseException:
+                writer.close()
+                raise
+            self._writer = writer
+            self._receiver = asyncio.ensure_future(
+                self._receive(AioStream(reader, writer, self._dp)))
+
+        response = asyncio.get_running_loop().create_future()
+        self._responses.append(response)
+        await AioStream(None, self._writer, self._dp).write({
+            'route': route,
+            'channels': channels
+        })
+        server_obj = await response
+        if server_obj['code'] == 0:
+            raise server_obj['Exception']
+        return server_obj['content']
+
+    async def _receive(self, stream: AioStream):
+        '''
+            Read the messages and the responses of the connection.
+        '''
+        try:
+            while True:
+                server_obj = await stream.read()
+                if 'message' in server_obj:
+                    await self._messages.put({
+                        'channel': server_obj['message'],
+                        'pattern': server_obj['pattern'],
+                        'data': server_obj['data']
+                    })
+                elif self._responses:
+                    response = self._responses.popleft()
+                    if not response.done():
+                        response.set_result(server_obj)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._fail(e)
+
+    def _fail(self, error: Exception):
+        '''
+            End the pending requests and wake up get_message with the 
+            error of the connection.
+        '''
+        self._error = error
+        while self._responses:
+            response = self._responses.popleft()
+            if not response.done():
+                response.set_exception(error)
+        try:
+            self._messages.put_nowait(error)
+        except asyncio.QueueFull:
+            pass
+
+
+async def handshake(reader: asyncio.streams.StreamReader,
+    writer: asyncio.streams.StreamWriter, dp: datas.DataParsing):
+    '''
+        Open a new connection with the server: answer the challenge of the 
+        server, check its proof and select the codec of the connection. 
+        The handshake is encoded with marshal. With encryption, the 
+        following frames are encrypted with the session key of the 
+        connection.
+    '''
+    password = dp._secret.key
+    stream = AioStream(reader, writer, dp.for_handshake())
+    challenge = (await stream.read())['challenge']
+    nonce = auth.new_nonce()
+    await stream.write({
+        'route': '/hello',
+        'codec': dp.codec.name,
+        'encrypt': dp._encrypt,
+        'nonce': nonce,
+        'proof': auth.sign(password, b'client', challenge, nonce)
+    })
+    server_obj = await stream.read()
+    if server_obj['code'] == 2:
+        raise WrongPasswordCyberDBError(server_obj['message'])
+    if server_obj['code'] == 0:
+        raise CyberDBError(server_obj['message'])
+    if not auth.verify(server_obj.get('proof'),
+                       auth.sign(password, b'server', nonce, challenge)):
+        raise WrongPasswordCyberDBError(
+            'The server failed to prove that it has the password.')
+
+    if dp._encrypt:
+        session = auth.Session(
+            auth.derive_key(password, challenge, nonce), client=True)
+        connections[writer] = dp.with_codec(dp.codec.name, session)
+
+
+async def confirm_the_connection(reader: asyncio.streams.StreamReader,
+    writer: asyncio.streams.StreamWriter, dp: datas.DataParsing) -> dict:
     '''
-        The connection is detected when the database connects for the first 
-        time.
+        Check whether the connection is valid.
     '''
     try:
-        reader, writer = await con_pool.get()
         stream = AioStream(reader, writer, dp)
 
         client_obj = {
@@ -277,22 +2012,13 @@ async def confirm_the_connection(con_pool: ConPool, dp: datas.DataParsing) -> \
         await stream.write(client_obj)
 
         server_obj = await stream.read()
-        
-        writer.close()
-        
+
         return {
             'code': 1,
             'content': server_obj
         }
-    except (ConnectionRefusedError, CyberDBError) as e:
+    except Exception as e:
         return {
             'code': 0,
             'Exception': e
         }
-    # except Exception as e:
-    #     return {
-    #         'code': 0,
-    #         'Exception': CyberDBError('Incorrect address, port or password for database.')
-    #     }
-
-
@@ -0,0 +1,150 @@
+'''
+    The near cache of the clients.
+'''
+
+
+import threading
+from collections import OrderedDict
+
+
+# The invalidation connection is opened again RETRY seconds after it is
+# lost.
+RETRY = 1
+
+
+class Missing:
+    '''
+        The value cached for a key which does not exist.
+    '''
+
+    def __repr__(self):
+        return 'MISSING'
+
+
+MISSING = Missing()
+
+
+class NearCache:
+    '''
+        The values of the keys of CyberDict tables read by a client, the
+        least recently used are dropped when there are more than max_keys.
+        The server tracks the cached keys and pushes their invalidation to
+        the invalidation connection of the client. The cache is only used
+        while that connection is open, it is flushed when it is lost.
+
+        A read marks its key pending before it is sent. An invalidation
+        of the key which arrives before the response cancels it, so a
+        value changed while it was read is not cached.
+
+        The cached values are shared by the reads, do not modify them.
+    '''
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        # The id of the invalidation connection given by the server, None
+        # while it is not connected.
+        self.client_id = None
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'invalidations': 0,
+            'flushes': 0
+        }
+
+    def get(self, table_name: str, key) -> tuple:
+        '''
+            Return Type: tuple, whether the key is cached and its value,
+            MISSING if the key does not exist.
+        '''
+        with self._lock:
+            try:
+                value = self._entries[table_name, key]
+            except (KeyError, TypeError):
+                self.stats['misses'] += 1
+                return False, None
+            self._entries.move_to_end((table_name, key))
+            self.stats['hits'] += 1
+            return True, value
+
+    def begin(self, table_name: str, key):
+        '''
+            Mark a read of the key pending.
+
+            Return Type: object, the token of the read passed to finish,
+            None if the key cannot be cached now.
+        '''
+        token = object()
+        with self._lock:
+            if self.client_id is None:
+                return None
+            try:
+                self._pending[table_name, key] = token
+            except TypeError:
+                return None
+        return token
+
+    def finish(self, table_name: str, key, token, value):
+        '''
+            Cache the value read unless the key was invalidated since the
+            read began.
+        '''
+        with self._lock:
+            if self._pending.get((table_name, key)) is not token:
+                return
+            del self._pending[table_name, key]
+            self._entries[table_name, key] = value
+            if len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+
+    def cancel(self, table_name: str, key, token):
+        '''
+            End a pending read without caching its value.
+        '''
+        with self._lock:
+            if self._pending.get((table_name, key)) is token:
+                del self._pending[table_name, key]
+
+    def invalidate(self, table_name: str, keys=None):
+        '''
+            Drop the keys of the table, None drops the whole table.
+        '''
+        with self._lock:
+            self.stats['invalidations'] += 1
+            if keys is None:
+                for entries in (self._entries, self._pending):
+                    for cache_key in [cache_key for cache_key in entries
+                                      if cache_key[0] == table_name]:
+                        del entries[cache_key]
+            else:
+                for key in keys:
+                    self._entries.pop((table_name, key), None)
+                    self._pending.pop((table_name, key), None)
+
+    def connect(self, client_id: int):
+        '''
+            Start caching with the id of a new invalidation connection.
+        '''
+        with self._lock:
+            self.client_id = client_id
+
+    def disconnect(self):
+        '''
+            Stop caching and flush the cache, the invalidations are lost
+            with the connection.
+        '''
+        with self._lock:
+            if self.client_id is not None:
+                self.stats['flushes'] += 1
+            self.client_id = None
+            self._entries.clear()
+            self._pending.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self._entries)
+            stats['connected'] = self.client_id is not None
+        return stats
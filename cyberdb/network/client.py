@@ -1,14 +1,17 @@
 import time
-import inspect
+import select
 import socket
+import threading
+from collections import deque
 from typing import List, Tuple, Dict
 
 from obj_encrypt import Secret
 
 from ..data import datas
-from ..extensions import CyberDBError, WrongInputCyberDBError, WrongPasswordCyberDBError, WrongTableNameCyberDBError
+from ..extensions import auth, CyberDBError, DisconCyberDBError, WrongInputCyberDBError, WrongPasswordCyberDBError, WrongTableNameCyberDBError
 from ..extensions.signature import Signature
-from . import Stream
+from . import Stream, connections, disconnected, set_nodelay
+from .cache import NearCache, MISSING, RETRY
 
 
 class Connection:
@@ -21,58 +24,213 @@ class Connection:
         s: socket.socket = None,
     ):
         self.s = s
+        # Requests queued by an open Pipeline, None when not pipelining.
+        self.pipeline = None
+        # Placeholders of requests sent ahead by prefetching iterators, 
+        # their responses are read in order before the connection is 
+        # used again.
+        self.pending = []
+
+    def settle(self, dp: datas.DataParsing):
+        '''
+            Read the responses of the requests sent ahead into their 
+            placeholders.
+        '''
+        while self.pending:
+            placeholder = self.pending.pop(0)
+            try:
+                placeholder['server_obj'] = Stream(self.s, dp).read()
+            except DisconCyberDBError:
+                # The other responses are lost with the connection.
+                self.pending.clear()
+                raise
 
 
 class ConPool:
     '''
         Maintain connection pool.
+
+        The pool is bounded by max_con and is safe to share between 
+        threads and Gevent coroutines. Idle connections are handed out 
+        last in, first out, so the least used connections expire. A 
+        connection is only checked with a /connect round trip when it has 
+        been idle for more than check_idle seconds, broken connections 
+        are detected when they are used and discarded when returned. A 
+        broken connection, such as after a restart of the server, makes 
+        the connections returned before it suspect, they are checked 
+        before they are handed out again.
     '''
 
     def __init__(self, host: str, port: str, dp: datas.DataParsing,
-                 time_out: int = None):
+                 time_out: int = None, min_con: int = 0,
+                 max_con: int = None, wait_timeout: float = None,
+                 check_idle: int = 60):
         self._host = host
         self._port = port
         self._dp = dp
         self._time_out = time_out
-        self._connections = []
+        self._min_con = min_con
+        self._max_con = max_con
+        self._wait_timeout = wait_timeout
+        self._check_idle = check_idle
+        # Idle connections as (socket, timestamp of return).
+        self._connections = deque()
+        # The number of open connections, idle or in use.
+        self._size = 0
+        # When the last broken connection was discarded, the connections 
+        # returned before are checked.
+        self._broken_at = None
+        self._cond = threading.Condition()
+        self.stats = {
+            'hits': 0,
+            'creations': 0,
+            'waits': 0,
+            'checks': 0,
+            'discards': 0
+        }
 
-    def get(self):
+    def get(self) -> socket.socket:
         '''
-            Get the connection from the connection pool.
+            Get the connection from the connection pool. If max_con 
+            connections are in use, wait until one is returned, raising 
+            CyberDBError after wait_timeout seconds.
         '''
-        while self._connections:
-            # If the connection is full, the loop waits until a connection
-            # is free.
-            connection = self._connections.pop()
-            time_now = int(time.time())
-            if self._time_out:
-                if time_now > connection['timestamp'] + self._time_out:
+        deadline = None
+        if self._wait_timeout is not None:
+            deadline = time.monotonic() + self._wait_timeout
+
+        while True:
+            s, idle, suspect = self._acquire(deadline)
+            if s is None:
+                return self._create()
+
+            # Check connections that have been idle for a long time, in 
+            # case the server was restarted.
+            if suspect or \
+                    self._check_idle is not None and idle > self._check_idle:
+                with self._cond:
+                    self.stats['checks'] += 1
+                r = confirm_the_connection(s, self._dp)
+                if r['code'] != 1:
+                    self.discard(s)
                     continue
-            # Check if the server is down.
-            r = confirm_the_connection(connection['s'], self._dp)
-            if r['code'] == 1:
-                return connection['s']
-            else:
-                pass
 
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.connect((self._host, self._port))
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            return s
+
+    def _acquire(self, deadline: float = None):
+        '''
+            Take an idle connection, or reserve a slot for a new one.
+
+            Return Type: Tuple[socket.socket, float, bool], the connection, 
+            its idle time in seconds and whether it was returned before a 
+            broken connection. The connection is None if a new one must be 
+            created.
+        '''
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._connections:
+                    s, timestamp = self._connections.pop()
+                    if self._time_out and now > timestamp + self._time_out:
+                        self._close(s)
+                        continue
+                    self.stats['hits'] += 1
+                    suspect = self._broken_at is not None and \
+                        timestamp <= self._broken_at
+                    return s, now - timestamp, suspect
+
+                if self._max_con is None or self._size < self._max_con:
+                    self._size += 1
+                    return None, 0, False
+
+                self.stats['waits'] += 1
+                if deadline is None:
+                    self._cond.wait()
+                else:
+                    timeout = deadline - now
+                    if timeout <= 0 or not self._cond.wait(timeout):
+                        raise CyberDBError(
+                            'Timed out waiting for a connection from the pool.')
+
+    def _create(self) -> socket.socket:
+        '''
+            Open a new connection in a reserved slot.
+        '''
+        s = None
+        try:
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            s.connect((self._host, self._port))
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            set_nodelay(s)
+            handshake(s, self._dp)
+        except BaseException:
+            if s is not None:
+                s.close()
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self.stats['creations'] += 1
         return s
 
+    def _close(self, s: socket.socket):
+        '''
+            Close a connection of the pool, the lock must be held.
+        '''
+        s.close()
+        self._size -= 1
+        self.stats['discards'] += 1
+        self._cond.notify()
+
     def put(self, s: socket.socket):
         '''
             Return the connection to the connection pool.
         '''
-        # If a connection timeout is set, get the current timestamp.
-        timestamp = None
-        if self._time_out:
-            timestamp = int(time.time())
+        if s is None:
+            return
+
+        with self._cond:
+            # The connection was closed after an error. Only a lost 
+            # connection makes the idle connections suspect, not an error 
+            # response of the server.
+            if s.fileno() == -1:
+                self._close(s)
+                if s in disconnected:
+                    self._broken_at = time.monotonic()
+                return
+
+            self._connections.append((s, time.monotonic()))
+            self._cond.notify()
+
+    def discard(self, s: socket.socket):
+        '''
+            Close a broken connection instead of returning it to the pool.
+        '''
+        with self._cond:
+            self._close(s)
 
-        self._connections.insert(0, {
-            's': s,
-            'timestamp': timestamp
-        })
+    def warm_up(self):
+        '''
+            Open connections until the pool holds min_con connections.
+        '''
+        while True:
+            with self._cond:
+                if self._size >= self._min_con:
+                    return
+                self._size += 1
+            self.put(self._create())
+
+    def get_stats(self) -> dict:
+        '''
+            Counters of the pool and the current number of connections.
+        '''
+        with self._cond:
+            stats = dict(self.stats)
+            stats['size'] = self._size
+            stats['idle'] = len(self._connections)
+        return stats
 
 
 def network(func):
@@ -82,8 +240,16 @@ def network(func):
     '''
 
     def wrapper(self, *args, **kw):
-        stream = Stream(self._con.s, self._dp)
         client_obj = func(self, *args, **kw)
+
+        # If a pipeline is open, the request is queued and sent when the 
+        # pipeline is executed.
+        if self._con.pipeline is not None:
+            self._con.pipeline.append(client_obj)
+            return None
+
+        self._con.settle(self._dp)
+        stream = Stream(self._con.s, self._dp)
         stream.write(client_obj)
 
         server_obj = stream.read()
@@ -91,8 +257,7 @@ def network(func):
             self._con.s.close()
             raise server_obj['Exception']
 
-        if server_obj.get('content'):
-            return server_obj['content']
+        return server_obj.get('content')
 
     return wrapper
 
@@ -111,20 +276,26 @@ class CyberDict:
         dictionary official documentation]
         (https://docs.python.org/3/library/stdtypes.html#mapping-types-dict).
 
-        Iterate over CyberDict using a for loop with client space 
-        complexity o(n), where n is the length of CyberDict.keys() .
+        Iterating over CyberDict with a for loop fetches the keys from 
+        the server page by page, and the space complexity of the client is 
+        o(1) per page.
+
+        When the client has a near cache, table[key] and get are served 
+        from the cache when the key was read before and has not changed.
     '''
 
     def __init__(
         self,
         table_name: str,
         dp: datas.DataParsing,
-        con: Connection
+        con: Connection,
+        cache: NearCache = None
     ):
         self._table_name = table_name
         self._dp = dp
         self._con = con
         self._route = '/cyberdict'
+        self._cache = cache
 
     @network
     def __repr__(self):
@@ -150,16 +321,75 @@ class CyberDict:
     def __iter__(self):
         return self.generate()
 
-    @network
     def __getitem__(self, key):
+        if self._cache is None or self._con.pipeline is not None:
+            return self._getitem(key)
+
+        found, value = self._cache.get(self._table_name, key)
+        if found:
+            if value is MISSING:
+                raise KeyError(key)
+            return value
+        return self._cached_read({
+            'route': self._route + '/getitem',
+            'table_name': self._table_name,
+            'key': key
+        })
+
+    @network
+    def _getitem(self, key):
         return {
             'route': self._route + '/getitem',
             'table_name': self._table_name,
             'key': key
         }
 
+    def _cached_read(self, client_obj: dict):
+        '''
+            Read a key and cache its value if the server tracks it.
+        '''
+        key = client_obj['key']
+        token = self._cache.begin(self._table_name, key)
+        if token is not None:
+            client_obj['track'] = self._cache.client_id
+
+        try:
+            self._con.settle(self._dp)
+            stream = Stream(self._con.s, self._dp)
+            stream.write(client_obj)
+            server_obj = stream.read()
+        except BaseException:
+            if token is not None:
+                self._cache.cancel(self._table_name, key, token)
+            raise
+
+        if server_obj['code'] == 0:
+            if token is not None:
+                self._cache.cancel(self._table_name, key, token)
+            self._con.s.close()
+            raise server_obj['Exception']
+
+        if token is not None:
+            if server_obj.get('tracked'):
+                value = server_obj['content'] \
+                    if server_obj.get('exists', True) else MISSING
+                self._cache.finish(self._table_name, key, token, value)
+            else:
+                self._cache.cancel(self._table_name, key, token)
+        return server_obj['content']
+
+    def _forget(self, keys=None):
+        '''
+            Drop the keys written by this client from the near cache at 
+            once, None drops the table. The server pushes their 
+            invalidation too.
+        '''
+        if self._cache is not None:
+            self._cache.invalidate(self._table_name, keys)
+
     @network
     def __setitem__(self, key, value):
+        self._forget((key,))
         return {
             'route': self._route + '/setitem',
             'table_name': self._table_name,
@@ -169,12 +399,136 @@ class CyberDict:
 
     @network
     def __delitem__(self, key):
+        self._forget((key,))
         return {
             'route': self._route + '/delitem',
             'table_name': self._table_name,
             'key': key
         }
 
+    @network
+    def set(self, key, value, ttl: float = None) -> None:
+        '''
+            Set the value of a key, like table[key] = value.
+
+            Parameters:
+
+                key -- the key.
+
+                value -- the value.
+
+                ttl -- the time to live of the key in seconds, the key is 
+                deleted when it expires. None keeps the key until it is 
+                deleted.
+
+            Return Type: None
+        '''
+        self._forget((key,))
+        return {
+            'route': self._route + '/setitem',
+            'table_name': self._table_name,
+            'key': key,
+            'value': value,
+            'ttl': ttl
+        }
+
+    @network
+    def expire(self, key, ttl: float) -> bool:
+        '''
+            Set the time to live of an existing key.
+
+            Parameters:
+
+                key -- the key.
+
+                ttl -- the time to live in seconds, None removes the time 
+                to live of the key.
+
+            Return Type: bool, whether the key exists.
+        '''
+        self._forget((key,))
+        return {
+            'route': self._route + '/expire',
+            'table_name': self._table_name,
+            'key': key,
+            'ttl': ttl
+        }
+
+    @network
+    def ttl(self, key) -> float:
+        '''
+            Get the time to live of a key, raising KeyError if the key does 
+            not exist.
+
+            Return Type: float, the seconds the key has to live, None if it 
+            has no time to live.
+        '''
+        return {
+            'route': self._route + '/ttl',
+            'table_name': self._table_name,
+            'key': key
+        }
+
+    @network
+    def mget(self, keys: List, default=None) -> List:
+        '''
+            Get the values of multiple keys in one round trip.
+
+            Parameters:
+
+                keys -- the keys to get.
+
+                default -- the value returned for keys that do not exist.
+
+            Return Type: List, the values in the order of keys.
+        '''
+        return {
+            'route': self._route + '/mget',
+            'table_name': self._table_name,
+            'keys': list(keys),
+            'default': default
+        }
+
+    @network
+    def mset(self, mapping: Dict) -> None:
+        '''
+            Set multiple key-value pairs in one round trip.
+
+            Parameters:
+
+                mapping -- a dictionary of the key-value pairs to set.
+
+            Return Type: None
+        '''
+        mapping = dict(mapping)
+        self._forget(mapping)
+        return {
+            'route': self._route + '/mset',
+            'table_name': self._table_name,
+            'mapping': mapping
+        }
+
+    @network
+    def mdelete(self, keys: List) -> List[bool]:
+        '''
+            Delete multiple keys in one round trip. Keys that do not exist 
+            are skipped.
+
+            Parameters:
+
+                keys -- the keys to delete.
+
+            Return Type: List[bool], in the order of keys, True if the key 
+            was deleted and False if it did not exist.
+        '''
+        keys = list(keys)
+        self._forget(keys)
+        return {
+            'route': self._route + '/mdelete',
+            'table_name': self._table_name,
+            'keys': keys
+        }
+
     @network
     def todict(self) -> Dict:
         '''
@@ -187,8 +541,22 @@ class CyberDict:
             'table_name': self._table_name
         }
 
-    @network
     def get(self, key, default=None) -> any:
+        if self._cache is None or self._con.pipeline is not None:
+            return self._get(key, default)
+
+        found, value = self._cache.get(self._table_name, key)
+        if found:
+            return default if value is MISSING else value
+        return self._cached_read({
+            'route': self._route + '/get',
+            'table_name': self._table_name,
+            'key': key,
+            'default': default
+        })
+
+    @network
+    def _get(self, key, default=None) -> any:
         return {
             'route': self._route + '/get',
             'table_name': self._table_name,
@@ -198,6 +566,7 @@ class CyberDict:
 
     @network
     def setdefault(self, key, default=None) -> None:
+        self._forget((key,))
         return {
             'route': self._route + '/setdefault',
             'table_name': self._table_name,
@@ -207,35 +576,120 @@ class CyberDict:
 
     @network
     def update(self, dict2) -> None:
+        self._forget(dict2)
         return {
             'route': self._route + '/update',
             'table_name': self._table_name,
             'dict2': dict2,
         }
 
+    def keys(self, lazy: bool = False) -> List:
+        '''
+            Get the keys of CyberDict.
+
+            Parameters:
+
+                lazy -- If True, return a generator that fetches the keys 
+                page by page with CyberDict.scan_iter.
+
+            Return Type: List, or Generator if lazy is True.
+        '''
+        if lazy:
+            return self.scan_iter(mode='keys')
+        return self._keys()
+
+    def values(self, lazy: bool = False) -> List:
+        '''
+            Get the values of CyberDict, lazy is the same as CyberDict.keys.
+
+            Return Type: List, or Generator if lazy is True.
+        '''
+        if lazy:
+            return self.scan_iter(mode='values')
+        return self._values()
+
+    def items(self, lazy: bool = False) -> List[Tuple]:
+        '''
+            Get the key-value pairs of CyberDict, lazy is the same as 
+            CyberDict.keys.
+
+            Return Type: List[Tuple], or Generator if lazy is True.
+        '''
+        if lazy:
+            return self.scan_iter(mode='items')
+        return self._items()
+
     @network
-    def keys(self) -> List:
+    def _keys(self) -> List:
         return {
             'route': self._route + '/keys',
             'table_name': self._table_name
         }
 
     @network
-    def values(self) -> List:
+    def _values(self) -> List:
         return {
             'route': self._route + '/values',
             'table_name': self._table_name
         }
 
     @network
-    def items(self) -> List[Tuple]:
+    def _items(self) -> List[Tuple]:
         return {
             'route': self._route + '/items',
             'table_name': self._table_name
         }
 
+    @network
+    def scan(self, cursor: int = 0, count: int = 1000, match: str = None,
+             mode: str = 'keys') -> Tuple[int, List]:
+        '''
+            Incrementally iterate over CyberDict on the server, one page per 
+            call.
+
+            Parameters:
+
+                cursor -- 0 to start a new iteration, otherwise the cursor 
+                returned by the previous call.
+
+                count -- the maximum number of entries examined on the server 
+                in this call.
+
+                match -- glob-style pattern such as 'user:*', only str keys 
+                matching it are returned.
+
+                mode -- 'keys', 'values' or 'items'.
+
+            Return Type: Tuple[int, List], the cursor of the next call and 
+            the page. The cursor is 0 when the iteration is finished.
+        '''
+        return {
+            'route': self._route + '/scan',
+            'table_name': self._table_name,
+            'cursor': cursor,
+            'count': count,
+            'match': match,
+            'mode': mode
+        }
+
+    def scan_iter(self, match: str = None, count: int = 1000,
+                  mode: str = 'keys'):
+        '''
+            Generator over CyberDict using CyberDict.scan, the client only 
+            holds one page at a time. The parameters are the same as 
+            CyberDict.scan.
+        '''
+        cursor = 0
+        while True:
+            cursor, page = self.scan(cursor=cursor, count=count, match=match,
+                                     mode=mode)
+            yield from page
+            if cursor == 0:
+                break
+
     @network
     def pop(self, key, default=None) -> any:
+        self._forget((key,))
         return {
             'route': self._route + '/pop',
             'table_name': self._table_name,
@@ -245,6 +699,7 @@ class CyberDict:
 
     @network
     def popitem(self) -> Tuple[any, any]:
+        self._forget()
         return {
             'route': self._route + '/popitem',
             'table_name': self._table_name
@@ -252,14 +707,204 @@ class CyberDict:
 
     @network
     def clear(self) -> None:
+        self._forget()
         return {
             'route': self._route + '/clear',
             'table_name': self._table_name
         }
 
+    @network
+    def create_index(self, field: str, kind: str = 'hash') -> bool:
+        '''
+            Index a field path of the records of CyberDict on the server, 
+            the values of the table are dictionaries such as user 
+            records. The index is maintained by every write of the table, 
+            and lookup and lookup_range use it instead of scanning the 
+            table.
+
+            Parameters:
+
+                field -- the field path, the keys of the nested 
+                dictionaries joined by dots, such as 'status' or 
+                'address.city'. The records without the field are not 
+                indexed.
+
+                kind -- 'hash' for the lookups of a value, 'sorted' for 
+                the lookups of a range of values too. Numbers, str, 
+                bytes, dates and datetimes are ordered.
+
+            Return Type: bool, False if the index already exists. An index 
+            of the other kind on the field is replaced.
+        '''
+        return {
+            'route': self._route + '/create_index',
+            'table_name': self._table_name,
+            'field': field,
+            'kind': kind
+        }
+
+    @network
+    def drop_index(self, field: str) -> bool:
+        '''
+            Return Type: bool, whether the index existed.
+        '''
+        return {
+            'route': self._route + '/drop_index',
+            'table_name': self._table_name,
+            'field': field
+        }
+
+    @network
+    def get_indexes(self) -> Dict:
+        '''
+            Return Type: Dict, the kind of index of each indexed field path.
+        '''
+        return {
+            'route': self._route + '/indexes',
+            'table_name': self._table_name
+        }
+
+    @network
+    def lookup(self, field: str, value, limit: int = None) -> Dict:
+        '''
+            Find the records whose field equals value with the index of 
+            the field.
+
+            Parameters:
+
+                field -- an indexed field path.
+
+                value -- the value of the field.
+
+                limit -- the maximum number of records returned, None is 
+                unlimited.
+
+            Return Type: Dict, the keys and the records found.
+        '''
+        return {
+            'route': self._route + '/lookup',
+            'table_name': self._table_name,
+            'field': field,
+            'value': value,
+            'limit': limit
+        }
+
+    @network
+    def lookup_range(self, field: str, min_value=None, max_value=None,
+                     reverse: bool = False, limit: int = None) -> Dict:
+        '''
+            Find the records whose field is between min_value and 
+            max_value included with the sorted index of the field.
+
+            Parameters:
+
+                field -- a field path with a sorted index.
+
+                min_value, max_value -- the bounds of the values, None is 
+                unbounded. Both bounds are numbers, str, bytes, dates or 
+                datetimes of the same kind, only the values of that kind 
+                are found. Without bounds, the values of every kind are 
+                found, the numbers first.
+
+                reverse -- False from the lowest value, True from the 
+                highest.
+
+                limit -- the maximum number of records returned, None is 
+                unlimited.
+
+            Return Type: Dict, the keys and the records found, in the 
+            order of their values.
+        '''
+        return {
+            'route': self._route + '/lookup_range',
+            'table_name': self._table_name,
+            'field': field,
+            'min_value': min_value,
+            'max_value': max_value,
+            'reverse': reverse,
+            'limit': limit
+        }
+
+    @network
+    def query(self, where: Dict = None, fields: List = None,
+              limit: int = None) -> Dict:
+        '''
+            Find the records matching a predicate on the server, only the 
+            matches are sent back. The predicate is a dictionary of plain 
+            values, no code of the client is run on the server.
+
+            Parameters:
+
+                where -- the predicate, each key is a field path of the 
+                records with a value to be equal to, or a dictionary of 
+                operators: $eq, $ne, $lt, $lte, $gt, $gte, $in, $nin, 
+                $contains, $prefix, $regex and $exists. $and and $or 
+                take a list of predicates and $not a predicate. None 
+                matches every record. For example:
+
+                    {'status': 'active', 'age': {'$gte': 18},
+                     '$or': [{'name': {'$prefix': 'A'}},
+                             {'tags': {'$contains': 'vip'}}]}
+
+                fields -- the field paths returned for each record, None 
+                returns the whole records.
+
+                limit -- the maximum number of records returned, None is 
+                unlimited.
+
+            The candidates are taken from an index when the predicate 
+            has an equality, a $in or a range on an indexed field, 
+            otherwise the table is scanned on the server.
+
+            Return Type: Dict, the keys and the records or their fields.
+        '''
+        return {
+            'route': self._route + '/query',
+            'table_name': self._table_name,
+            'where': where,
+            'fields': fields,
+            'limit': limit
+        }
+
+    @network
+    def aggregate(self, field: str = None, where: Dict = None,
+                  group_by: str = None) -> Dict:
+        '''
+            Compute the count, sum, mean, min and max of the values of 
+            CyberDict on the server, only the result is sent back. The 
+            server computes it in chunks and serves the other clients 
+            between the chunks.
+
+            Parameters:
+
+                field -- the field path of the records to aggregate, such 
+                as 'price', None aggregates the values themselves. The 
+                records without the field are not counted.
+
+                where -- a predicate like CyberDict.query, only the 
+                matching records are aggregated.
+
+                group_by -- a field path, the records are aggregated by 
+                its value, the records without it are in the None group.
+
+            The int and float values are summed and averaged, min and max 
+            are taken among the numbers, str, bytes, dates and datetimes, 
+            the numbers first.
+
+            Return Type: Dict, with the keys count, sum, mean, min and max, 
+            mean, min and max are None without values. With group_by, 
+            such a dictionary for each group.
+        '''
+        return {
+            'route': self._route + '/aggregate',
+            'table_name': self._table_name,
+            'field': field,
+            'where': where,
+            'group_by': group_by
+        }
+
     def generate(self):
-        for key in self.keys():
-            yield key
+        return self.scan_iter(mode='keys')
 
 
 class CyberList:
@@ -275,11 +920,14 @@ class CyberList:
         [Python List Official Documentation]
         (https://docs.python.org/3/tutorial/datastructures.html#more-on-lists).
 
-        The CyberList is iterated using a for loop, each iteration 
-        will fetch the content from the server, and the space complexity 
-        of the client is o(1).
+        The CyberList is iterated using a for loop, the content is 
+        fetched from the server page by page with the next page 
+        prefetched, and the space complexity of the client is o(1) per 
+        page. The number of elements per page is CyberList.page_size.
     '''
 
+    page_size = 1000
+
     def __init__(
         self,
         table_name: str,
@@ -415,34 +1063,57 @@ class CyberList:
         }
 
     @network
-    def sort(self, key=None, reverse=False) -> None:
-        # Reference the lambda part to func.
-        if key:
-            if key.__code__.co_name == '<lambda>':
-                key = 'func = ' + \
-                    inspect.getsource(key).split('=')[1].rsplit(')')[0]
-            # De-indent the code and reference the function to the func.
-            elif key.__code__.co_name:
-                code = inspect.getsource(key)
-                num = 0
-                for i in range(len(code)):
-                    if code[i] != ' ':
-                        num = i
-                        break
-                if i != 0:
-                    code_new = ''
-                    for line in code.splitlines():
-                        code_new += line[num:] + '\n'
-                else:
-                    code_new = code
-                key = code_new + '\nfunc = {}'.format(key.__code__.co_name)
+    def sort(self, key: str = None, reverse: bool = False,
+             field: str = None, maintain: bool = None) -> None:
+        '''
+            Sort CyberList on the server, no code of the client is run on 
+            the server.
 
-        return {
-            'route': self._route + '/sort',
-            'table_name': self._table_name,
-            'key': key,
-            'reverse': reverse
-        }
+            Parameters:
+
+                key -- the name of a key function registered on the 
+                server with Server.register_sort_key, None sorts the 
+                elements themselves.
+
+                reverse -- sort in descending order.
+
+                field -- sort by a field path of the elements instead of 
+                a key, such as 'address.city'. Each name of the path is 
+                the key of a dictionary, or the attribute of another 
+                object.
+
+                maintain -- True keeps CyberList sorted in this order, 
+                False stops it, None leaves it unchanged. The server 
+                then remembers how many leading elements are still 
+                sorted, appends keep them, and the next sort in this 
+                order only sorts the other elements and merges them.
+
+            Return Type: None
+        '''
+        if callable(key):
+            raise WrongInputCyberDBError(
+                'The key must be the name of a key function registered '
+                'with Server.register_sort_key.')
+
+        return {
+            'route': self._route + '/sort',
+            'table_name': self._table_name,
+            'key': key,
+            'reverse': reverse,
+            'field': field,
+            'maintain': maintain
+        }
+
+    @network
+    def get_sort_order(self) -> Dict:
+        '''
+            Return Type: Dict, the key, field and reverse of the order 
+            CyberList is kept sorted in, None if it is not.
+        '''
+        return {
+            'route': self._route + '/sort_order',
+            'table_name': self._table_name
+        }
 
     @network
     def clear(self) -> None:
@@ -451,9 +1122,548 @@ class CyberList:
             'table_name': self._table_name,
         }
 
-    def generate(self):
-        for i in range(self.__len__()):
-            yield self.__getitem__(i)
+    @network
+    def query(self, where: Dict = None, fields: List = None,
+              limit: int = None) -> List:
+        '''
+            Find the elements matching a predicate on the server, see 
+            CyberDict.query. The operators at the top level of the 
+            predicate apply to the elements themselves, such as 
+            {'$gt': 3}.
+
+            Return Type: List, the elements or their fields, in order.
+        '''
+        return {
+            'route': self._route + '/query',
+            'table_name': self._table_name,
+            'where': where,
+            'fields': fields,
+            'limit': limit
+        }
+
+    @network
+    def aggregate(self, field: str = None, where: Dict = None,
+                  group_by: str = None) -> Dict:
+        '''
+            Compute the count, sum, mean, min and max of the elements on 
+            the server, see CyberDict.aggregate.
+
+            Return Type: Dict
+        '''
+        return {
+            'route': self._route + '/aggregate',
+            'table_name': self._table_name,
+            'field': field,
+            'where': where,
+            'group_by': group_by
+        }
+
+    def _request_page(self, start: int, page_size: int) -> dict:
+        '''
+            Send the request of a page without waiting for the response, 
+            and return the placeholder that will receive it.
+        '''
+        stream = Stream(self._con.s, self._dp)
+        stream.write({
+            'route': self._route + '/getitem',
+            'table_name': self._table_name,
+            'index': slice(start, start + page_size)
+        })
+        placeholder = {
+            'server_obj': None
+        }
+        self._con.pending.append(placeholder)
+        return placeholder
+
+    def _receive_page(self, placeholder: dict) -> List:
+        '''
+            Wait for the response of a page.
+        '''
+        self._con.settle(self._dp)
+        server_obj = placeholder['server_obj']
+        if server_obj['code'] == 0:
+            self._con.s.close()
+            raise server_obj['Exception']
+        return server_obj['content']
+
+    def generate(self, page_size: int = None):
+        '''
+            Iterate over CyberList page by page. Each page is fetched as a 
+            slice, and the next page is requested before the current page 
+            is consumed, so its transfer overlaps with the loop body.
+
+            The iteration works by index like a Python list iterator: each 
+            page is the slice of the list at the time it is requested, 
+            elements appended during the iteration are yielded, and 
+            inserting or deleting elements before the current index may 
+            cause elements to be repeated or skipped. As the next page is 
+            requested in advance, changes made while a page is consumed 
+            are only seen from the page after the next one.
+
+            Parameters:
+
+                page_size -- the number of elements per page, the default 
+                is CyberList.page_size.
+        '''
+        page_size = page_size or self.page_size
+        start = 0
+        placeholder = self._request_page(start, page_size)
+        while placeholder is not None:
+            page = self._receive_page(placeholder)
+            start += len(page)
+
+            # Prefetch the next page if this page is full.
+            placeholder = None
+            if len(page) == page_size:
+                placeholder = self._request_page(start, page_size)
+
+            yield from page
+
+
+class CyberQueue:
+    '''
+        A child object generated by a Proxy object for performing queue 
+        operations, the table is a collections.deque on the server. 
+        Values are pushed and popped at both ends in O(1), and when the 
+        queue has a maxlen, pushing to a full queue discards as many 
+        values from the other end. CyberQueue can execute the append, 
+        appendleft, extend, extendleft, pop, popleft and clear methods of 
+        deque, please refer to [Python deque Official Documentation]
+        (https://docs.python.org/3/library/collections.html#collections.deque).
+
+        bpop and bpopleft block until a value is available, the request 
+        waits on the server without polling. This makes the CyberQueue a 
+        job queue between processes.
+    '''
+
+    def __init__(
+        self,
+        table_name: str,
+        dp: datas.DataParsing,
+        con: Connection
+    ):
+        self._table_name = table_name
+        self._dp = dp
+        self._con = con
+        self._route = '/cyberqueue'
+
+    @network
+    def __repr__(self):
+        return {
+            'route': self._route + '/repr',
+            'table_name': self._table_name
+        }
+
+    @network
+    def __str__(self):
+        return {
+            'route': self._route + '/str',
+            'table_name': self._table_name
+        }
+
+    @network
+    def __len__(self):
+        return {
+            'route': self._route + '/len',
+            'table_name': self._table_name
+        }
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    @network
+    def tolist(self) -> List:
+        return {
+            'route': self._route + '/tolist',
+            'table_name': self._table_name
+        }
+
+    @network
+    def append(self, value) -> None:
+        return {
+            'route': self._route + '/append',
+            'table_name': self._table_name,
+            'value': value,
+            'left': False
+        }
+
+    @network
+    def appendleft(self, value) -> None:
+        return {
+            'route': self._route + '/append',
+            'table_name': self._table_name,
+            'value': value,
+            'left': True
+        }
+
+    @network
+    def extend(self, obj) -> None:
+        return {
+            'route': self._route + '/extend',
+            'table_name': self._table_name,
+            'obj': list(obj),
+            'left': False
+        }
+
+    @network
+    def extendleft(self, obj) -> None:
+        return {
+            'route': self._route + '/extend',
+            'table_name': self._table_name,
+            'obj': list(obj),
+            'left': True
+        }
+
+    @network
+    def pop(self) -> any:
+        return {
+            'route': self._route + '/pop',
+            'table_name': self._table_name,
+            'left': False
+        }
+
+    @network
+    def popleft(self) -> any:
+        return {
+            'route': self._route + '/pop',
+            'table_name': self._table_name,
+            'left': True
+        }
+
+    @network
+    def bpop(self, timeout: float = None, default=None) -> any:
+        '''
+            Pop a value from the right end, waiting for one to be pushed 
+            if the queue is empty. The clients waiting on the same queue 
+            are served in the order they arrived.
+
+            Parameters:
+
+                timeout -- the maximum time to wait in seconds, None waits 
+                forever.
+
+                default -- the value returned if the timeout expires.
+
+            Return Type: any
+        '''
+        return {
+            'route': self._route + '/bpop',
+            'table_name': self._table_name,
+            'left': False,
+            'timeout': timeout,
+            'default': default
+        }
+
+    @network
+    def bpopleft(self, timeout: float = None, default=None) -> any:
+        '''
+            Pop a value from the left end, waiting for one to be pushed 
+            if the queue is empty, see bpop.
+
+            Return Type: any
+        '''
+        return {
+            'route': self._route + '/bpop',
+            'table_name': self._table_name,
+            'left': True,
+            'timeout': timeout,
+            'default': default
+        }
+
+    @network
+    def clear(self) -> None:
+        return {
+            'route': self._route + '/clear',
+            'table_name': self._table_name
+        }
+
+
+class CyberSortedSet:
+    '''
+        A child object generated by a Proxy object for performing sorted 
+        set operations, like the sorted sets of Redis. Each member has a 
+        score, an int or a float, and the members are ordered by score, 
+        then by member. Adding and removing members, getting their rank 
+        and the start of a range are O(log n) on the server, and the 
+        ranges only return the requested window.
+
+        The CyberSortedSet is iterated using a for loop, the 
+        (member, score) pairs are fetched by rank page by page. The 
+        number of pairs per page is CyberSortedSet.page_size.
+    '''
+
+    page_size = 1000
+
+    def __init__(
+        self,
+        table_name: str,
+        dp: datas.DataParsing,
+        con: Connection
+    ):
+        self._table_name = table_name
+        self._dp = dp
+        self._con = con
+        self._route = '/cybersortedset'
+
+    @network
+    def __repr__(self):
+        return {
+            'route': self._route + '/repr',
+            'table_name': self._table_name
+        }
+
+    @network
+    def __str__(self):
+        return {
+            'route': self._route + '/str',
+            'table_name': self._table_name
+        }
+
+    @network
+    def __len__(self):
+        return {
+            'route': self._route + '/len',
+            'table_name': self._table_name
+        }
+
+    def __iter__(self):
+        start = 0
+        while True:
+            page = self.range(start, start + self.page_size, withscores=True)
+            yield from page
+            if len(page) < self.page_size:
+                return
+            start += self.page_size
+
+    @network
+    def add(self, mapping: Dict) -> int:
+        '''
+            Add the members of mapping with their scores, or change the 
+            scores of the members already in the set.
+
+            Return Type: int, the number of new members.
+        '''
+        return {
+            'route': self._route + '/add',
+            'table_name': self._table_name,
+            'mapping': mapping
+        }
+
+    @network
+    def incr(self, member, amount=1):
+        '''
+            Add amount to the score of the member, a new member starts 
+            from 0.
+
+            Return Type: int or float, the new score.
+        '''
+        return {
+            'route': self._route + '/incr',
+            'table_name': self._table_name,
+            'member': member,
+            'amount': amount
+        }
+
+    @network
+    def remove(self, *members) -> int:
+        '''
+            Return Type: int, the number of members removed.
+        '''
+        return {
+            'route': self._route + '/remove',
+            'table_name': self._table_name,
+            'members': members
+        }
+
+    @network
+    def score(self, member):
+        '''
+            Return Type: int or float, None if the member is not in the 
+            set.
+        '''
+        return {
+            'route': self._route + '/score',
+            'table_name': self._table_name,
+            'member': member
+        }
+
+    @network
+    def rank(self, member, reverse: bool = False) -> int:
+        '''
+            Return Type: int, the position of the member from the lowest 
+            score, or from the highest if reverse is True. None if the 
+            member is not in the set.
+        '''
+        return {
+            'route': self._route + '/rank',
+            'table_name': self._table_name,
+            'member': member,
+            'reverse': reverse
+        }
+
+    @network
+    def range(self, start: int = 0, stop: int = None, reverse: bool = False,
+              withscores: bool = False) -> List:
+        '''
+            Get the members from the rank start to stop excluded, negative 
+            ranks count from the end like the indexes of a list. The 
+            ranks count from the highest score if reverse is True.
+
+            Return Type: List, the members, or the (member, score) pairs 
+            if withscores is True.
+        '''
+        return {
+            'route': self._route + '/range',
+            'table_name': self._table_name,
+            'start': start,
+            'stop': stop,
+            'reverse': reverse,
+            'withscores': withscores
+        }
+
+    @network
+    def range_by_score(self, min_score=None, max_score=None,
+                       reverse: bool = False, offset: int = 0,
+                       count: int = None, withscores: bool = False) -> List:
+        '''
+            Get the members with a score between min_score and max_score 
+            included, None is unbounded. The first offset members are 
+            skipped and at most count are returned, from the highest 
+            score if reverse is True.
+
+            Return Type: List, the members, or the (member, score) pairs 
+            if withscores is True.
+        '''
+        return {
+            'route': self._route + '/range_by_score',
+            'table_name': self._table_name,
+            'min_score': min_score,
+            'max_score': max_score,
+            'reverse': reverse,
+            'offset': offset,
+            'count': count,
+            'withscores': withscores
+        }
+
+    @network
+    def count(self, min_score=None, max_score=None) -> int:
+        '''
+            Return Type: int, the number of members with a score between 
+            min_score and max_score included.
+        '''
+        return {
+            'route': self._route + '/count',
+            'table_name': self._table_name,
+            'min_score': min_score,
+            'max_score': max_score
+        }
+
+    @network
+    def todict(self) -> Dict:
+        '''
+            Return Type: Dict, the members and their scores in order.
+        '''
+        return {
+            'route': self._route + '/todict',
+            'table_name': self._table_name
+        }
+
+    @network
+    def clear(self) -> None:
+        return {
+            'route': self._route + '/clear',
+            'table_name': self._table_name
+        }
+
+
+class Pipeline:
+    '''
+        The Pipeline object generated by the Proxy.pipeline method queues 
+        the operations of the CyberDict and CyberList sub-objects of the 
+        Proxy, and sends them to the server in one round trip when 
+        Pipeline.execute is run. While the pipeline is open, the queued 
+        operations return None, their results are returned by 
+        Pipeline.execute in the order of the operations.
+
+        Used as a context manager, the pipeline is executed on exit, and 
+        the results are saved in Pipeline.results, then the first 
+        exception of the operations is raised.
+    '''
+
+    def __init__(self, con: Connection, dp: datas.DataParsing):
+        self._con = con
+        self._dp = dp
+        self._con.pipeline = []
+        self.results = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.results = self.execute(raise_on_error=False)
+            for r in self.results:
+                if isinstance(r, Exception):
+                    raise r
+        else:
+            self.reset()
+
+    def __len__(self):
+        if self._con.pipeline is None:
+            return 0
+        return len(self._con.pipeline)
+
+    def execute(self, raise_on_error: bool = True) -> List:
+        '''
+            Send the queued operations to the server and close the pipeline.
+
+            Parameters:
+
+                raise_on_error -- If True, the first exception raised by 
+                the operations is raised after all operations have run. If 
+                False, the exception is placed in the results at the 
+                position of the operation.
+
+            Return Type: List, the results of the operations in order.
+        '''
+        if self._con.pipeline is None:
+            raise CyberDBError('The pipeline has already been executed.')
+        requests = self._con.pipeline
+        self._con.pipeline = None
+        if not requests:
+            return []
+
+        self._con.settle(self._dp)
+        stream = Stream(self._con.s, self._dp)
+        client_obj = {
+            'route': '/batch',
+            'requests': requests
+        }
+        stream.write(client_obj)
+
+        server_obj = stream.read()
+
+        results = []
+        for r in server_obj['content']:
+            if r['code'] == 0:
+                results.append(r['Exception'])
+            else:
+                results.append(r.get('content'))
+
+        if raise_on_error:
+            for r in results:
+                if isinstance(r, Exception):
+                    raise r
+
+        return results
+
+    def reset(self):
+        '''
+            Discard the queued operations and close the pipeline.
+
+            Return Type: None
+        '''
+        self._con.pipeline = None
 
 
 class Proxy:
@@ -466,12 +1676,14 @@ class Proxy:
         perform remote operations on the server-side CyberDB database.
     '''
 
-    def __init__(self, con_pool: ConPool, dp: datas.DataParsing):
+    def __init__(self, con_pool: ConPool, dp: datas.DataParsing,
+                 cache: NearCache = None):
         self._con_pool = con_pool
         self._dp = dp
         # The connection used by the proxy, the first is the reader and the
         # second is the writer.
         self._con = Connection()
+        self._cache = cache
 
     def __enter__(self):
         self.connect()
@@ -491,6 +1703,11 @@ class Proxy:
         # If the proxy already has a connection, the connection will be
         # returned to the connection pool first.
         if self._con.s != None:
+            try:
+                self._con.settle(self._dp)
+            except DisconCyberDBError:
+                # The broken connection is discarded by the pool.
+                pass
             self._con_pool.put(self._con.s)
 
         s = self._con_pool.get()
@@ -508,9 +1725,24 @@ class Proxy:
             raise CyberDBError(
                 'The connection could not be closed, the proxy has not acquired a connection.')
 
+        self._con.settle(self._dp)
         self._con_pool.put(self._con.s)
         self._con.s = None
 
+    def pipeline(self) -> Pipeline:
+        '''
+            Open a pipeline on the connection of the Proxy. The operations 
+            of CyberDict and CyberList sub-objects are queued until 
+            Pipeline.execute is run, and are then sent to the server in one 
+            round trip.
+
+            Return Type: Pipeline
+        '''
+        if self._con.pipeline is not None:
+            raise CyberDBError('A pipeline is already open on this proxy.')
+
+        return Pipeline(self._con, self._dp)
+
     def create_cyberdict(self, table_name: str, content: dict = {}):
         '''
             Create a CyberDict table.
@@ -530,6 +1762,7 @@ class Proxy:
             raise WrongInputCyberDBError(
                 'The input database table type is not a Python dictionary.')
 
+        self._con.settle(self._dp)
         stream = Stream(self._con.s, self._dp)
         client_obj = {
             'route': '/create_cyberdict',
@@ -541,6 +1774,8 @@ class Proxy:
         server_obj = stream.read()
 
         if server_obj['code'] == 0:
+            if 'Exception' in server_obj:
+                raise server_obj['Exception']
             raise WrongTableNameCyberDBError(
                 'Duplicate table names already exist!')
 
@@ -558,6 +1793,7 @@ class Proxy:
         if type(table_name) != str:
             raise WrongInputCyberDBError('Please use str for the table name.')
 
+        self._con.settle(self._dp)
         stream = Stream(self._con.s, self._dp)
 
         client_obj = {
@@ -571,7 +1807,7 @@ class Proxy:
             raise WrongTableNameCyberDBError(
                 '{} table does not exist.'.format(table_name))
         else:
-            table = CyberDict(table_name, self._dp, self._con)
+            table = CyberDict(table_name, self._dp, self._con, self._cache)
             return table
 
     def create_cyberlist(self, table_name: str, content: list = []):
@@ -593,6 +1829,7 @@ class Proxy:
             raise WrongInputCyberDBError(
                 'The input database table type is not a Python dictionary.')
 
+        self._con.settle(self._dp)
         stream = Stream(self._con.s, self._dp)
         client_obj = {
             'route': '/create_cyberlist',
@@ -604,6 +1841,8 @@ class Proxy:
         server_obj = stream.read()
 
         if server_obj['code'] == 0:
+            if 'Exception' in server_obj:
+                raise server_obj['Exception']
             raise WrongTableNameCyberDBError(
                 'Duplicate table names already exist!')
 
@@ -621,6 +1860,7 @@ class Proxy:
         if type(table_name) != str:
             raise WrongInputCyberDBError('Please use str for the table name.')
 
+        self._con.settle(self._dp)
         stream = Stream(self._con.s, self._dp)
 
         client_obj = {
@@ -637,6 +1877,149 @@ class Proxy:
             table = CyberList(table_name, self._dp, self._con)
             return table
 
+    def create_cyberqueue(self, table_name: str, content: list = [],
+                          maxlen: int = None):
+        '''
+            Create a CyberQueue table.
+
+            Parameters:
+
+                table_name – table name.
+
+                content -- the initial values of the queue, from left to 
+                right, the default is an empty queue.
+
+                maxlen -- the maximum length of the queue, None is 
+                unbounded. When the queue is full, pushing a value to one 
+                end discards a value from the other end.
+
+            Return Type: None
+        '''
+        if type(table_name) != str:
+            raise WrongInputCyberDBError('Please use str for the table name.')
+        if type(content) != list:
+            raise WrongInputCyberDBError(
+                'The input database table type is not a Python list.')
+        if maxlen is not None and (type(maxlen) != int or maxlen < 0):
+            raise WrongInputCyberDBError(
+                'maxlen must be None or a non-negative integer.')
+
+        self._con.settle(self._dp)
+        stream = Stream(self._con.s, self._dp)
+        client_obj = {
+            'route': '/create_cyberqueue',
+            'table_name': table_name,
+            'content': content,
+            'maxlen': maxlen
+        }
+        stream.write(client_obj)
+
+        server_obj = stream.read()
+
+        if server_obj['code'] == 0:
+            if 'Exception' in server_obj:
+                raise server_obj['Exception']
+            raise WrongTableNameCyberDBError(
+                'Duplicate table names already exist!')
+
+    def get_cyberqueue(self, table_name: str) -> CyberQueue:
+        '''
+            Get the CyberQueue table.
+
+            Parameters:
+
+                table_name – table name.
+
+            Return Type: CyberQueue, which is a sub-object generated by 
+            Proxy, which controls the TCP connection.
+        '''
+        if type(table_name) != str:
+            raise WrongInputCyberDBError('Please use str for the table name.')
+
+        self._con.settle(self._dp)
+        stream = Stream(self._con.s, self._dp)
+
+        client_obj = {
+            'route': '/exam_cyberqueue',
+            'table_name': table_name
+        }
+        stream.write(client_obj)
+
+        server_obj = stream.read()
+        if server_obj['code'] == 0:
+            raise WrongTableNameCyberDBError(
+                '{} table does not exist.'.format(table_name))
+        else:
+            table = CyberQueue(table_name, self._dp, self._con)
+            return table
+
+    def create_cybersortedset(self, table_name: str, content: dict = {}):
+        '''
+            Create a CyberSortedSet table.
+
+            Parameters:
+
+                table_name – table name.
+
+                content -- the members and their scores, the default is 
+                an empty set.
+
+            Return Type: None
+        '''
+        if type(table_name) != str:
+            raise WrongInputCyberDBError('Please use str for the table name.')
+        if type(content) != dict:
+            raise WrongInputCyberDBError(
+                'The input database table type is not a Python dictionary.')
+
+        self._con.settle(self._dp)
+        stream = Stream(self._con.s, self._dp)
+        client_obj = {
+            'route': '/create_cybersortedset',
+            'table_name': table_name,
+            'content': content
+        }
+        stream.write(client_obj)
+
+        server_obj = stream.read()
+
+        if server_obj['code'] == 0:
+            if 'Exception' in server_obj:
+                raise server_obj['Exception']
+            raise WrongTableNameCyberDBError(
+                'Duplicate table names already exist!')
+
+    def get_cybersortedset(self, table_name: str) -> CyberSortedSet:
+        '''
+            Get the CyberSortedSet table.
+
+            Parameters:
+
+                table_name – table name.
+
+            Return Type: CyberSortedSet, which is a sub-object generated 
+            by Proxy, which controls the TCP connection.
+        '''
+        if type(table_name) != str:
+            raise WrongInputCyberDBError('Please use str for the table name.')
+
+        self._con.settle(self._dp)
+        stream = Stream(self._con.s, self._dp)
+
+        client_obj = {
+            'route': '/exam_cybersortedset',
+            'table_name': table_name
+        }
+        stream.write(client_obj)
+
+        server_obj = stream.read()
+        if server_obj['code'] == 0:
+            raise WrongTableNameCyberDBError(
+                '{} table does not exist.'.format(table_name))
+        else:
+            table = CyberSortedSet(table_name, self._dp, self._con)
+            return table
+
     def print_tables(self):
         '''
             Print all tables in the CyberDB database.
@@ -653,6 +2036,85 @@ class Proxy:
         for line in r:
             print('table name: {}  type name: {}'.format(line[0], line[1]))
 
+    def info(self) -> dict:
+        '''
+            Report the memory used by the tables and the state of the 
+            server.
+
+            Return Type: dict, with the keys:
+
+                time -- the Unix timestamp of the report, compare two 
+                reports to know how fast the tables grow.
+
+                tables -- the information of each table: type, loaded 
+                (False if it is still in the lazily loaded snapshot), 
+                entries, size (the estimated deep size in bytes, computed 
+                from a sample of the entries) and expires (the number of 
+                keys with a time to live).
+
+                used_memory -- the estimated size of the loaded tables in 
+                bytes, it is compared to maxmemory.
+
+                maxmemory -- the memory limit of the server, None if it is 
+                unlimited.
+
+                rss -- the resident set size of the server process in 
+                bytes, None if the operating system does not report it.
+
+                clients -- the number of connected clients.
+
+                blocked_clients -- the number of clients waiting in a 
+                blocking pop of a CyberQueue.
+
+                last_save -- the mode, time, duration and size of the last 
+                snapshot saved by save_db, None if there is none.
+
+                aof -- the name of the append-only file, None if it is 
+                not enabled.
+
+                tracking -- the number of clients with a near cache and 
+                of the keys tracked for them.
+
+                pubsub -- the number of subscribers, channels and 
+                patterns subscribed to, the messages published and 
+                delivered, and the subscribers disconnected because they 
+                did not read their messages.
+        '''
+        @network
+        def get_info(self):
+            return {
+                'route': '/info'
+            }
+
+        return get_info(self)
+
+    def publish(self, channel: str, message) -> int:
+        '''
+            Publish a message to a channel, it is pushed to the 
+            subscribers of the channel and of the patterns matching it. 
+            The message is not stored, it is lost if no one is 
+            subscribed.
+
+            Parameters:
+
+                channel -- the name of the channel.
+
+                message -- the message, any object the codec of the client 
+                can encode.
+
+            Return Type: int, the number of subscribers that received the 
+            message.
+        '''
+        @network
+        def publish(self):
+            return {
+                'route': '/publish',
+                'channel': channel,
+                'message': message
+            }
+
+        return publish(self)
+
     def delete_table(self, table_name: str):
         '''
             Drop the table_name table in the CyberDB database.
@@ -666,6 +2128,7 @@ class Proxy:
         if type(table_name) != str:
             raise WrongInputCyberDBError('Please use str for the table name.')
 
+        self._con.settle(self._dp)
         stream = Stream(self._con.s, self._dp)
 
         client_obj = {
@@ -679,6 +2142,8 @@ class Proxy:
             raise WrongTableNameCyberDBError(
                 '{} table does not exist.'.format(table_name))
 
+        if self._cache is not None:
+            self._cache.invalidate(table_name)
         client_obj = {
             'route': '/delete_table',
             'table_name': table_name
@@ -693,9 +2158,11 @@ class Client:
         is used to generate the Proxy object.
     '''
 
-    def __init__(self, con_pool: ConPool, dp: datas.DataParsing):
+    def __init__(self, con_pool: ConPool, dp: datas.DataParsing,
+                 cache: NearCache = None):
         self._con_pool = con_pool
         self._dp = dp
+        self._cache = cache
 
     def get_proxy(self) -> Proxy:
         '''
@@ -703,12 +2170,50 @@ class Client:
 
             Return Type: None
         '''
-        proxy = Proxy(self._con_pool, self._dp)
+        proxy = Proxy(self._con_pool, self._dp, self._cache)
         return proxy
 
+    def get_pool_stats(self) -> dict:
+        '''
+            Get the statistics of the connection pool: hits (connections 
+            reused), creations (connections opened), waits (times a 
+            Proxy waited for a free connection), checks (idle connections 
+            checked), discards (connections closed), size (open 
+            connections) and idle (connections in the pool).
+
+            Return Type: dict
+        '''
+        return self._con_pool.get_stats()
+
+    def get_cache_stats(self) -> dict:
+        '''
+            Get the statistics of the near cache: hits, misses, 
+            invalidations (keys or tables dropped), flushes (times the 
+            invalidation connection was lost), size (keys cached) and 
+            connected (whether the cache is in use).
+
+            Return Type: dict, None if the client has no near cache.
+        '''
+        if self._cache is None:
+            return None
+        return self._cache.get_stats()
+
+    def get_subscriber(self) -> 'Subscriber':
+        '''
+            Generate a Subscriber object, it receives the messages of the 
+            channels it subscribes to on a dedicated connection.
+
+            Return Type: Subscriber
+        '''
+        return Subscriber(self._con_pool._host, self._con_pool._port,
+                          self._dp)
+
 
 def connect(host: str = '127.0.0.1', port: int = 9980, password:
-            str = None, encrypt: bool = False, time_out: int = None) -> Client:
+            str = None, encrypt: bool = False, time_out: int = None,
+            min_con: int = 0, max_con: int = None, wait_timeout: float = None,
+            check_idle: int = 60, codec: str = 'pickle',
+            cache_size: int = 0) -> Client:
     '''
         Connect the client to the CyberDB server.
 
@@ -732,27 +2237,298 @@ def connect(host: str = '127.0.0.1', port: int = 9980, password:
             no timeout, and the connection pool will maintain the connection 
             until it expires, after which a new connection will be regenerated.
 
+            min_con -- the number of connections opened when connecting.
+
+            max_con -- the maximum number of connections of the connection 
+            pool, None is unlimited. When max_con connections are in use, 
+            Proxy.connect waits until one is returned.
+
+            wait_timeout -- the maximum time to wait for a connection in 
+            seconds, None waits forever.
+
+            check_idle -- connections idle for more than check_idle seconds 
+            are checked before use, None disables the check.
+
+            codec -- the serialization of the requests and responses, 
+            'pickle', 'marshal' or 'msgpack' (requires the msgpack package). 
+            marshal and msgpack are faster for plain types such as str, int 
+            and dict, and fall back to pickle for other objects.
+
+            cache_size -- the maximum number of keys of the near cache, 0 
+            disables it. With a near cache, the values of the keys of 
+            CyberDict tables read by table[key] and get are kept in the 
+            memory of the client until the server pushes that they 
+            changed, so repeated reads of unchanged keys need no round 
+            trip. Keys with a time to live are not cached. The client 
+            opens a dedicated connection to receive the invalidations.
+
         Return Type: Client
     '''
     if not password:
         raise WrongPasswordCyberDBError('The password cannot be empty.')
     if time_out and type(time_out) != int:
         raise CyberDBError('time_out must be an integer.')
+    if max_con is not None and max_con < max(min_con, 1):
+        raise CyberDBError('max_con must be at least 1 and min_con.')
 
     # Responsible for encrypting and decrypting objects.
     secret = Secret(key=password)
-    dp = datas.DataParsing(secret, encrypt=encrypt)
-    con_pool = ConPool(host, port, dp, time_out=time_out)
+    dp = datas.DataParsing(secret, encrypt=encrypt, codec=codec)
+    con_pool = ConPool(host, port, dp, time_out=time_out, min_con=min_con,
+                       max_con=max_con, wait_timeout=wait_timeout,
+                       check_idle=check_idle)
 
     # Synchronously test whether the connection is successful.
     s = con_pool.get()
-    confirm_the_connection(s, dp)
+    r = confirm_the_connection(s, dp)
+    if r['code'] == 0:
+        con_pool.discard(s)
+        raise r['Exception']
     con_pool.put(s)
+    con_pool.warm_up()
 
-    client = Client(con_pool, dp)
+    cache = None
+    if cache_size:
+        cache = NearCache(cache_size)
+        Invalidator(host, port, dp, cache).start()
+
+    client = Client(con_pool, dp, cache)
     return client
 
 
+class Invalidator(threading.Thread):
+    '''
+        Receive the invalidations pushed by the server to the near cache 
+        on a dedicated connection. The cache is flushed when the 
+        connection is lost, and it is opened again after RETRY seconds.
+    '''
+
+    def __init__(self, host: str, port: int, dp: datas.DataParsing,
+                 cache: NearCache):
+        super().__init__(daemon=True)
+        self._host = host
+        self._port = port
+        self._dp = dp
+        self._cache = cache
+
+    def run(self):
+        while True:
+            s = None
+            try:
+                s = socket.create_connection((self._host, self._port))
+                set_nodelay(s)
+                handshake(s, self._dp)
+                stream = Stream(s, self._dp)
+                stream.write({
+                    'route': '/tracking'
+                })
+                while True:
+                    server_obj = stream.read()
+                    if 'invalidate' in server_obj:
+                        self._cache.invalidate(server_obj['invalidate'],
+                                               server_obj['keys'])
+                    elif server_obj['code'] == 1:
+                        self._cache.connect(server_obj['content'])
+                    else:
+                        raise server_obj['Exception']
+            except Exception:
+                pass
+            finally:
+                self._cache.disconnect()
+                if s is not None:
+                    s.close()
+            time.sleep(RETRY)
+
+
+class Subscriber:
+    '''
+        Receive the messages published to channels. The Subscriber opens 
+        its own connection on the first subscription, and the messages 
+        are pushed by the server on it. The server disconnects a 
+        subscriber which does not read its messages fast enough, then 
+        get_message raises DisconCyberDBError.
+
+        This object is not thread safe.
+    '''
+
+    def __init__(self, host: str, port: int, dp: datas.DataParsing):
+        self._host = host
+        self._port = port
+        self._dp = dp
+        self._s = None
+        # Messages received while waiting for the response of a request.
+        self._messages = deque()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __iter__(self):
+        return self.listen()
+
+    def subscribe(self, *channels) -> int:
+        '''
+            Subscribe to the channels.
+
+            Return Type: int, the number of channels and patterns 
+            subscribed to.
+        '''
+        return self._request('/subscribe', list(channels))
+
+    def psubscribe(self, *patterns) -> int:
+        '''
+            Subscribe to the channels matching the glob-style patterns, 
+            such as 'news.*'.
+
+            Return Type: int, the number of channels and patterns 
+            subscribed to.
+        '''
+        return self._request('/psubscribe', list(patterns))
+
+    def unsubscribe(self, *channels) -> int:
+        '''
+            Unsubscribe from the channels, from all channels if none is 
+            given.
+
+            Return Type: int, the number of channels and patterns still 
+            subscribed to.
+        '''
+        return self._request('/unsubscribe', list(channels) or None)
+
+    def punsubscribe(self, *patterns) -> int:
+        '''
+            Unsubscribe from the patterns, from all patterns if none is 
+            given.
+
+            Return Type: int, the number of channels and patterns still 
+            subscribed to.
+        '''
+        return self._request('/punsubscribe', list(patterns) or None)
+
+    def get_message(self, timeout: float = None) -> dict:
+        '''
+            Wait for the next message.
+
+            Parameters:
+
+                timeout -- the maximum time to wait in seconds, None waits 
+                forever and 0 does not wait.
+
+            Return Type: dict, the channel, the pattern matched (None for 
+            a channel subscription) and the data of the message. None if 
+            no message arrived within timeout.
+        '''
+        if self._messages:
+            return self._messages.popleft()
+        if self._s is None:
+            raise DisconCyberDBError('The subscriber has no connection.')
+
+        readable, _, _ = select.select([self._s], [], [], timeout)
+        if not readable:
+            return None
+        server_obj = self._read()
+        if 'message' not in server_obj:
+            raise CyberDBError('Unexpected response on the subscriber connection.')
+        return self._to_message(server_obj)
+
+    def listen(self):
+        '''
+            Iterate over the messages as they arrive.
+        '''
+        while True:
+            yield self.get_message()
+
+    def close(self):
+        '''
+            Close the connection, the subscriptions end with it.
+
+            Return Type: None
+        '''
+        if self._s is not None:
+            self._s.close()
+            self._s = None
+        self._messages.clear()
+
+    def _connect(self):
+        s = socket.create_connection((self._host, self._port))
+        try:
+            set_nodelay(s)
+            handshake(s, self._dp)
+        except BaseException:
+            s.close()
+            raise
+        self._s = s
+
+    def _read(self) -> dict:
+        try:
+            return Stream(self._s, self._dp).read()
+        except CyberDBError:
+            self.close()
+            raise
+
+    def _request(self, route: str, channels: list) -> int:
+        if self._s is None:
+            self._connect()
+        Stream(self._s, self._dp).write({
+            'route': route,
+            'channels': channels
+        })
+        # The messages pushed before the response are kept in order.
+        while True:
+            server_obj = self._read()
+            if 'message' not in server_obj:
+                break
+            self._messages.append(self._to_message(server_obj))
+        if server_obj['code'] == 0:
+            raise server_obj['Exception']
+        return server_obj['content']
+
+    @staticmethod
+    def _to_message(server_obj: dict) -> dict:
+        return {
+            'channel': server_obj['message'],
+            'pattern': server_obj['pattern'],
+            'data': server_obj['data']
+        }
+
+
+def handshake(s: socket.socket, dp: datas.DataParsing):
+    '''
+        Open a new connection with the server: answer the challenge of the 
+        server, check its proof and select the codec of the connection. 
+        The handshake is encoded with marshal. With encryption, the 
+        following frames are encrypted with the session key of the 
+        connection.
+    '''
+    password = dp._secret.key
+    stream = Stream(s, dp.for_handshake())
+    challenge = stream.read()['challenge']
+    nonce = auth.new_nonce()
+    stream.write({
+        'route': '/hello',
+        'codec': dp.codec.name,
+        'encrypt': dp._encrypt,
+        'nonce': nonce,
+        'proof': auth.sign(password, b'client', challenge, nonce)
+    })
+    server_obj = stream.read()
+    if server_obj['code'] == 2:
+        raise WrongPasswordCyberDBError(server_obj['message'])
+    if server_obj['code'] == 0:
+        raise CyberDBError(server_obj['message'])
+    if not auth.verify(server_obj.get('proof'),
+                       auth.sign(password, b'server', nonce, challenge)):
+        raise WrongPasswordCyberDBError(
+            'The server failed to prove that it has the password.')
+
+    if dp._encrypt:
+        session = auth.Session(
+            auth.derive_key(password, challenge, nonce), client=True)
+        connections[s] = dp.with_codec(dp.codec.name, session)
+
+
 def confirm_the_connection(s: socket.socket, dp: datas.DataParsing) -> dict:
     '''
         The connection is detected when the database connects for the first 
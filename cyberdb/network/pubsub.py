@@ -0,0 +1,180 @@
+'''
+    Publish/subscribe channels of the server.
+'''
+
+
+import re
+import fnmatch
+
+
+# A subscriber with more than MAX_SUBSCRIBER_BUFFER bytes of messages
+# waiting to be sent is disconnected, so a slow subscriber does not make
+# the server buffer the messages without limit.
+MAX_SUBSCRIBER_BUFFER = 8 * 1024 * 1024
+
+
+class Subscriber:
+    '''
+        A subscriber connection and the channels and patterns it
+        subscribed to.
+    '''
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.channels = set()
+        self.patterns = set()
+
+    def count(self) -> int:
+        return len(self.channels) + len(self.patterns)
+
+
+class PubSub:
+    '''
+        The subscribers of the channels, like the publish/subscribe of
+        Redis. A message published to a channel is pushed to the
+        connections subscribed to the channel, and to those subscribed to
+        a glob-style pattern matching it. The messages are not stored, a
+        message published while no one is subscribed is lost.
+
+        Publishing never waits for the subscribers: the messages are
+        written to the buffer of each connection, and a connection whose
+        buffer exceeds max_buffer bytes is closed.
+    '''
+
+    def __init__(self, max_buffer: int = MAX_SUBSCRIBER_BUFFER):
+        self.max_buffer = max_buffer
+        # The subscribers of each channel.
+        self._channels = {}
+        # The match function and the subscribers of each pattern.
+        self._patterns = {}
+        self._subscribers = set()
+        self.stats = {
+            'published': 0,
+            'delivered': 0,
+            'disconnected': 0
+        }
+
+    def subscribe(self, subscriber: Subscriber, channels: list) -> int:
+        '''
+            Return Type: int, the number of subscriptions of the
+            subscriber.
+        '''
+        for channel in channels:
+            self._channels.setdefault(channel, set()).add(subscriber)
+            subscriber.channels.add(channel)
+        self._subscribers.add(subscriber)
+        return subscriber.count()
+
+    def psubscribe(self, subscriber: Subscriber, patterns: list) -> int:
+        '''
+            Return Type: int, the number of subscriptions of the
+            subscriber.
+        '''
+        for pattern in patterns:
+            if pattern not in self._patterns:
+                self._patterns[pattern] = (
+                    re.compile(fnmatch.translate(pattern)).match, set())
+            self._patterns[pattern][1].add(subscriber)
+            subscriber.patterns.add(pattern)
+        self._subscribers.add(subscriber)
+        return subscriber.count()
+
+    def unsubscribe(self, subscriber: Subscriber, channels: list = None) -> int:
+        '''
+            Unsubscribe from the channels, None unsubscribes from all the
+            channels.
+
+            Return Type: int, the number of subscriptions left.
+        '''
+        if channels is None:
+            channels = list(subscriber.channels)
+        for channel in channels:
+            subscribers = self._channels.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._channels[channel]
+            subscriber.channels.discard(channel)
+        return subscriber.count()
+
+    def punsubscribe(self, subscriber: Subscriber, patterns: list = None) -> int:
+        '''
+            Unsubscribe from the patterns, None unsubscribes from all the
+            patterns.
+
+            Return Type: int, the number of subscriptions left.
+        '''
+        if patterns is None:
+            patterns = list(subscriber.patterns)
+        for pattern in patterns:
+            entry = self._patterns.get(pattern)
+            if entry is not None:
+                entry[1].discard(subscriber)
+                if not entry[1]:
+                    del self._patterns[pattern]
+            subscriber.patterns.discard(pattern)
+        return subscriber.count()
+
+    def remove(self, subscriber: Subscriber):
+        '''
+            Forget a closed subscriber connection.
+        '''
+        self.unsubscribe(subscriber)
+        self.punsubscribe(subscriber)
+        self._subscribers.discard(subscriber)
+
+    def publish(self, channel: str, message) -> int:
+        '''
+            Push the message to the subscribers of the channel.
+
+            Return Type: int, the number of subscribers the message was
+            pushed to.
+        '''
+        self.stats['published'] += 1
+        receivers = [(subscriber, None)
+                     for subscriber in self._channels.get(channel, ())]
+        if type(channel) == str:
+            for pattern, (match, subscribers) in self._patterns.items():
+                if match(channel):
+                    receivers.extend(
+                        (subscriber, pattern) for subscriber in subscribers)
+
+        # The frames of the connections without encryption only depend on
+        # the codec and the pattern, they are encoded once.
+        frames = {}
+        delivered = 0
+        for subscriber, pattern in receivers:
+            stream = subscriber.stream
+            if stream._writer.is_closing():
+                self.remove(subscriber)
+                continue
+            obj = {
+                'code': 1,
+                'message': channel,
+                'pattern': pattern,
+                'data': message
+            }
+            dp = stream._dp
+            if dp.session is None:
+                frame = (dp.codec.name, pattern)
+                if frame not in frames:
+                    frames[frame] = dp.obj_to_data(obj)
+                size = stream.push_data(frames[frame])
+            else:
+                size = stream.push(obj)
+            delivered += 1
+            # The subscriber does not read its messages.
+            if size > self.max_buffer:
+                stream._writer.close()
+                self.remove(subscriber)
+                self.stats['disconnected'] += 1
+
+        self.stats['delivered'] += delivered
+        return delivered
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        stats['subscribers'] = len(self._subscribers)
+        stats['channels'] = len(self._channels)
+        stats['patterns'] = len(self._patterns)
+        return stats
@@ -1,24 +1,68 @@
+import time
+import asyncio
 import inspect
 import datetime
+from collections import OrderedDict, deque
 
 from . import AioStream
+from .tracking import Tracking
+from .pubsub import PubSub, Subscriber
+from .waiters import Waiters
 from ..data import datas
-from ..extensions import nonce, WrongPasswordCyberDBError
+from ..data.cursor import Cursor
+from ..data.aof import AppendOnlyFile
+from ..data.snapshot import ColdTable, table_type
+from ..data.expiry import Expires
+from ..data.eviction import Eviction
+from ..data.sortedset import SortedSet
+from ..data.indexes import Indexes, MISSING
+from ..data.query import compile_where, compile_fields, plan
+from ..data.aggregate import Aggregation
+from ..data.sorting import SortKeys, SortOrders, position
+from ..extensions import auth, nonce, CyberDBError, DisconCyberDBError, \
+    WrongPasswordCyberDBError, OutOfMemoryCyberDBError, TypeCyberDBError
 
 
 MAP = {}
-
-
-def bind(path):
+# Paths of the routes that modify the database, they are logged to the 
+# append-only file.
+WRITES = set()
+# Paths of the routes that may use more memory, they are rejected when the 
+# database is over maxmemory and no key can be evicted.
+GROWS = set()
+# The maximum number of open scan cursors per connection, the oldest 
+# cursor is discarded when it is exceeded.
+MAX_CURSORS = 16
+# The queries scan the tables in chunks of SCAN_CHUNK entries, the other 
+# requests are served between the chunks.
+SCAN_CHUNK = 10000
+# The routes allowed on a connection subscribed to channels. Messages are 
+# pushed on it at any time, so it only gets small responses.
+SUBSCRIBER_ROUTES = {'/connect', '/publish', '/subscribe', '/psubscribe', 
+                     '/unsubscribe', '/punsubscribe'}
+# The names of the table types.
+TYPE_NAMES = {
+    dict: 'CyberDict',
+    list: 'CyberList',
+    deque: 'CyberQueue',
+    SortedSet: 'CyberSortedSet'
+}
+
+
+def bind(path, write: bool = False, grows: bool = False):
+    '''
+        Register the routing function to the path. The routing function 
+        returns the server object, which is written back by Route.find. 
+        write marks routes that modify the database, grows marks the 
+        writes that may use more memory.
+    '''
     def decorator(func):
-        async def wrapper(self, *args, **kw):
-            server_obj = await func(self, *args, **kw)
-            server_obj['password'] = self._dp._secret.key
-            
-            await self._stream.write(server_obj)
-
-        MAP[path] = wrapper
-        return wrapper
+        MAP[path] = func
+        if write:
+            WRITES.add(path)
+        if grows:
+            GROWS.add(path)
+        return func
     return decorator
 
 
@@ -28,11 +72,42 @@ class Route:
     '''
 
     def __init__(self, db: dict, dp: datas.DataParsing, stream: AioStream,
-                 print_log: bool = False):
+                 print_log: bool = False, aof: AppendOnlyFile = None,
+                 expires: Expires = None, eviction: Eviction = None,
+                 info=None, tracking: Tracking = None,
+                 pubsub: PubSub = None, waiters: Waiters = None,
+                 indexes: Indexes = None, sort_keys: SortKeys = None,
+                 sort_orders: SortOrders = None):
         self._db = db
+        # The deadlines of the keys with a time to live.
+        self._expires = Expires() if expires is None else expires
+        # The memory limit and the access metadata of the keys.
+        self._eviction = Eviction() if eviction is None else eviction
+        # Return the state of the server reported by /info.
+        self._info = info
+        # The keys cached by the clients with a near cache.
+        self._tracking = Tracking() if tracking is None else tracking
+        # The client id if this is an invalidation connection.
+        self._tracking_id = None
+        # The subscribers of the channels.
+        self._pubsub = PubSub() if pubsub is None else pubsub
+        # The subscriptions if this is a subscriber connection.
+        self._subscriber = None
+        # The blocking pops waiting on the CyberQueue tables.
+        self._waiters = Waiters() if waiters is None else waiters
+        # The secondary indexes of the CyberDict tables.
+        self._indexes = Indexes() if indexes is None else indexes
+        # The key functions registered for the sorts of the CyberList 
+        # tables, and the orders the tables are kept sorted in.
+        self._sort_keys = SortKeys() if sort_keys is None else sort_keys
+        self._sort_orders = SortOrders() if sort_orders is None else sort_orders
         self._dp = dp
         self._stream = stream
         self._print_log = print_log
+        self._aof = aof
+        # Open scan cursors of this connection.
+        self._cursors = OrderedDict()
+        self._cursor_id = 0
 
     async def find(self):
         '''
@@ -41,25 +116,233 @@ class Route:
         addr = self._stream.get_addr()
         addr = '{}:{}'.format(addr[0], addr[1])
 
-        while True:
-            client_obj = await self._stream.read()
-            self._client_obj = client_obj
+        await self.handshake()
+
+        try:
+            while True:
+                client_obj = await self._stream.read()
+                self._client_obj = client_obj
+
+                if self._print_log:
+                    print('{}  {}  {}'.format(
+                        datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                        addr, client_obj['route']))
+
+                server_obj = await self.dispatch(client_obj)
+                # Wait for the mutations to be durable before responding.
+                if self._aof:
+                    await self._aof.wait()
+
+                await self._stream.write(server_obj)
+        finally:
+            if self._tracking_id is not None:
+                self._tracking.unregister(self._tracking_id)
+            if self._subscriber is not None:
+                self._pubsub.remove(self._subscriber)
+
+    async def handshake(self):
+        '''
+            Authenticate the connection by challenge-response, the client 
+            also selects the codec of the following requests. The handshake 
+            is encoded with marshal, so nothing the client sends is 
+            unpickled before its proof is verified. The connection switches 
+            to the selected codec after the proof, and with encryption the 
+            following frames are encrypted with the session key of the 
+            connection.
+        '''
+        password = self._dp._secret.key
+        self._stream._dp = self._dp.for_handshake()
+        challenge = auth.new_nonce()
+        await self._stream.write({
+            'challenge': challenge
+        })
+        client_obj = await self._stream.read()
+
+        if type(client_obj) != dict or client_obj.get('route') != '/hello':
+            self._stream._writer.close()
+            raise DisconCyberDBError('The client did not send the handshake.')
+
+        client_nonce = client_obj.get('nonce')
+        if type(client_nonce) != bytes or not auth.verify(
+                client_obj.get('proof'),
+                auth.sign(password, b'client', challenge, client_nonce)):
+            await self._stream.write({
+                'code': 2,
+                'message': 'The password entered by the client is incorrect.'
+            })
+            self._stream._writer.close()
+            raise WrongPasswordCyberDBError(
+                'The password entered by the client is incorrect.')
+
+        try:
+            if client_obj.get('encrypt') != self._dp._encrypt:
+                raise CyberDBError(
+                    'The encrypt setting of the client does not match the server.')
+            codec = client_obj.get('codec')
+            if type(codec) != str:
+                raise CyberDBError('The codec must be a str.')
+            session = None
+            if self._dp._encrypt:
+                session = auth.Session(
+                    auth.derive_key(password, challenge, client_nonce),
+                    client=False)
+            dp = self._dp.with_codec(codec, session)
+        except CyberDBError as e:
+            await self._stream.write({
+                'code': 0,
+                'message': str(e)
+            })
+            self._stream._writer.close()
+            raise DisconCyberDBError(str(e))
+
+        await self._stream.write({
+            'code': 1,
+            'proof': auth.sign(password, b'server', client_nonce, challenge)
+        })
+        self._dp = self._stream._dp = dp
+
+    async def dispatch(self, client_obj: dict) -> dict:
+        '''
+            Run the routing function of the request and log it to the 
+            append-only file if it modified the database.
+        '''
+        self._client_obj = client_obj
+        # Load the table of the request if it is still in the snapshot.
+        table = self._cold_table(client_obj)
+        if table:
+            loaded = await table.aload()
+            if self._db.get(table.table_name) is table:
+                self._db[table.table_name] = loaded
+
+        if self._subscriber is not None and \
+                client_obj['route'] not in SUBSCRIBER_ROUTES:
+            return {
+                'code': 0,
+                'Exception': CyberDBError(
+                    'Only publish and subscriptions are allowed on a subscriber connection.')
+            }
+
+        # Make room before a request which may use more memory.
+        if client_obj['route'] in GROWS and not self._eviction.free(
+                self._db, self._expires, self._aof, self._evicted):
+            return {
+                'code': 0,
+                'Exception': OutOfMemoryCyberDBError(
+                    'The database is over maxmemory and no key can be evicted.')
+            }
+
+        # Jump to the specified function by routing.
+        func = MAP[client_obj['route']]
+        # Go to the corresponding routing function.
+        server_obj = await func(self)
+
+        if self._aof and server_obj['code'] == 1 and \
+                client_obj['route'] in WRITES:
+            self._aof.append(client_obj)
+
+        return server_obj
+
+    def apply(self, client_obj: dict) -> dict:
+        '''
+            Run a request without an event loop, this is used to replay the 
+            append-only file. The routing functions that modify the database 
+            never suspend, so the coroutine finishes on its first step.
+        '''
+        table = self._cold_table(client_obj)
+        if table:
+            self._db[table.table_name] = table.load()
+
+        coroutine = self.dispatch(client_obj)
+        try:
+            coroutine.send(None)
+        except StopIteration as e:
+            return e.value
+        coroutine.close()
+        raise CyberDBError('The route {} cannot be replayed.'.format(
+            client_obj['route']))
+
+    def _cold_table(self, client_obj: dict) -> ColdTable:
+        '''
+            Return Type: ColdTable, the table of the request if it is not 
+            loaded yet, otherwise None.
+        '''
+        table_name = client_obj.get('table_name')
+        if table_name is None:
+            return None
+        table = self._db.get(table_name)
+        if isinstance(table, ColdTable):
+            return table
+        return None
+
+    def _set_deadline(self, table_name: str, key):
+        '''
+            Set the deadline of the key from the ttl of the request. The 
+            deadline is stored in the request, so that replaying it from the 
+            append-only file gives the same deadline.
+        '''
+        deadline = self._client_obj.get('deadline')
+        if deadline is None:
+            deadline = time.time() + self._client_obj['ttl']
+            self._client_obj['deadline'] = deadline
+        self._expires.set(table_name, key, deadline)
+        # A key with a ttl of 0 or less expires at once.
+        self._expires.check(self._db, table_name, key)
+
+    def _evicted(self, table_name: str, keys):
+        '''
+            Forget the keys evicted from the table in the near caches of 
+            the clients and in the indexes.
+        '''
+        self._tracking.invalidate(table_name, keys)
+        self._indexes.discard_many(table_name, keys)
 
-            # Check if the password is correct.
-            if self._stream._dp._secret.key != client_obj['password']:
-                self._stream._writer.close()
-                raise WrongPasswordCyberDBError(
-                    'The password entered by the client is incorrect.')
+    async def _chunks(self, entries: list):
+        '''
+            Iterate over the slices of SCAN_CHUNK entries, yielding to the 
+            event loop between the slices.
+        '''
+        for start in range(0, len(entries), SCAN_CHUNK):
+            if start:
+                await asyncio.sleep(0)
+            yield entries[start:start + SCAN_CHUNK]
 
-            if self._print_log:
-                print('{}  {}  {}'.format(
-                    datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                    addr, client_obj['route']))
+    def _track(self, server_obj: dict, table_name: str, key):
+        '''
+            Track the key read if the client caches it. Keys with a time 
+            to live are not cached.
+        '''
+        client_id = self._client_obj.get('track')
+        if client_id is not None and \
+                self._expires.get(table_name, key) is None:
+            self._tracking.track(client_id, table_name, key)
+            server_obj['tracked'] = True
+
+    @bind('/batch')
+    async def batch(self):
+        '''
+            Run the requests queued by a client pipeline in order and 
+            return the server object of each request. An exception in one 
+            request does not stop the following ones.
+        '''
+        requests = self._client_obj['requests']
+        results = []
+        for client_obj in requests:
+            try:
+                if client_obj['route'] == '/batch':
+                    raise CyberDBError('Pipelines cannot be nested.')
+                server_obj = await self.dispatch(client_obj)
+            except Exception as e:
+                server_obj = {
+                    'code': 0,
+                    'Exception': e
+                }
+            results.append(server_obj)
 
-            # Jump to the specified function by routing.
-            func = MAP[client_obj['route']]
-            # Go to the corresponding routing function.
-            await func(self)
+        server_obj = {
+            'code': 1,
+            'content': results
+        }
+        return server_obj
 
     @bind('/connect')
     async def connect(self):
@@ -69,7 +352,7 @@ class Route:
         }
         return server_obj
 
-    @bind('/create_cyberdict')
+    @bind('/create_cyberdict', write=True, grows=True)
     async def create_cyberdict(self):
         table_name = self._client_obj['table_name']
         content = self._client_obj['content']
@@ -86,7 +369,7 @@ class Route:
 
         return server_obj
 
-    @bind('/create_cyberlist')
+    @bind('/create_cyberlist', write=True, grows=True)
     async def create_cyberlist(self):
         table_name = self._client_obj['table_name']
         content = self._client_obj['content']
@@ -103,6 +386,46 @@ class Route:
 
         return server_obj
 
+    @bind('/create_cyberqueue', write=True, grows=True)
+    async def create_cyberqueue(self):
+        table_name = self._client_obj['table_name']
+        content = self._client_obj['content']
+        if self._db.get(table_name) == None:
+            # New CyberQueue
+            self._db[table_name] = deque(content, self._client_obj['maxlen'])
+            server_obj = {
+                'code': 1
+            }
+        else:
+            server_obj = {
+                'code': 0
+            }
+
+        return server_obj
+
+    @bind('/create_cybersortedset', write=True, grows=True)
+    async def create_cybersortedset(self):
+        table_name = self._client_obj['table_name']
+        content = self._client_obj['content']
+        if self._db.get(table_name) == None:
+            try:
+                # New CyberSortedSet
+                self._db[table_name] = SortedSet(content)
+                server_obj = {
+                    'code': 1
+                }
+            except Exception as e:
+                server_obj = {
+                    'code': 0,
+                    'Exception': e
+                }
+        else:
+            server_obj = {
+                'code': 0
+            }
+
+        return server_obj
+
     @bind('/exam_cyberdict')
     async def exam_cyberdict(self):
         '''
@@ -139,14 +462,47 @@ class Route:
 
         return server_obj
 
+    @bind('/exam_cyberqueue')
+    async def exam_cyberqueue(self):
+        '''
+            Check if the CyberQueue table exists.
+        '''
+
+        table_name = self._client_obj['table_name']
+        if table_type(self._db.get(table_name)) == deque:
+            server_obj = {
+                'code': 1
+            }
+        else:
+            server_obj = {
+                'code': 0
+            }
+
+        return server_obj
+
+    @bind('/exam_cybersortedset')
+    async def exam_cybersortedset(self):
+        '''
+            Check if the CyberSortedSet table exists.
+        '''
+
+        table_name = self._client_obj['table_name']
+        if table_type(self._db.get(table_name)) == SortedSet:
+            server_obj = {
+                'code': 1
+            }
+        else:
+            server_obj = {
+                'code': 0
+            }
+
+        return server_obj
+
     @bind('/print_tables')
     async def print_tables(self):
         inform = []
         for table_name in self._db:
-            if type(self._db[table_name]) == dict:
-                type_name = 'CyberDict'
-            elif type(self._db[table_name]) == list:
-                type_name = 'CyberList'
+            type_name = TYPE_NAMES[table_type(self._db[table_name])]
             inform.append((table_name, type_name))
             
         server_obj = {
@@ -156,11 +512,128 @@ class Route:
         
         return server_obj
 
-    @bind('/delete_table')
+    @bind('/tracking')
+    async def tracking(self):
+        '''
+            Make this connection the invalidation connection of a client 
+            with a near cache. The client sends the id in the response 
+            with the reads to cache, and the invalidations of their keys 
+            are pushed on this connection.
+        '''
+        if self._tracking_id is None:
+            self._tracking_id = self._tracking.register(self._stream)
+        server_obj = {
+            'code': 1,
+            'content': self._tracking_id
+        }
+        return server_obj
+
+    @bind('/publish')
+    async def publish(self):
+        '''
+            Push a message to the subscribers of a channel, the number of 
+            subscribers it was pushed to is returned.
+        '''
+        server_obj = {
+            'code': 1,
+            'content': self._pubsub.publish(self._client_obj['channel'],
+                                            self._client_obj['message'])
+        }
+        return server_obj
+
+    def _subscription(self, method) -> dict:
+        '''
+            Change the subscriptions of this connection, the number of 
+            subscriptions left is returned.
+        '''
+        if self._subscriber is None:
+            self._subscriber = Subscriber(self._stream)
+        count = method(self._subscriber, self._client_obj['channels'])
+        # Without subscriptions, the connection accepts any request again.
+        if count == 0:
+            self._pubsub.remove(self._subscriber)
+            self._subscriber = None
+        server_obj = {
+            'code': 1,
+            'content': count
+        }
+        return server_obj
+
+    @bind('/subscribe')
+    async def subscribe(self):
+        return self._subscription(self._pubsub.subscribe)
+
+    @bind('/psubscribe')
+    async def psubscribe(self):
+        return self._subscription(self._pubsub.psubscribe)
+
+    @bind('/unsubscribe')
+    async def unsubscribe(self):
+        return self._subscription(self._pubsub.unsubscribe)
+
+    @bind('/punsubscribe')
+    async def punsubscribe(self):
+        return self._subscription(self._pubsub.punsubscribe)
+
+    @bind('/info')
+    async def info(self):
+        '''
+            Report the number of entries and the estimated size of each 
+            table, and the state of the server. The tables which are not 
+            loaded from the snapshot yet have no entries and size. The 
+            indexes of each table are reported apart from its size.
+        '''
+        tables = {}
+        for table_name, table in self._db.items():
+            type_name = TYPE_NAMES[table_type(table)]
+            if isinstance(table, ColdTable):
+                tables[table_name] = {
+                    'type': type_name,
+                    'loaded': False,
+                    'entries': None,
+                    'size': None,
+                    'expires': 0,
+                    'indexes': self._indexes.stats(table_name)
+                }
+            else:
+                tables[table_name] = {
+                    'type': type_name,
+                    'loaded': True,
+                    'entries': len(table),
+                    'size': self._eviction.table_size(table_name, table),
+                    'expires': len(self._expires.deadlines.get(table_name, ())),
+                    'indexes': self._indexes.stats(table_name)
+                }
+
+        r = {
+            'time': time.time(),
+            'tables': tables,
+            'used_memory': sum(
+                table['size'] for table in tables.values() if table['loaded']),
+            # The indexes are not counted in used_memory and maxmemory.
+            'index_memory': sum(
+                index['size'] or 0 for table in tables.values()
+                for index in table['indexes'].values()),
+            'maxmemory': self._eviction.maxmemory
+        }
+        if self._info:
+            r.update(self._info())
+        server_obj = {
+            'code': 1,
+            'content': r
+        }
+        return server_obj
+
+    @bind('/delete_table', write=True)
     async def delete_table(self):
         table_name = self._client_obj['table_name']
         try:
             del self._db[table_name]
+            self._expires.drop(table_name)
+            self._indexes.drop(table_name)
+            self._sort_orders.remove(table_name)
+            self._tracking.invalidate_table(table_name)
+            self._waiters.notify_all(table_name)
             server_obj = {
                 'code': 1
             }
@@ -176,6 +649,7 @@ class Route:
     async def dict_repr(self):
         table_name = self._client_obj['table_name']
         try:
+            self._expires.collect(self._db, table_name)
             r = repr(self._db[table_name])
             server_obj = {
                 'code': 1,
@@ -193,6 +667,7 @@ class Route:
     async def dict_str(self):
         table_name = self._client_obj['table_name']
         try:
+            self._expires.collect(self._db, table_name)
             r = str(self._db[table_name])
             server_obj = {
                 'code': 1,
@@ -210,6 +685,7 @@ class Route:
     async def dict_len(self):
         table_name = self._client_obj['table_name']
         try:
+            self._expires.collect(self._db, table_name)
             r = len(self._db[table_name])
             server_obj = {
                 'code': 1,
@@ -228,11 +704,14 @@ class Route:
         table_name = self._client_obj['table_name']
         key = self._client_obj['key']
         try:
+            self._expires.check(self._db, table_name, key)
             r = self._db[table_name][key]
+            self._eviction.touch(table_name, key)
             server_obj = {
                 'code': 1,
                 'content': r
             }
+            self._track(server_obj, table_name, key)
         except Exception as e:
             server_obj = {
                 'code': 0,
@@ -241,13 +720,20 @@ class Route:
 
         return server_obj
 
-    @bind('/cyberdict/setitem')
+    @bind('/cyberdict/setitem', write=True, grows=True)
     async def dict_setitem(self):
         table_name = self._client_obj['table_name']
         key = self._client_obj['key']
         value = self._client_obj['value']
         try:
             self._db[table_name][key] = value
+            self._indexes.set(table_name, key, value)
+            self._eviction.touch(table_name, key)
+            self._tracking.invalidate(table_name, (key,))
+            if self._client_obj.get('ttl') is None:
+                self._expires.persist(table_name, key)
+            else:
+                self._set_deadline(table_name, key)
             server_obj = {
                 'code': 1,
             }
@@ -259,14 +745,27 @@ class Route:
 
         return server_obj
 
-    @bind('/cyberdict/delitem')
-    async def dict_delitem(self):
+    @bind('/cyberdict/expire', write=True)
+    async def dict_expire(self):
+        '''
+            Set the time to live of a key, None removes it.
+
+            Return Type: bool, whether the key exists.
+        '''
         table_name = self._client_obj['table_name']
         key = self._client_obj['key']
         try:
-            del self._db[table_name][key]
+            self._expires.check(self._db, table_name, key)
+            r = key in self._db[table_name]
+            if r:
+                if self._client_obj.get('ttl') is None:
+                    self._expires.persist(table_name, key)
+                else:
+                    self._set_deadline(table_name, key)
+                self._tracking.invalidate(table_name, (key,))
             server_obj = {
                 'code': 1,
+                'content': r
             }
         except Exception as e:
             server_obj = {
@@ -276,11 +775,20 @@ class Route:
 
         return server_obj
 
-    @bind('/cyberdict/todict')
-    async def todict(self):
+    @bind('/cyberdict/ttl')
+    async def dict_ttl(self):
+        '''
+            Return Type: float, the seconds the key has to live, None if it 
+            has no time to live.
+        '''
         table_name = self._client_obj['table_name']
+        key = self._client_obj['key']
         try:
-            r = self._db[table_name]
+            self._expires.check(self._db, table_name, key)
+            if key not in self._db[table_name]:
+                raise KeyError(key)
+            deadline = self._expires.get(table_name, key)
+            r = None if deadline is None else max(deadline - time.time(), 0)
             server_obj = {
                 'code': 1,
                 'content': r
@@ -293,16 +801,18 @@ class Route:
 
         return server_obj
 
-    @bind('/cyberdict/get')
-    async def dict_get(self):
+    @bind('/cyberdict/delitem', write=True)
+    async def dict_delitem(self):
         table_name = self._client_obj['table_name']
         key = self._client_obj['key']
-        default = self._client_obj['default']
         try:
-            r = self._db[table_name].get(key, default)
+            self._expires.check(self._db, table_name, key)
+            del self._db[table_name][key]
+            self._indexes.discard(table_name, key)
+            self._expires.persist(table_name, key)
+            self._tracking.invalidate(table_name, (key,))
             server_obj = {
                 'code': 1,
-                'content': r
             }
         except Exception as e:
             server_obj = {
@@ -312,13 +822,19 @@ class Route:
 
         return server_obj
 
-    @bind('/cyberdict/setdefault')
-    async def dict_setdefault(self):
+    @bind('/cyberdict/mget')
+    async def dict_mget(self):
         table_name = self._client_obj['table_name']
-        key = self._client_obj['key']
+        keys = self._client_obj['keys']
         default = self._client_obj['default']
         try:
-            r = self._db[table_name].setdefault(key, default)
+            table = self._db[table_name]
+            if self._expires.deadlines.get(table_name):
+                for key in keys:
+                    self._expires.check(self._db, table_name, key)
+            r = [table.get(key, default) for key in keys]
+            for key in keys:
+                self._eviction.touch(table_name, key)
             server_obj = {
                 'code': 1,
                 'content': r
@@ -331,12 +847,17 @@ class Route:
 
         return server_obj
 
-    @bind('/cyberdict/update')
-    async def dict_update(self):
+    @bind('/cyberdict/mset', write=True, grows=True)
+    async def dict_mset(self):
         table_name = self._client_obj['table_name']
-        dict2 = self._client_obj['dict2']
+        mapping = self._client_obj['mapping']
         try:
-            self._db[table_name].update(dict2)
+            self._db[table_name].update(mapping)
+            self._indexes.set_many(table_name, mapping)
+            self._expires.persist_many(table_name, mapping)
+            for key in mapping:
+                self._eviction.touch(table_name, key)
+            self._tracking.invalidate(table_name, mapping)
             server_obj = {
                 'code': 1
             }
@@ -348,11 +869,23 @@ class Route:
 
         return server_obj
 
-    @bind('/cyberdict/keys')
-    async def dict_keys(self):
+    @bind('/cyberdict/mdelete', write=True)
+    async def dict_mdelete(self):
         table_name = self._client_obj['table_name']
+        keys = self._client_obj['keys']
         try:
-            r = list(self._db[table_name].keys())
+            table = self._db[table_name]
+            r = []
+            for key in keys:
+                self._expires.check(self._db, table_name, key)
+                self._expires.persist(table_name, key)
+                if key in table:
+                    del table[key]
+                    self._indexes.discard(table_name, key)
+                    r.append(True)
+                else:
+                    r.append(False)
+            self._tracking.invalidate(table_name, keys)
             server_obj = {
                 'code': 1,
                 'content': r
@@ -365,11 +898,12 @@ class Route:
 
         return server_obj
 
-    @bind('/cyberdict/values')
-    async def dict_values(self):
+    @bind('/cyberdict/todict')
+    async def todict(self):
         table_name = self._client_obj['table_name']
         try:
-            r = list(self._db[table_name].values())
+            self._expires.collect(self._db, table_name)
+            r = self._db[table_name]
             server_obj = {
                 'code': 1,
                 'content': r
@@ -382,15 +916,24 @@ class Route:
 
         return server_obj
 
-    @bind('/cyberdict/items')
-    async def dict_items(self):
+    @bind('/cyberdict/get')
+    async def dict_get(self):
         table_name = self._client_obj['table_name']
+        key = self._client_obj['key']
+        default = self._client_obj['default']
         try:
-            r = list(self._db[table_name].items())
+            self._expires.check(self._db, table_name, key)
+            table = self._db[table_name]
+            exists = key in table
+            r = table[key] if exists else default
+            self._eviction.touch(table_name, key)
             server_obj = {
                 'code': 1,
                 'content': r
             }
+            if self._client_obj.get('track') is not None:
+                server_obj['exists'] = exists
+                self._track(server_obj, table_name, key)
         except Exception as e:
             server_obj = {
                 'code': 0,
@@ -399,14 +942,19 @@ class Route:
 
         return server_obj
 
-    @bind('/cyberdict/pop')
-    async def dict_pop(self):
+    @bind('/cyberdict/setdefault', write=True, grows=True)
+    async def dict_setdefault(self):
         table_name = self._client_obj['table_name']
         key = self._client_obj['key']
         default = self._client_obj['default']
-
         try:
-            r = self._db[table_name].pop(key, default)
+            self._expires.check(self._db, table_name, key)
+            table = self._db[table_name]
+            if key not in table:
+                self._tracking.invalidate(table_name, (key,))
+                self._indexes.set(table_name, key, default)
+            r = table.setdefault(key, default)
+            self._eviction.touch(table_name, key)
             server_obj = {
                 'code': 1,
                 'content': r
@@ -419,14 +967,19 @@ class Route:
 
         return server_obj
 
-    @bind('/cyberdict/popitem')
-    async def dict_popitem(self):
+    @bind('/cyberdict/update', write=True, grows=True)
+    async def dict_update(self):
         table_name = self._client_obj['table_name']
+        dict2 = self._client_obj['dict2']
         try:
-            r = self._db[table_name].popitem()
+            self._db[table_name].update(dict2)
+            self._indexes.set_many(table_name, dict2)
+            self._expires.persist_many(table_name, dict2)
+            for key in dict2:
+                self._eviction.touch(table_name, key)
+            self._tracking.invalidate(table_name, dict2)
             server_obj = {
-                'code': 1,
-                'content': r
+                'code': 1
             }
         except Exception as e:
             server_obj = {
@@ -436,13 +989,15 @@ class Route:
 
         return server_obj
 
-    @bind('/cyberdict/clear')
-    async def dict_clear(self):
+    @bind('/cyberdict/keys')
+    async def dict_keys(self):
         table_name = self._client_obj['table_name']
         try:
-            self._db[table_name].clear()
+            self._expires.collect(self._db, table_name)
+            r = list(self._db[table_name].keys())
             server_obj = {
-                'code': 1
+                'code': 1,
+                'content': r
             }
         except Exception as e:
             server_obj = {
@@ -452,11 +1007,12 @@ class Route:
 
         return server_obj
 
-    @bind('/cyberlist/repr')
-    async def list_repr(self):
+    @bind('/cyberdict/values')
+    async def dict_values(self):
         table_name = self._client_obj['table_name']
         try:
-            r = repr(self._db[table_name])
+            self._expires.collect(self._db, table_name)
+            r = list(self._db[table_name].values())
             server_obj = {
                 'code': 1,
                 'content': r
@@ -469,11 +1025,12 @@ class Route:
 
         return server_obj
 
-    @bind('/cyberlist/str')
-    async def list_str(self):
+    @bind('/cyberdict/items')
+    async def dict_items(self):
         table_name = self._client_obj['table_name']
         try:
-            r = str(self._db[table_name])
+            self._expires.collect(self._db, table_name)
+            r = list(self._db[table_name].items())
             server_obj = {
                 'code': 1,
                 'content': r
@@ -486,14 +1043,41 @@ class Route:
 
         return server_obj
 
-    @bind('/cyberlist/len')
-    async def list_len(self):
+    @bind('/cyberdict/scan')
+    async def dict_scan(self):
+        '''
+            Return a page of the table and the cursor of the next page, 
+            the cursor is 0 when the iteration is finished.
+        '''
         table_name = self._client_obj['table_name']
+        cursor_id = self._client_obj['cursor']
+        count = self._client_obj['count']
+        match = self._client_obj['match']
+        mode = self._client_obj['mode']
         try:
-            r = len(self._db[table_name])
+            self._expires.collect(self._db, table_name)
+            if cursor_id == 0:
+                cursor = Cursor(self._db[table_name], match=match)
+                self._cursor_id += 1
+                cursor_id = self._cursor_id
+            else:
+                try:
+                    cursor = self._cursors.pop(cursor_id)
+                except KeyError:
+                    raise CyberDBError(
+                        'The cursor does not exist or has expired.')
+
+            page, finished = cursor.fetch(count, mode)
+            if finished:
+                cursor_id = 0
+            else:
+                self._cursors[cursor_id] = cursor
+                if len(self._cursors) > MAX_CURSORS:
+                    self._cursors.popitem(last=False)
+
             server_obj = {
                 'code': 1,
-                'content': r
+                'content': (cursor_id, page)
             }
         except Exception as e:
             server_obj = {
@@ -503,12 +1087,18 @@ class Route:
 
         return server_obj
 
-    @bind('/cyberlist/getitem')
-    async def list_getitem(self):
+    @bind('/cyberdict/pop', write=True)
+    async def dict_pop(self):
         table_name = self._client_obj['table_name']
-        index = self._client_obj['index']
+        key = self._client_obj['key']
+        default = self._client_obj['default']
+
         try:
-            r = self._db[table_name][index]
+            self._expires.check(self._db, table_name, key)
+            r = self._db[table_name].pop(key, default)
+            self._indexes.discard(table_name, key)
+            self._expires.persist(table_name, key)
+            self._tracking.invalidate(table_name, (key,))
             server_obj = {
                 'code': 1,
                 'content': r
@@ -521,15 +1111,18 @@ class Route:
 
         return server_obj
 
-    @bind('/cyberlist/setitem')
-    async def list_setitem(self):
+    @bind('/cyberdict/popitem', write=True)
+    async def dict_popitem(self):
         table_name = self._client_obj['table_name']
-        index = self._client_obj['index']
-        value = self._client_obj['value']
         try:
-            self._db[table_name][index] = value
+            self._expires.collect(self._db, table_name)
+            r = self._db[table_name].popitem()
+            self._indexes.discard(table_name, r[0])
+            self._expires.persist(table_name, r[0])
+            self._tracking.invalidate(table_name, (r[0],))
             server_obj = {
                 'code': 1,
+                'content': r
             }
         except Exception as e:
             server_obj = {
@@ -539,14 +1132,16 @@ class Route:
 
         return server_obj
 
-    @bind('/cyberlist/delitem')
-    async def list_delitem(self):
+    @bind('/cyberdict/clear', write=True)
+    async def dict_clear(self):
         table_name = self._client_obj['table_name']
-        index = self._client_obj['index']
         try:
-            del self._db[table_name][index]
+            self._db[table_name].clear()
+            self._indexes.clear(table_name)
+            self._expires.drop(table_name)
+            self._tracking.invalidate_table(table_name)
             server_obj = {
-                'code': 1,
+                'code': 1
             }
         except Exception as e:
             server_obj = {
@@ -556,11 +1151,19 @@ class Route:
 
         return server_obj
 
-    @bind('/cyberlist/tolist')
-    async def tolist(self):
+    @bind('/cyberdict/create_index', write=True)
+    async def dict_create_index(self):
+        '''
+            Index a field path of the records of the table.
+
+            Return Type: bool, False if the index already exists.
+        '''
         table_name = self._client_obj['table_name']
+        field = self._client_obj['field']
+        kind = self._client_obj['kind']
         try:
-            r = self._db[table_name]
+            self._expires.collect(self._db, table_name)
+            r = self._indexes.create(self._db, table_name, field, kind)
             server_obj = {
                 'code': 1,
                 'content': r
@@ -573,14 +1176,20 @@ class Route:
 
         return server_obj
 
-    @bind('/cyberlist/append')
-    async def list_append(self):
+    @bind('/cyberdict/drop_index', write=True)
+    async def dict_drop_index(self):
+        '''
+            Return Type: bool, whether the index existed.
+        '''
         table_name = self._client_obj['table_name']
-        value = self._client_obj['value']
+        field = self._client_obj['field']
         try:
-            self._db[table_name].append(value)
+            if table_name not in self._db:
+                raise KeyError(table_name)
+            r = self._indexes.remove(table_name, field)
             server_obj = {
-                'code': 1
+                'code': 1,
+                'content': r
             }
         except Exception as e:
             server_obj = {
@@ -590,14 +1199,16 @@ class Route:
 
         return server_obj
 
-    @bind('/cyberlist/extend')
-    async def list_extend(self):
+    @bind('/cyberdict/indexes')
+    async def dict_indexes(self):
         table_name = self._client_obj['table_name']
-        obj = self._client_obj['obj']
         try:
-            self._db[table_name].extend(obj)
+            if table_name not in self._db:
+                raise KeyError(table_name)
+            r = self._indexes.fields(table_name)
             server_obj = {
-                'code': 1
+                'code': 1,
+                'content': r
             }
         except Exception as e:
             server_obj = {
@@ -607,13 +1218,315 @@ class Route:
 
         return server_obj
 
-    @bind('/cyberlist/insert')
-    async def list_insert(self):
+    def _records(self, table_name: str, keys) -> dict:
+        '''
+            Return Type: dict, the records of the keys found by an index, 
+            at most limit records.
+        '''
+        table = self._db[table_name]
+        limit = self._client_obj['limit']
+        r = {}
+        for key in keys:
+            if limit is not None and len(r) >= limit:
+                break
+            r[key] = table[key]
+        for key in r:
+            self._eviction.touch(table_name, key)
+        return r
+
+    @bind('/cyberdict/lookup')
+    async def dict_lookup(self):
+        '''
+            Find the records whose field equals the value with the index 
+            of the field.
+        '''
+        table_name = self._client_obj['table_name']
+        field = self._client_obj['field']
+        value = self._client_obj['value']
+        try:
+            self._expires.collect(self._db, table_name)
+            index = self._indexes.get(self._db, table_name, field)
+            r = self._records(table_name, index.equal(value))
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cyberdict/lookup_range')
+    async def dict_lookup_range(self):
+        '''
+            Find the records whose field is between min_value and 
+            max_value with the sorted index of the field, in the order of 
+            the values.
+        '''
+        table_name = self._client_obj['table_name']
+        field = self._client_obj['field']
+        min_value = self._client_obj['min_value']
+        max_value = self._client_obj['max_value']
+        reverse = self._client_obj['reverse']
+        try:
+            self._expires.collect(self._db, table_name)
+            index = self._indexes.get(self._db, table_name, field)
+            if index.kind != 'sorted':
+                raise CyberDBError(
+                    'The index of the field {} is not sorted.'.format(field))
+            r = self._records(
+                table_name, index.range(min_value, max_value, reverse))
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cyberdict/query')
+    async def dict_query(self):
+        '''
+            Find the records matching the predicate, with the fields of 
+            the projection. When the predicate has a condition on an 
+            indexed field, the candidates are taken from the index, 
+            otherwise the table is scanned in chunks. The keys are taken 
+            when the query starts, the keys deleted during the scan are 
+            skipped.
+        '''
+        table_name = self._client_obj['table_name']
+        where = self._client_obj['where']
+        fields = self._client_obj['fields']
+        limit = self._client_obj['limit']
+        try:
+            self._expires.collect(self._db, table_name)
+            table = self._db[table_name]
+            if type(table) != dict:
+                raise TypeCyberDBError('The table is not a CyberDict.')
+            match = compile_where(where)
+            project = compile_fields(fields)
+            keys = plan(where, lambda field: self._indexes.find(
+                self._db, table_name, field))
+            if keys is None:
+                keys = list(table)
+
+            r = {}
+            if limit is None or limit > 0:
+                async for chunk in self._chunks(keys):
+                    for key in chunk:
+                        record = table.get(key, MISSING)
+                        if record is not MISSING and match(record):
+                            r[key] = project(record)
+                            if len(r) == limit:
+                                break
+                    if len(r) == limit:
+                        break
+            for key in r:
+                self._eviction.touch(table_name, key)
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    async def _aggregate(self, values: list, match=None) -> dict:
+        '''
+            Aggregate the values in chunks, the other requests are served 
+            between the chunks.
+        '''
+        aggregation = Aggregation(self._client_obj['field'],
+                                  self._client_obj['group_by'], match)
+        async for chunk in self._chunks(values):
+            aggregation.update(chunk)
+        return aggregation.result()
+
+    @bind('/cyberdict/aggregate')
+    async def dict_aggregate(self):
+        '''
+            Compute the count, sum, mean, min and max of the values of the 
+            table, or of a field path of the records, optionally for the 
+            records matching a predicate and by group. The values are 
+            taken when the aggregation starts.
+        '''
+        table_name = self._client_obj['table_name']
+        where = self._client_obj['where']
+        try:
+            self._expires.collect(self._db, table_name)
+            table = self._db[table_name]
+            if type(table) != dict:
+                raise TypeCyberDBError('The table is not a CyberDict.')
+            match = None
+            keys = None
+            if where is not None:
+                match = compile_where(where)
+                keys = plan(where, lambda field: self._indexes.find(
+                    self._db, table_name, field))
+            if keys is None:
+                values = list(table.values())
+            else:
+                values = [table[key] for key in keys if key in table]
+            r = await self._aggregate(values, match)
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cyberlist/repr')
+    async def list_repr(self):
+        table_name = self._client_obj['table_name']
+        try:
+            r = repr(self._db[table_name])
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cyberlist/str')
+    async def list_str(self):
+        table_name = self._client_obj['table_name']
+        try:
+            r = str(self._db[table_name])
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cyberlist/len')
+    async def list_len(self):
+        table_name = self._client_obj['table_name']
+        try:
+            r = len(self._db[table_name])
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cyberlist/getitem')
+    async def list_getitem(self):
+        table_name = self._client_obj['table_name']
+        index = self._client_obj['index']
+        try:
+            r = self._db[table_name][index]
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cyberlist/setitem', write=True, grows=True)
+    async def list_setitem(self):
+        table_name = self._client_obj['table_name']
+        index = self._client_obj['index']
+        value = self._client_obj['value']
+        try:
+            table = self._db[table_name]
+            start = position(len(table), index)
+            table[index] = value
+            self._sort_orders.changed(table_name, start)
+            server_obj = {
+                'code': 1,
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cyberlist/delitem', write=True)
+    async def list_delitem(self):
         table_name = self._client_obj['table_name']
         index = self._client_obj['index']
+        try:
+            table = self._db[table_name]
+            start = position(len(table), index)
+            del table[index]
+            if type(index) == slice:
+                self._sort_orders.changed(table_name, start)
+            else:
+                self._sort_orders.removed(table_name, start)
+            server_obj = {
+                'code': 1,
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cyberlist/tolist')
+    async def tolist(self):
+        table_name = self._client_obj['table_name']
+        try:
+            r = self._db[table_name]
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cyberlist/append', write=True, grows=True)
+    async def list_append(self):
+        table_name = self._client_obj['table_name']
         value = self._client_obj['value']
         try:
-            self._db[table_name].insert(index, value)
+            self._db[table_name].append(value)
             server_obj = {
                 'code': 1
             }
@@ -625,12 +1538,33 @@ class Route:
 
         return server_obj
 
-    @bind('/cyberlist/pop')
-    async def list_pop(self):
+    @bind('/cyberlist/extend', write=True, grows=True)
+    async def list_extend(self):
+        table_name = self._client_obj['table_name']
+        obj = self._client_obj['obj']
+        try:
+            self._db[table_name].extend(obj)
+            server_obj = {
+                'code': 1
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cyberlist/insert', write=True, grows=True)
+    async def list_insert(self):
         table_name = self._client_obj['table_name']
         index = self._client_obj['index']
+        value = self._client_obj['value']
         try:
-            self._db[table_name].pop(index)
+            table = self._db[table_name]
+            table.insert(index, value)
+            self._sort_orders.changed(table_name,
+                                      position(len(table) - 1, index))
             server_obj = {
                 'code': 1
             }
@@ -642,12 +1576,34 @@ class Route:
 
         return server_obj
 
-    @bind('/cyberlist/remove')
+    @bind('/cyberlist/pop', write=True)
+    async def list_pop(self):
+        table_name = self._client_obj['table_name']
+        index = self._client_obj['index']
+        try:
+            table = self._db[table_name]
+            start = position(len(table), index)
+            r = table.pop(index)
+            self._sort_orders.removed(table_name, start)
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cyberlist/remove', write=True)
     async def list_remove(self):
         table_name = self._client_obj['table_name']
         value = self._client_obj['value']
         try:
             self._db[table_name].remove(value)
+            self._sort_orders.removed(table_name)
             server_obj = {
                 'code': 1
             }
@@ -695,11 +1651,12 @@ class Route:
 
         return server_obj
 
-    @bind('/cyberlist/reverse')
+    @bind('/cyberlist/reverse', write=True)
     async def list_reverse(self):
         table_name = self._client_obj['table_name']
         try:
             self._db[table_name].reverse()
+            self._sort_orders.changed(table_name, 0)
             server_obj = {
                 'code': 1
             }
@@ -711,20 +1668,17 @@ class Route:
 
         return server_obj
 
-    @bind('/cyberlist/sort')
+    @bind('/cyberlist/sort', write=True)
     async def list_sort(self):
         table_name = self._client_obj['table_name']
         key = self._client_obj['key']
-        
-        if key:
-            # Dynamic get function.
-            loc = locals()
-            key = exec('{}'.format(key))
-            key = loc['func']
-            
-        reverse = self._client_obj['reverse']
+        field = self._client_obj.get('field')
+        reverse = bool(self._client_obj['reverse'])
         try:
-            self._db[table_name].sort(key=key, reverse=reverse)
+            self._sort_orders.sort(
+                self._db[table_name], table_name, (key, field, reverse),
+                self._sort_keys.get(key, field),
+                self._client_obj.get('maintain'))
             server_obj = {
                 'code': 1
             }
@@ -736,8 +1690,554 @@ class Route:
 
         return server_obj
 
-    @bind('/cyberlist/clear')
+    @bind('/cyberlist/sort_order')
+    async def list_sort_order(self):
+        table_name = self._client_obj['table_name']
+        try:
+            r = self._sort_orders.get(table_name)
+            server_obj = {
+                'code': 1,
+                'content': None if r is None else {
+                    'key': r[0],
+                    'field': r[1],
+                    'reverse': r[2]
+                }
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cyberlist/clear', write=True)
     async def list_clear(self):
+        table_name = self._client_obj['table_name']
+        try:
+            self._db[table_name].clear()
+            self._sort_orders.changed(table_name, 0)
+            server_obj = {
+                'code': 1
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cyberlist/query')
+    async def list_query(self):
+        '''
+            Find the elements matching the predicate, with the fields of 
+            the projection. The list is copied when the query starts and 
+            the copy is scanned in chunks.
+        '''
+        table_name = self._client_obj['table_name']
+        where = self._client_obj['where']
+        fields = self._client_obj['fields']
+        limit = self._client_obj['limit']
+        try:
+            table = self._db[table_name]
+            if type(table) != list:
+                raise TypeCyberDBError('The table is not a CyberList.')
+            match = compile_where(where)
+            project = compile_fields(fields)
+
+            r = []
+            if limit is None or limit > 0:
+                async for chunk in self._chunks(table[:]):
+                    for value in chunk:
+                        if match(value):
+                            r.append(project(value))
+                            if len(r) == limit:
+                                break
+                    if len(r) == limit:
+                        break
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cyberlist/aggregate')
+    async def list_aggregate(self):
+        '''
+            Compute the count, sum, mean, min and max of the elements, see 
+            Route.dict_aggregate.
+        '''
+        table_name = self._client_obj['table_name']
+        where = self._client_obj['where']
+        try:
+            table = self._db[table_name]
+            if type(table) != list:
+                raise TypeCyberDBError('The table is not a CyberList.')
+            match = None if where is None else compile_where(where)
+            r = await self._aggregate(table[:], match)
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cyberqueue/repr')
+    async def queue_repr(self):
+        table_name = self._client_obj['table_name']
+        try:
+            r = repr(self._db[table_name])
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cyberqueue/str')
+    async def queue_str(self):
+        table_name = self._client_obj['table_name']
+        try:
+            r = str(self._db[table_name])
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cyberqueue/len')
+    async def queue_len(self):
+        table_name = self._client_obj['table_name']
+        try:
+            r = len(self._db[table_name])
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cyberqueue/tolist')
+    async def queue_tolist(self):
+        table_name = self._client_obj['table_name']
+        try:
+            r = list(self._db[table_name])
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cyberqueue/append', write=True, grows=True)
+    async def queue_append(self):
+        '''
+            Push a value to the right end, or to the left end if left is 
+            True, and wake a blocked pop.
+        '''
+        table_name = self._client_obj['table_name']
+        value = self._client_obj['value']
+        try:
+            if self._client_obj['left']:
+                self._db[table_name].appendleft(value)
+            else:
+                self._db[table_name].append(value)
+            self._waiters.notify(table_name)
+            server_obj = {
+                'code': 1
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cyberqueue/extend', write=True, grows=True)
+    async def queue_extend(self):
+        table_name = self._client_obj['table_name']
+        obj = self._client_obj['obj']
+        try:
+            if self._client_obj['left']:
+                self._db[table_name].extendleft(obj)
+            else:
+                self._db[table_name].extend(obj)
+            self._waiters.notify(table_name, len(obj))
+            server_obj = {
+                'code': 1
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cyberqueue/pop', write=True)
+    async def queue_pop(self):
+        table_name = self._client_obj['table_name']
+        try:
+            if self._client_obj['left']:
+                r = self._db[table_name].popleft()
+            else:
+                r = self._db[table_name].pop()
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cyberqueue/bpop')
+    async def queue_bpop(self):
+        '''
+            Pop a value, waiting up to timeout seconds for one to be 
+            pushed if the table is empty. The request waits on the event 
+            loop, the other connections are served meanwhile. default is 
+            returned if the timeout expires. The pop is logged to the 
+            append-only file as /cyberqueue/pop, a timeout is not logged.
+        '''
+        table_name = self._client_obj['table_name']
+        left = self._client_obj['left']
+        timeout = self._client_obj['timeout']
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        try:
+            while not self._db[table_name]:
+                remaining = None if deadline is None else \
+                    deadline - loop.time()
+                if remaining is not None and remaining <= 0 or \
+                        not await self._waiters.wait(table_name, remaining):
+                    return {
+                        'code': 1,
+                        'content': self._client_obj['default']
+                    }
+                # The client left while waiting, the value is left to the 
+                # next waiter.
+                if self._stream._reader.at_eof():
+                    self._waiters.notify(table_name)
+                    raise DisconCyberDBError(
+                        'The client disconnected during a blocking pop.')
+
+            table = self._db[table_name]
+            r = table.popleft() if left else table.pop()
+            if self._aof:
+                self._aof.append({
+                    'route': '/cyberqueue/pop',
+                    'table_name': table_name,
+                    'left': left
+                })
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except DisconCyberDBError:
+            raise
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cyberqueue/clear', write=True)
+    async def queue_clear(self):
+        table_name = self._client_obj['table_name']
+        try:
+            self._db[table_name].clear()
+            server_obj = {
+                'code': 1
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    def _window(self, pairs) -> list:
+        '''
+            The members of a range of a CyberSortedSet, with their scores 
+            if the request asks for them.
+        '''
+        if self._client_obj['withscores']:
+            return list(pairs)
+        return [member for member, score in pairs]
+
+    @bind('/cybersortedset/repr')
+    async def sortedset_repr(self):
+        table_name = self._client_obj['table_name']
+        try:
+            r = repr(self._db[table_name])
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cybersortedset/str')
+    async def sortedset_str(self):
+        table_name = self._client_obj['table_name']
+        try:
+            r = str(self._db[table_name])
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cybersortedset/len')
+    async def sortedset_len(self):
+        table_name = self._client_obj['table_name']
+        try:
+            r = len(self._db[table_name])
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cybersortedset/todict')
+    async def sortedset_todict(self):
+        table_name = self._client_obj['table_name']
+        try:
+            r = dict(self._db[table_name])
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cybersortedset/add', write=True, grows=True)
+    async def sortedset_add(self):
+        '''
+            Add the members of the mapping or change their scores, the 
+            number of new members is returned.
+        '''
+        table_name = self._client_obj['table_name']
+        mapping = self._client_obj['mapping']
+        try:
+            # The request is applied entirely or not at all.
+            r = self._db[table_name].update(mapping)
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cybersortedset/incr', write=True, grows=True)
+    async def sortedset_incr(self):
+        table_name = self._client_obj['table_name']
+        member = self._client_obj['member']
+        amount = self._client_obj['amount']
+        try:
+            table = self._db[table_name]
+            score = table.score(member)
+            r = amount if score is None else score + amount
+            table.add(member, r)
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cybersortedset/remove', write=True)
+    async def sortedset_remove(self):
+        table_name = self._client_obj['table_name']
+        members = self._client_obj['members']
+        try:
+            table = self._db[table_name]
+            r = 0
+            for member in members:
+                r += table.remove(member)
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cybersortedset/score')
+    async def sortedset_score(self):
+        table_name = self._client_obj['table_name']
+        member = self._client_obj['member']
+        try:
+            r = self._db[table_name].score(member)
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cybersortedset/rank')
+    async def sortedset_rank(self):
+        table_name = self._client_obj['table_name']
+        member = self._client_obj['member']
+        reverse = self._client_obj['reverse']
+        try:
+            r = self._db[table_name].rank(member, reverse)
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cybersortedset/range')
+    async def sortedset_range(self):
+        table_name = self._client_obj['table_name']
+        start = self._client_obj['start']
+        stop = self._client_obj['stop']
+        reverse = self._client_obj['reverse']
+        try:
+            r = self._window(
+                self._db[table_name].range(start, stop, reverse))
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cybersortedset/range_by_score')
+    async def sortedset_range_by_score(self):
+        table_name = self._client_obj['table_name']
+        try:
+            r = self._window(self._db[table_name].range_by_score(
+                self._client_obj['min_score'], self._client_obj['max_score'],
+                self._client_obj['reverse'], self._client_obj['offset'],
+                self._client_obj['count']))
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cybersortedset/count')
+    async def sortedset_count(self):
+        table_name = self._client_obj['table_name']
+        try:
+            r = self._db[table_name].count(self._client_obj['min_score'],
+                                           self._client_obj['max_score'])
+            server_obj = {
+                'code': 1,
+                'content': r
+            }
+        except Exception as e:
+            server_obj = {
+                'code': 0,
+                'Exception': e
+            }
+
+        return server_obj
+
+    @bind('/cybersortedset/clear', write=True)
+    async def sortedset_clear(self):
         table_name = self._client_obj['table_name']
         try:
             self._db[table_name].clear()
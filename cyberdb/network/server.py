@@ -1,4 +1,6 @@
+import os
 import re
+import time
 import shutil
 import pickle
 import datetime
@@ -8,14 +10,26 @@ import threading
 from obj_encrypt import Secret
 from apscheduler.schedulers.background import BackgroundScheduler
 
-from . import AioStream
+from . import AioStream, set_nodelay
 from .route import Route
-from ..data import datas
-from ..extensions import DisconCyberDBError, WrongFilenameCyberDBError, \
+from .tracking import Tracking
+from .pubsub import PubSub
+from .waiters import Waiters
+from ..data import datas, snapshot, expiry, eviction
+from ..data.expiry import Expires
+from ..data.eviction import Eviction
+from ..data.indexes import Indexes
+from ..data.sorting import SortKeys, SortOrders
+from ..data.aof import AppendOnlyFile, replay
+from ..extensions import CyberDBError, DisconCyberDBError, WrongFilenameCyberDBError, \
 WrongPasswordCyberDBError, BackupCyberDBError, TypeCyberDBError
 from ..extensions.signature import Signature
 
 
+# The ways save_db serializes the database of a running server.
+SAVE_MODES = ('fork', 'copy')
+
+
 class Server:
     '''
         This class is used to create CyberDB server objects.
@@ -28,14 +42,46 @@ class Server:
                 'port': None,
                 'password': None
             },
-            'db': {}
+            'db': {},
+            # The deadlines of the keys with a time to live.
+            'expires': {},
+            # The indexed field paths of the CyberDict tables.
+            'indexes': {},
+            # The orders the CyberList tables are kept sorted in.
+            'sort_orders': {}
         }
+        # The secondary indexes of the CyberDict tables, the expired keys 
+        # are removed from them.
+        self._indexes = Indexes(self._data['indexes'])
+        self._expires = Expires(self._data['expires'], self._indexes.discard)
+        self._sort_orders = SortOrders(self._data['sort_orders'])
+        # The key functions of the CyberList sorts, by name.
+        self._sort_keys = SortKeys()
+        # The memory limit and the eviction policies of the tables.
+        self._eviction = Eviction()
         self.ips = {'127.0.0.1'}  # ip whitelist
         self.sched = None
+        self._aof = None
+        # Whether the append-only file has been replayed into the database.
+        self._aof_loaded = False
+        self._loop = None
+        # Information about the last snapshot written by save_db.
+        self.last_save = None
+        # The snapshot of the tables which are loaded lazily.
+        self._snapshot = None
+        # The number of open connections.
+        self._clients = 0
+        # The keys cached by the clients with a near cache.
+        self._tracking = Tracking()
+        # The subscribers of the publish/subscribe channels.
+        self._pubsub = PubSub()
+        # The blocking pops waiting on the CyberQueue tables.
+        self._waiters = Waiters()
 
     def start(self, host: str = '127.0.0.1', port: int = 9980,
               password: str = None, max_con: int = 500, timeout: int = 0,
-              print_log: bool = False, encrypt: bool = False):
+              print_log: bool = False, encrypt: bool = False,
+              maxmemory: int = None, policy: str = 'noeviction'):
         '''
             Starts the CyberDB server in the background, which does not block 
             foreground tasks.
@@ -58,19 +104,34 @@ class Server:
                 print it.
                 
                 encrypt -- Whether to encrypt the communication content, Fasle is 
-                not encrypted. The encryption algorithm is AES-256 and the key is 
-                password.
+                not encrypted. The encryption algorithm is AES-256-GCM and the 
+                key of each connection is derived from password when it opens. 
+                It is provided by the cryptography package, which is installed 
+                with CyberDB.
+
+                maxmemory -- the maximum size of the tables in bytes, None 
+                is unlimited. The size is estimated from samples of the 
+                tables. When a write may use more memory and the tables are 
+                over maxmemory, keys are evicted according to the policies 
+                of the tables, or the write is rejected with 
+                OutOfMemoryCyberDBError if no key can be evicted.
+
+                policy -- the eviction policy of the tables which have no 
+                policy set by set_policy, one of 'noeviction', 'lru', 'lfu' 
+                and 'ttl'.
                 
             Return Type: None
         '''
         t = threading.Thread(target=self.run,
-                             args=(host, port, password, max_con, timeout, print_log, encrypt))
+                             args=(host, port, password, max_con, timeout,
+                                   print_log, encrypt, maxmemory, policy))
         t.daemon = True
         t.start()
 
     def run(self, host: str = '127.0.0.1', port: int = 9980,
             password: str = None, max_con: int = 500, timeout: int = 0,
-            print_log: bool = False, encrypt: bool = False):
+            print_log: bool = False, encrypt: bool = False,
+            maxmemory: int = None, policy: str = 'noeviction'):
         '''
             Running the CyberDB server in the foreground blocks foreground tasks.
             The parameters are the same as the start method.
@@ -79,6 +140,9 @@ class Server:
         '''
         if not password:
             raise RuntimeError('The password cannot be empty.')
+        if policy not in eviction.POLICIES:
+            raise CyberDBError('The policy must be one of {}.'.format(
+                ', '.join(eviction.POLICIES)))
 
         self._data['config']['host'] = host
         self._data['config']['port'] = port
@@ -87,6 +151,9 @@ class Server:
         self._data['config']['timeout'] = timeout
         self._data['config']['print_log'] = print_log
         self._data['config']['encrypt'] = encrypt
+        self._data['config']['maxmemory'] = maxmemory
+        self._eviction.maxmemory = maxmemory
+        self._eviction.policy = policy
 
         # Responsible for encrypting and decrypting objects.
         secret = Secret(key=password)
@@ -96,6 +163,20 @@ class Server:
         asyncio.run(self._main())
 
     async def _main(self):
+        self._loop = asyncio.get_running_loop()
+
+        if self._aof:
+            # Recover the database from the append-only file if load_db 
+            # has not done it.
+            if not self._aof_loaded:
+                self._replay_aof(0)
+            self._aof.open(self._data['db'], self._expires, self._indexes,
+                           self._sort_orders)
+
+        if self._snapshot:
+            asyncio.ensure_future(self._load_cold_tables())
+        asyncio.ensure_future(self._sweep_expired())
+
         server = await asyncio.start_server(
             self._listener, self._data['config']['host'],
             self._data['config']['port'],
@@ -137,24 +218,36 @@ class Server:
                         writer.close()
                         return
 
+            set_nodelay(writer.get_extra_info('socket'))
+
             # TCP route of this connection
             stream = AioStream(reader, writer, self._dp)
             route = Route(self._data['db'], self._dp, stream,
-                          print_log=self._data['config']['print_log'])
-
-            # If the timeout is set, it will automatically disconnect.
-            if self._data['config']['timeout'] == 0:
-                await route.find()
-            else:
-                try:
-                    await asyncio.wait_for(route.find(),
-                                           timeout=self._data['config']['timeout'])
-                except asyncio.TimeoutError:
-                    if self._data['config']['print_log']:
-                        print('{}  {}:{}  connection timed out.'.format(
-                            datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                            addr[0], addr[1]))
-                    writer.close()
+                          print_log=self._data['config']['print_log'],
+                          aof=self._aof, expires=self._expires,
+                          eviction=self._eviction, info=self._info,
+                          tracking=self._tracking, pubsub=self._pubsub,
+                          waiters=self._waiters, indexes=self._indexes,
+                          sort_keys=self._sort_keys,
+                          sort_orders=self._sort_orders)
+
+            self._clients += 1
+            try:
+                # If the timeout is set, it will automatically disconnect.
+                if self._data['config']['timeout'] == 0:
+                    await route.find()
+                else:
+                    try:
+                        await asyncio.wait_for(route.find(),
+                                               timeout=self._data['config']['timeout'])
+                    except asyncio.TimeoutError:
+                        if self._data['config']['print_log']:
+                            print('{}  {}:{}  connection timed out.'.format(
+                                datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                addr[0], addr[1]))
+                        writer.close()
+            finally:
+                self._clients -= 1
 
         except DisconCyberDBError:
             if self._data['config']['print_log']:
@@ -168,6 +261,20 @@ class Server:
                     datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
                     addr[0], addr[1]))
 
+    def _info(self) -> dict:
+        '''
+            The state of the server reported by the /info route.
+        '''
+        return {
+            'rss': eviction.rss(),
+            'clients': self._clients,
+            'blocked_clients': self._waiters.count(),
+            'last_save': self.last_save,
+            'aof': self._aof.file_name if self._aof else None,
+            'tracking': self._tracking.get_stats(),
+            'pubsub': self._pubsub.get_stats()
+        }
+
     def set_ip_whitelist(self, ips: list):
         '''
             Set the ip whitelist. When CyberDB encrypts communication, only 
@@ -190,6 +297,48 @@ class Server:
         ips.add('127.0.0.1')
         self.ips = ips
 
+    def set_policy(self, table_name: str, policy: str):
+        '''
+            Set the eviction policy of a table, it is used when the server 
+            is over maxmemory. Only the keys of CyberDict tables are 
+            evicted.
+
+            parameter:
+
+                table_name -- the name of the table, it does not need to 
+                exist yet.
+
+                policy -- 'lru' evicts the least recently used keys, 'lfu' 
+                the least frequently used keys, 'ttl' the keys with the 
+                nearest deadline, 'noeviction' keeps the keys of the table. 
+                lru and lfu are approximated by comparing a sample of the 
+                keys.
+
+            Return Type: None
+        '''
+        if policy not in eviction.POLICIES:
+            raise CyberDBError('The policy must be one of {}.'.format(
+                ', '.join(eviction.POLICIES)))
+        self._eviction.policies[table_name] = policy
+
+    def register_sort_key(self, name: str, func):
+        '''
+            Register a key function for the sorts of the CyberList tables, 
+            CyberList.sort takes its name. Register the keys before load_db 
+            and before starting the server, the append-only file replays 
+            the sorts with the names of their keys.
+
+            parameter:
+
+                name -- the name of the key.
+
+                func -- a function of an element returning its key, like 
+                the key of list.sort.
+
+            Return Type: None
+        '''
+        self._sort_keys.register(name, func)
+
     def set_backup(self, file_name: str = 'data.cdb', cycle: int = 900):
         '''
             Set timed backup. After this operation is set, data persistent backup 
@@ -224,16 +373,30 @@ class Server:
                            seconds=cycle, args=[file_name])
         self.sched.start()
 
-    def save_db(self, file_name: str = 'data.cdb'):
+    def save_db(self, file_name: str = 'data.cdb', mode: str = None,
+                compress: str = None) -> dict:
         '''
-            Data persistence, save the CyberDB database to the hard disk.
+            Data persistence, save the CyberDB database to the hard disk. 
+            While the server is running, the snapshot is a point-in-time 
+            image of the database and the server keeps serving requests 
+            while it is written.
 
             parameter:
 
                 file_name -- the name of the file generated by the backup, the file 
                 suffix must be .cdb.
+
+                mode -- 'fork' serializes the database in a child process 
+                which shares the memory of the server copy-on-write, 'copy' 
+                copies the tables on the server and serializes the copy in 
+                the current thread. The default is 'fork' where the operating 
+                system supports it, otherwise 'copy'.
+
+                compress -- None or 'zlib', the compression of the chunks 
+                of the tables.
                 
-            Return Type: None
+            Return Type: dict, the mode, time, duration in seconds and size in 
+            bytes of the snapshot, it is also kept in the last_save attribute.
         '''
         prefix_name, suffix_name = file_name.rsplit('.', 1)
 
@@ -241,13 +404,73 @@ class Server:
             raise WrongFilenameCyberDBError(
                 'Please enter a filename with a .cdb suffix.')
 
-        # save to hard drive
+        if mode is None:
+            mode = 'fork' if hasattr(os, 'fork') else 'copy'
+        if mode not in SAVE_MODES:
+            raise CyberDBError(
+                'The mode must be one of {}.'.format(', '.join(SAVE_MODES)))
+        if mode == 'fork' and not hasattr(os, 'fork'):
+            raise CyberDBError('The operating system does not support fork.')
+        if compress not in snapshot.COMPRESSIONS:
+            raise CyberDBError('The compression must be None or zlib.')
+
+        start = time.perf_counter()
         file_name_temp = prefix_name + '_temp.cdb'
-        with open(file_name_temp, 'wb') as f:
-            pickle.dump(self._data, f)
+
+        if not (self._loop and self._loop.is_running()):
+            # The server is not running, nothing changes the database.
+            snapshot.dump(self._snapshot_data(self._data['db'],
+                                              self._expires.deadlines),
+                          file_name_temp, compress)
+        elif mode == 'fork':
+            # Fork on the event loop, no request is half applied in the child.
+            async def fork():
+                return snapshot.fork_dump(
+                    self._snapshot_data(self._data['db'],
+                                        self._expires.deadlines),
+                    file_name_temp, compress)
+
+            pid = asyncio.run_coroutine_threadsafe(fork(), self._loop).result()
+            if snapshot.wait_child(pid) != 0:
+                raise BackupCyberDBError(
+                    'The child process failed to save the database.')
+        else:
+            async def copy():
+                return self._snapshot_data(
+                    snapshot.copy_tables(self._data['db']),
+                    self._expires.copy())
+
+            data = asyncio.run_coroutine_threadsafe(copy(), self._loop).result()
+            snapshot.dump(data, file_name_temp, compress)
+
+        # save to hard drive
         shutil.move(file_name_temp, file_name)
 
-    def load_db(self, file_name: str = 'data.cdb'):
+        self.last_save = {
+            'mode': mode,
+            'time': datetime.datetime.now(),
+            'duration': time.perf_counter() - start,
+            'size': os.path.getsize(file_name)
+        }
+        return self.last_save
+
+    def _snapshot_data(self, db: dict, deadlines: dict) -> dict:
+        '''
+            The content of a snapshot. When the append-only file is enabled, 
+            it records the sequence number of the last logged mutation, so 
+            that load_db replays exactly the mutations after the snapshot.
+        '''
+        data = dict(self._data)
+        data['db'] = db
+        data['expires'] = deadlines
+        data['indexes'] = self._indexes.copy()
+        data['sort_orders'] = self._sort_orders.copy()
+        if self._aof:
+            data['aof_seq'] = self._aof.seq
+        return data
+
+    def load_db(self, file_name: str = 'data.cdb', lazy: bool = False,
+                workers: int = None):
         '''
             Load a file in .cdb format to load the CyberDB database backed up from 
             the hard disk back into memory.
@@ -255,6 +478,15 @@ class Server:
             parameter:
                 file_name -- the file name generated by data persistence, the file 
                 suffix must be .cdb.
+
+                lazy -- False loads every table now. True only reads the index 
+                of the file, the server accepts connections at once, a table 
+                is loaded when it is first accessed and the others are loaded 
+                in the background.
+
+                workers -- the number of worker processes which read, check 
+                and decompress the tables when lazy is False, the default is 
+                the number of CPUs.
                 
             Return Type: None
         '''
@@ -263,7 +495,131 @@ class Server:
         if suffix_name != 'cdb':
             raise WrongFilenameCyberDBError('The file suffix must be cdb.')
 
-        with open(file_name, 'rb') as f:
-            self._data = pickle.load(f)
+        if snapshot.is_chunked(file_name):
+            snap = snapshot.Snapshot(file_name)
+            data = dict(snap.data)
+            if lazy:
+                data['db'] = snap.cold_tables()
+                self._snapshot = snap
+            else:
+                try:
+                    data['db'] = snap.load(workers)
+                finally:
+                    snap.close()
+            self._data = data
+        else:
+            # A single pickle, written by the earlier versions.
+            with open(file_name, 'rb') as f:
+                self._data = pickle.load(f)
+
+        # Snapshots of the earlier versions have no deadlines, indexes and 
+        # sort orders.
+        self._indexes = Indexes(self._data.setdefault('indexes', {}))
+        self._expires = Expires(self._data.setdefault('expires', {}),
+                                self._indexes.discard)
+        self._sort_orders = SortOrders(self._data.setdefault('sort_orders', {}))
+
+        # Replay the mutations logged after the snapshot.
+        seq = self._data.pop('aof_seq', 0)
+        if self._aof:
+            self._replay_aof(seq)
 
         # print('File {} loaded successfully.'.format(file_name))
+
+    async def _sweep_expired(self):
+        '''
+            Remove the expired keys in the background. The keys are removed 
+            in batches of SWEEP_BATCH, the other requests are served between 
+            the batches. The access metadata of the eviction policies is 
+            kept in line with the tables at the same time.
+        '''
+        while True:
+            await asyncio.sleep(expiry.SWEEP_INTERVAL)
+            self._eviction.compact(self._data['db'])
+            for table_name in list(self._expires.deadlines):
+                while self._expires.collect(
+                        self._data['db'], table_name,
+                        expiry.SWEEP_BATCH) == expiry.SWEEP_BATCH:
+                    await asyncio.sleep(0)
+
+    async def _load_cold_tables(self):
+        '''
+            Load the tables of a lazily loaded snapshot in the background, 
+            one table at a time.
+        '''
+        db = self._data['db']
+        for table_name, table in list(db.items()):
+            if isinstance(table, snapshot.ColdTable):
+                loaded = await table.aload()
+                if db.get(table_name) is table:
+                    db[table_name] = loaded
+        # The file is closed when no copy of a cold table uses it anymore.
+        self._snapshot = None
+
+    def set_aof(self, file_name: str = 'data.aof', fsync: str = 'everysec',
+                rewrite_size: int = 64 * 1024 * 1024):
+        '''
+            Enable the append-only file. Every mutation of the database is 
+            logged, and the log is replayed when the server starts, or by 
+            load_db on top of the snapshot. Call this method before load_db 
+            and before starting the server.
+
+            parameter:
+
+                file_name -- the name of the append-only file.
+
+                fsync -- 'always' responds to a mutation after it is flushed 
+                to the disk, 'everysec' flushes to the disk once per second, 
+                'no' lets the operating system decide.
+
+                rewrite_size -- the log is compacted in the background when 
+                it exceeds rewrite_size bytes and has doubled since the last 
+                compaction.
+
+            Return Type: None
+        '''
+        if self._loop:
+            raise CyberDBError(
+                'The append-only file must be set before the server starts.')
+
+        self._aof = AppendOnlyFile(file_name, fsync=fsync,
+                                   rewrite_size=rewrite_size)
+
+    def rewrite_aof(self):
+        '''
+            Compact the append-only file in the background of the running 
+            server.
+
+            Return Type: None
+        '''
+        if not self._aof or not self._loop:
+            raise CyberDBError(
+                'The append-only file is not enabled or the server is not running.')
+
+        asyncio.run_coroutine_threadsafe(self._aof.rewrite(), self._loop)
+
+    def _replay_aof(self, seq: int):
+        '''
+            Apply the mutations of the append-only file newer than seq to 
+            the database.
+        '''
+        route = Route(self._data['db'], None, None, expires=self._expires,
+                      indexes=self._indexes, sort_keys=self._sort_keys,
+                      sort_orders=self._sort_orders)
+        for seq, kind, payload in replay(self._aof.file_name, seq):
+            if kind == 'base':
+                db, deadlines, indexes, sort_orders = payload
+                self._data['expires'] = deadlines
+                self._data['indexes'] = indexes
+                self._data['sort_orders'] = sort_orders
+                self._indexes = Indexes(indexes)
+                self._expires = Expires(deadlines, self._indexes.discard)
+                self._sort_orders = SortOrders(sort_orders)
+                route = Route(db, None, None, expires=self._expires,
+                              indexes=self._indexes, sort_keys=self._sort_keys,
+                              sort_orders=self._sort_orders)
+            else:
+                route.apply(payload)
+
+        self._data['db'] = route._db
+        self._aof_loaded = True
@@ -0,0 +1,128 @@
+'''
+    Tracking of the keys cached by the near caches of the clients.
+'''
+
+
+from collections import OrderedDict
+
+
+# The maximum number of keys tracked, the oldest are invalidated when it
+# is exceeded.
+MAX_TRACKED_KEYS = 1000000
+# An invalidation connection with more than MAX_PUSH_BUFFER bytes waiting
+# to be sent is closed, its client flushes the near cache.
+MAX_PUSH_BUFFER = 8 * 1024 * 1024
+
+
+class Tracking:
+    '''
+        The keys of the CyberDict tables read by the clients with a near
+        cache, like the client-side caching of Redis. Each client opens an
+        invalidation connection, and sends its id with the reads to cache.
+        When a tracked key changes, the server pushes its invalidation to
+        the clients which read it and stops tracking it until it is read
+        again.
+    '''
+
+    def __init__(self, max_keys: int = MAX_TRACKED_KEYS):
+        self.max_keys = max_keys
+        # The streams of the invalidation connections by client id.
+        self._streams = {}
+        self._client_id = 0
+        # The ids of the clients which cached each key, by table name.
+        self._tables = {}
+        self._count = 0
+
+    def register(self, stream) -> int:
+        '''
+            Return Type: int, the client id of a new invalidation
+            connection.
+        '''
+        self._client_id += 1
+        self._streams[self._client_id] = stream
+        return self._client_id
+
+    def unregister(self, client_id: int):
+        '''
+            Forget a closed invalidation connection. Its client id is left
+            in the tracked keys, it is dropped when they are invalidated.
+        '''
+        self._streams.pop(client_id, None)
+
+    def track(self, client_id: int, table_name: str, key):
+        if client_id not in self._streams:
+            return
+        keys = self._tables.get(table_name)
+        if keys is None:
+            keys = self._tables[table_name] = OrderedDict()
+        client_ids = keys.get(key)
+        if client_ids is None:
+            keys[key] = {client_id}
+            self._count += 1
+            if self._count > self.max_keys:
+                self._evict()
+        else:
+            client_ids.add(client_id)
+
+    def invalidate(self, table_name: str, keys):
+        '''
+            Push the invalidation of the keys which changed.
+        '''
+        tracked = self._tables.get(table_name)
+        if not tracked:
+            return
+        pushes = {}
+        for key in keys:
+            client_ids = tracked.pop(key, None)
+            if client_ids:
+                self._count -= 1
+                for client_id in client_ids:
+                    pushes.setdefault(client_id, []).append(key)
+        for client_id, changed in pushes.items():
+            self._push(client_id, table_name, changed)
+
+    def invalidate_table(self, table_name: str):
+        '''
+            Push the invalidation of a table which was cleared or deleted.
+        '''
+        tracked = self._tables.pop(table_name, None)
+        if not tracked:
+            return
+        self._count -= len(tracked)
+        for client_id in set().union(*tracked.values()):
+            self._push(client_id, table_name, None)
+
+    def get_stats(self) -> dict:
+        return {
+            'clients': len(self._streams),
+            'keys': self._count
+        }
+
+    def _evict(self):
+        '''
+            Stop tracking the oldest key, the clients drop it.
+        '''
+        for table_name, tracked in self._tables.items():
+            if tracked:
+                key, client_ids = tracked.popitem(last=False)
+                self._count -= 1
+                for client_id in client_ids:
+                    self._push(client_id, table_name, [key])
+                return
+
+    def _push(self, client_id: int, table_name: str, keys: list):
+        stream = self._streams.get(client_id)
+        if stream is None:
+            return
+        if stream._writer.is_closing():
+            self.unregister(client_id)
+            return
+        size = stream.push({
+            'code': 1,
+            'invalidate': table_name,
+            'keys': keys
+        })
+        # The client does not read its invalidations.
+        if size > MAX_PUSH_BUFFER:
+            stream._writer.close()
+            self.unregister(client_id)
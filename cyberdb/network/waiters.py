@@ -0,0 +1,69 @@
+'''
+    The clients blocked on the pop of an empty CyberQueue table.
+'''
+
+
+import asyncio
+from collections import deque
+
+
+class Waiters:
+    '''
+        The futures of the blocking pops of each table. The requests wait
+        on the event loop, and when values are pushed to the table, as
+        many waiters are woken in the order they arrived. A woken waiter
+        pops again, if another client took the value first it waits
+        again.
+    '''
+
+    def __init__(self):
+        self._tables = {}
+
+    async def wait(self, table_name: str, timeout: float = None) -> bool:
+        '''
+            Wait until a value is pushed to the table.
+
+            Return Type: bool, False if timeout seconds passed first.
+        '''
+        future = asyncio.get_running_loop().create_future()
+        waiters = self._tables.setdefault(table_name, deque())
+        waiters.append(future)
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            if not future.done() or future.cancelled():
+                try:
+                    waiters.remove(future)
+                except ValueError:
+                    pass
+            if not waiters and self._tables.get(table_name) is waiters:
+                del self._tables[table_name]
+
+    def notify(self, table_name: str, n: int = 1):
+        '''
+            Wake the first n waiters of the table.
+        '''
+        waiters = self._tables.get(table_name)
+        while waiters and n > 0:
+            future = waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                n -= 1
+
+    def notify_all(self, table_name: str):
+        '''
+            Wake every waiter of a table which was deleted.
+        '''
+        waiters = self._tables.pop(table_name, None)
+        for future in waiters or ():
+            if not future.done():
+                future.set_result(None)
+
+    def count(self) -> int:
+        '''
+            Return Type: int, the number of blocked requests.
+        '''
+        return sum(len(waiters) for waiters in self._tables.values())
@@ -20,6 +20,12 @@ setuptools.setup(
     ],
     install_requires=[
         'APScheduler>=3.9.1',
-        'obj-encrypt==0.7.0'
-    ]    
+        'obj-encrypt==0.7.0',
+        'cryptography>=3.0',
+        'pycryptodome>=3.4'
+    ],
+    extras_require={
+        'msgpack': ['msgpack>=1.0'],
+        'encrypt': ['cryptography>=3.0']
+    }
 )
\ No newline at end of file
@@ -0,0 +1,40 @@
+import decimal
+import datetime
+import unittest
+
+from cyberdb.data.aggregate import Aggregation
+
+
+UTC = datetime.timezone.utc
+
+
+class TestAggregation(unittest.TestCase):
+    '''
+        The minimum and the maximum are taken among the values ordered by
+        the sorted indexes, whatever the values of the field.
+    '''
+
+    def test_naive_and_aware_datetimes(self):
+        naive = [datetime.datetime(2024, 1, 1), datetime.datetime(2024, 1, 3)]
+        aware = datetime.datetime(2024, 1, 2, tzinfo=UTC)
+        aggregation = Aggregation()
+        aggregation.update([naive[0], aware, naive[1]])
+        result = aggregation.result()
+        self.assertEqual(result['count'], 3)
+        self.assertEqual(result['min'], naive[0])
+        self.assertEqual(result['max'], aware)
+
+    def test_signaling_nan(self):
+        aggregation = Aggregation('n')
+        aggregation.update([{'n': decimal.Decimal('sNaN')},
+                            {'n': decimal.Decimal('1.5')},
+                            {'n': decimal.Decimal('NaN')},
+                            {'n': 'a'}])
+        result = aggregation.result()
+        self.assertEqual(result['count'], 4)
+        self.assertEqual(result['min'], decimal.Decimal('1.5'))
+        self.assertEqual(result['max'], 'a')
+
+
+if __name__ == '__main__':
+    unittest.main()
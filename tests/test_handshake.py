@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+import pickle
+import socket
+import marshal
+import tempfile
+import subprocess
+import unittest
+
+import cyberdb
+from cyberdb.network import HEADER, pack_frame
+from cyberdb.extensions import CyberDBError, WrongPasswordCyberDBError
+
+
+PASSWORD = 'hWjYvVdqRC'
+
+SERVER = '''
+import cyberdb
+cyberdb.Server().run(port={port}, password={password!r})
+'''
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class Touch:
+    '''
+        Create a file when it is unpickled.
+    '''
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __reduce__(self):
+        return (open, (self.path, 'w'))
+
+
+class TestHandshake(unittest.TestCase):
+    '''
+        Nothing the client sends is unpickled before it is authenticated.
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.port = free_port()
+        cls.server = subprocess.Popen(
+            [sys.executable, '-c',
+             SERVER.format(port=cls.port, password=PASSWORD)],
+            stdout=subprocess.DEVNULL)
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', cls.port), 1).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        cls.tearDownClass()
+        raise RuntimeError('The server did not start.')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.kill()
+        cls.server.wait()
+
+    def _read(self, s: socket.socket) -> bytes:
+        with s.makefile('rb') as f:
+            length, = HEADER.unpack(f.read(HEADER.size))
+            return f.read(length)
+
+    def test_pickled_hello(self):
+        path = os.path.join(tempfile.mkdtemp(), 'unpickled')
+        with socket.create_connection(('127.0.0.1', self.port), 5) as s:
+            s.settimeout(5)
+            challenge = marshal.loads(self._read(s))['challenge']
+            self.assertEqual(type(challenge), bytes)
+            s.sendall(pack_frame(pickle.dumps(Touch(path))))
+            # The server closes the connection.
+            self.assertEqual(s.recv(1), b'')
+        self.assertFalse(os.path.exists(path))
+
+    def test_wrong_password(self):
+        with self.assertRaises(WrongPasswordCyberDBError):
+            client = cyberdb.connect(port=self.port, password='wrong')
+            client.get_proxy().connect()
+
+    def test_encrypt_mismatch(self):
+        with self.assertRaises(CyberDBError):
+            client = cyberdb.connect(port=self.port, password=PASSWORD,
+                                     encrypt=True)
+            client.get_proxy().connect()
+
+    def test_codec(self):
+        client = cyberdb.connect(port=self.port, password=PASSWORD,
+                                 codec='marshal')
+        proxy = client.get_proxy()
+        proxy.connect()
+        try:
+            proxy.info()
+        finally:
+            proxy.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import enum
+import decimal
+import datetime
+import unittest
+
+from cyberdb.data.indexes import SortedIndex
+from cyberdb.data.query import compile_where, plan
+
+
+UTC = datetime.timezone.utc
+
+
+class TestSortedIndex(unittest.TestCase):
+    '''
+        Indexing a record never fails, whatever the values of the field.
+    '''
+
+    def test_naive_and_aware_datetimes(self):
+        index = SortedIndex('t')
+        index.add('n1', {'t': datetime.datetime(2024, 1, 1)})
+        index.add('a', {'t': datetime.datetime(2024, 1, 2, tzinfo=UTC)})
+        index.add('n2', {'t': datetime.datetime(2024, 1, 3)})
+
+        self.assertEqual(
+            sorted(index.range(datetime.datetime(2024, 1, 1))), ['n1', 'n2'])
+        self.assertEqual(
+            list(index.range(datetime.datetime(2024, 1, 1, tzinfo=UTC))), ['a'])
+
+        for key in ('n1', 'a', 'n2'):
+            index.discard(key)
+        self.assertEqual(len(index), 0)
+        self.assertEqual(len(index._order), 0)
+
+    def test_signaling_nan(self):
+        index = SortedIndex('n')
+        index.add('s', {'n': decimal.Decimal('sNaN')})
+        index.add('d', {'n': decimal.Decimal('1.5')})
+        self.assertEqual(len(index), 1)
+        self.assertEqual(list(index.range(0, 2)), ['d'])
+
+
+class Level(enum.IntEnum):
+    LOW = 1
+    HIGH = 5
+
+
+class TestPlan(unittest.TestCase):
+    '''
+        An index never changes the result of a query, the candidates of
+        the index match as the scan of the table does.
+    '''
+
+    def _check(self, table: dict, where: dict) -> list:
+        index = SortedIndex('v')
+        for key, record in table.items():
+            index.add(key, record)
+        match = compile_where(where)
+        scanned = sorted(key for key, record in table.items()
+                         if match(record))
+        candidates = plan(where, lambda field: index)
+        if candidates is None:
+            candidates = table
+        self.assertEqual(sorted(
+            key for key in candidates if match(table[key])), scanned)
+        return scanned
+
+    def test_subclasses(self):
+        table = {
+            'a': {'v': Level.HIGH},
+            'b': {'v': 3},
+            'c': {'v': Level.LOW}
+        }
+        self.assertEqual(self._check(table, {'v': {'$gte': 2}}), ['a', 'b'])
+
+    def test_unordered(self):
+        table = {
+            'n': {'v': datetime.datetime(2024, 1, 2)},
+            'b': {'v': bytearray(b'b')},
+            'x': {'v': b'a'},
+            'y': {'v': b'c'}
+        }
+        self.assertEqual(
+            self._check(table, {'v': {'$gte': b'b'}}), ['b', 'y'])
+
+        index = SortedIndex('v')
+        index.add('x', table['x'])
+        self.assertTrue(index.complete())
+        index.add('b', table['b'])
+        self.assertFalse(index.complete())
+        index.discard('b')
+        self.assertTrue(index.complete())
+        index.add('l', {'v': [1]})
+        index.add('t', {'v': None})
+        self.assertTrue(index.complete())
+
+
+if __name__ == '__main__':
+    unittest.main()
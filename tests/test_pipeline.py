@@ -0,0 +1,97 @@
+import sys
+import time
+import socket
+import asyncio
+import subprocess
+import unittest
+
+import cyberdb
+
+
+PASSWORD = 'hWjYvVdqRC'
+
+SERVER = '''
+import cyberdb
+cyberdb.Server().run(port={port}, password={password!r})
+'''
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class TestPipeline(unittest.TestCase):
+    '''
+        A pipeline used as a context manager keeps the results of the
+        operations which ran when one of them fails.
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.port = free_port()
+        cls.server = subprocess.Popen(
+            [sys.executable, '-c',
+             SERVER.format(port=cls.port, password=PASSWORD)],
+            stdout=subprocess.DEVNULL)
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', cls.port), 1).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        cls.tearDownClass()
+        raise RuntimeError('The server did not start.')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.kill()
+        cls.server.wait()
+
+    def test_error(self):
+        client = cyberdb.connect(port=self.port, password=PASSWORD)
+        proxy = client.get_proxy()
+        proxy.connect()
+        try:
+            proxy.create_cyberdict('sync')
+            table = proxy.get_cyberdict('sync')
+            pipeline = proxy.pipeline()
+            with self.assertRaises(KeyError):
+                with pipeline:
+                    table['a'] = 1
+                    table['missing']
+                    table['a']
+            self.assertEqual(pipeline.results[0], None)
+            self.assertIsInstance(pipeline.results[1], KeyError)
+            self.assertEqual(pipeline.results[2], 1)
+        finally:
+            proxy.close()
+
+    def test_aio_error(self):
+        async def run():
+            client = cyberdb.aioconnect(port=self.port, password=PASSWORD)
+            proxy = client.get_proxy()
+            await proxy.connect()
+            try:
+                await proxy.create_cyberdict('aio')
+                table = await proxy.get_cyberdict('aio')
+                pipeline = proxy.pipeline()
+                with self.assertRaises(KeyError):
+                    async with pipeline:
+                        await table.setitem('a', 1)
+                        await table.getitem('missing')
+                        await table.getitem('a')
+                return pipeline.results
+            finally:
+                await proxy.close()
+
+        results = asyncio.run(run())
+        self.assertEqual(results[0], None)
+        self.assertIsInstance(results[1], KeyError)
+        self.assertEqual(results[2], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import sys
+import time
+import socket
+import subprocess
+import unittest
+
+import cyberdb
+from cyberdb.extensions import DisconCyberDBError
+
+
+PASSWORD = 'hWjYvVdqRC'
+
+SERVER = '''
+import cyberdb
+cyberdb.Server().run(port={port}, password={password!r})
+'''
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class TestPoolRecovery(unittest.TestCase):
+    '''
+        The connection pool discards the connections broken by a restart
+        of the server instead of handing them out again.
+    '''
+
+    def setUp(self):
+        self.port = free_port()
+        self.server = None
+
+    def tearDown(self):
+        self._stop()
+
+    def _start(self):
+        self.server = subprocess.Popen(
+            [sys.executable, '-c',
+             SERVER.format(port=self.port, password=PASSWORD)],
+            stdout=subprocess.DEVNULL)
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', self.port), 1).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        self.fail('The server did not start.')
+
+    def _stop(self):
+        if self.server is not None:
+            self.server.kill()
+            self.server.wait()
+            self.server = None
+
+    def _operation(self, client) -> bool:
+        '''
+            Return Type: bool, whether an operation on a new proxy
+            succeeded.
+        '''
+        proxy = client.get_proxy()
+        proxy.connect()
+        try:
+            proxy.info()
+            return True
+        except DisconCyberDBError:
+            return False
+        finally:
+            proxy.close()
+
+    def test_restart(self):
+        self._start()
+        # check_idle=None, no connection is checked for its idle time.
+        client = cyberdb.connect(port=self.port, password=PASSWORD,
+                                 min_con=3, check_idle=None)
+        self.assertTrue(self._operation(client))
+
+        self._stop()
+        self._start()
+
+        # The first use of a connection opened before the restart fails,
+        # the other idle connections are then checked and replaced.
+        results = [self._operation(client) for _ in range(5)]
+        self.assertEqual(results[1:], [True] * 4)
+        stats = client.get_pool_stats()
+        self.assertGreaterEqual(stats['discards'], 3)
+        self.assertGreaterEqual(stats['creations'], 4)
+
+    def test_error_response(self):
+        self._start()
+        client = cyberdb.connect(port=self.port, password=PASSWORD,
+                                 min_con=3, check_idle=None)
+        proxy = client.get_proxy()
+        proxy.connect()
+        proxy.create_cyberdict('users')
+        users = proxy.get_cyberdict('users')
+        with self.assertRaises(KeyError):
+            users['missing']
+        proxy.close()
+
+        # The connection closed after an error response is discarded, the
+        # idle connections are not checked.
+        results = [self._operation(client) for _ in range(3)]
+        self.assertEqual(results, [True] * 3)
+        stats = client.get_pool_stats()
+        self.assertEqual(stats['discards'], 1)
+        self.assertEqual(stats['checks'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+
+from cyberdb.data.sortedset import SortedSet
+from cyberdb.network.route import Route
+
+
+class TestSortedSet(unittest.TestCase):
+    '''
+        A failed change leaves the sorted set as it was.
+    '''
+
+    def test_add_incomparable_member(self):
+        table = SortedSet({'a': 1, 'b': 2, 3: 5})
+        # An int member and a str member cannot be ordered at equal scores.
+        with self.assertRaises(TypeError):
+            table.add('c', 5)
+        with self.assertRaises(TypeError):
+            table.add(3, 2)
+        self.assertNotIn('c', table)
+        self.assertEqual(table.score(3), 5)
+        self.assertEqual(table.rank(3), 2)
+        self.assertEqual(list(table), [('a', 1), ('b', 2), (3, 5)])
+
+    def test_extend_incomparable_members(self):
+        table = SortedSet()
+        with self.assertRaises(TypeError):
+            table.extend([('x', 1), (1, 1)])
+        self.assertEqual(len(table), 0)
+        self.assertEqual(list(table), [])
+
+
+class TestSortedSetRoute(unittest.TestCase):
+    '''
+        A request of the server changes all the members or none.
+    '''
+
+    def setUp(self):
+        self.db = {'z': SortedSet({'a': 1, 3: 5})}
+        self.route = Route(self.db, None, None)
+
+    def test_add_mapping_atomic(self):
+        # 'y' cannot be ordered with the int member 3 at the score 5.
+        r = self.route.apply({
+            'route': '/cybersortedset/add',
+            'table_name': 'z',
+            'mapping': {'x': 2, 'a': 4, 'y': 5}
+        })
+        self.assertEqual(r['code'], 0)
+        self.assertIsInstance(r['Exception'], TypeError)
+        self.assertEqual(list(self.db['z']), [('a', 1), (3, 5)])
+        self.assertEqual(self.db['z'].rank('a'), 0)
+
+    def test_add_mapping(self):
+        r = self.route.apply({
+            'route': '/cybersortedset/add',
+            'table_name': 'z',
+            'mapping': {'x': 2, 'a': 4}
+        })
+        self.assertEqual(r, {'code': 1, 'content': 1})
+        self.assertEqual(list(self.db['z']), [('x', 2), ('a', 4), (3, 5)])
+
+
+if __name__ == '__main__':
+    unittest.main()